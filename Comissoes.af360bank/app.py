@@ -1,4 +1,4 @@
-from flask import Flask, Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context, get_flashed_messages, send_file
 import pandas as pd
 from decimal import Decimal, InvalidOperation
 from typing import Dict, List, Optional
@@ -38,31 +38,31 @@ import numpy as np
 from PIL import Image, ImageEnhance
 import cv2
 from datetime import datetime
+import sys
 
-# Initialize Flask app
-if __name__ == '__main__':
-    app = Flask(__name__)
-    app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'development_key')
-
-    # Configure session and app
-    app.config.update(
-        SESSION_TYPE='filesystem',
-        SESSION_COOKIE_SECURE=False,
-        SESSION_COOKIE_HTTPONLY=True,
-        SESSION_COOKIE_SAMESITE='Lax',
-    )
+# Add the project root to Python path (leitor de planilhas compartilhado)
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
 
-    # Initialize Flask-Session
-    Session(app)
-else:
-    app = Blueprint('comissoes', __name__, 
-                template_folder='templates',
-                static_folder='static')
+from batch_upload import read_batch
+from export import filter_comissoes, iter_csv, write_xlsx, export_filename
+import warehouse
+import commission_engine
+import search_index
+import ccb_dataset
+import reconciliation
+import commission_tables
+from assets import StaticAssets
+from profiler import RequestProfiler
 
+# Initialize Flask app (o portal também o monta em /comissoes, ver wsgi.py)
+app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'development_key')
 
 # Configure session and app
 app.config.update(
+    SESSION_TYPE='filesystem',
     SESSION_COOKIE_SECURE=False,
     SESSION_COOKIE_HTTPONLY=True,
     SESSION_COOKIE_SAMESITE='Lax',
@@ -72,9 +72,11 @@ app.config.update(
 )
 
 # Configure session interface for larger data
-app.config['SESSION_TYPE'] = 'filesystem'
 Session(app)
 
+# Arquivos estáticos com hash e pré-comprimidos (gerados por `python assets.py`)
+StaticAssets(app)
+
 # Configure logging
 if not app.debug:
     # Ensure the logs directory exists
@@ -95,6 +97,22 @@ if not app.debug:
 if app.debug:
     app.logger.setLevel(logging.DEBUG)
 
+# Trechos do template acumulados antes de cada envio (~10 linhas de tabela)
+STREAM_BUFFER_SIZE = 200
+
+def stream_page(template_name: str, **context) -> Response:
+    """Render a template as a streamed response.
+
+    The header and totals go out as soon as they are rendered and the table
+    rows follow in chunks, so pass row collections as iterators.
+    """
+    # Consome as mensagens antes de começar: a sessão já foi salva quando o corpo é gerado
+    get_flashed_messages(with_categories=True)
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    return Response(stream_with_context(stream), mimetype='text/html')
+
 @app.before_request
 def before_request():
     """Ensure session is initialized with required data structures."""
@@ -102,87 +120,6 @@ def before_request():
         session['dados'] = []
     if 'comissoes' not in session:
         session['comissoes'] = {}
-    if 'tabela_config' not in session:
-        session['tabela_config'] = {}
-        set_default_commission_config()
-    session.modified = True
-
-def set_default_commission_config():
-    """Set default commission configurations for different tables."""
-    default_config = {
-        'BRAVE 1 - 50 a 250': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 28,
-            'comissao_repassada': 26,
-            'valor_minimo': 50,
-            'valor_maximo': 250
-        },
-        'BRAVE 2 - 250,01 - 3800': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 24,
-            'comissao_repassada': 22,
-            'valor_minimo': 250.01,
-            'valor_maximo': 3800
-        },
-        'BRAVE 3 - 3800,01 - 30.000': {
-            'tipo_comissao': 'fixa',
-            'comissao_fixa_recebida': 1200,
-            'comissao_fixa_repassada': 1050,
-            'valor_minimo': 3800.01,
-            'valor_maximo': 30000
-        },
-        'BRAVE DIFERENCIADA - COM REDUÇÃO': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 8,
-            'comissao_repassada': 6,
-            'valor_minimo': 0,
-            'valor_maximo': float('inf')
-        },
-        'VIA INVEST 1 - 75 A 250': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 26,
-            'comissao_repassada': 24,
-            'valor_minimo': 75,
-            'valor_maximo': 250
-        },
-        'VIA INVEST 2 - 250,01 A 1.000': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 21,
-            'comissao_repassada': 19,
-            'valor_minimo': 250.01,
-            'valor_maximo': 1000
-        },
-        'VIA INVEST 3 - 1.000,01 A 30.000': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 15,
-            'comissao_repassada': 13,
-            'valor_minimo': 1000.01,
-            'valor_maximo': 30000
-        },
-        'VIA INVEST DIF - COM REDUÇAO': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 10,
-            'comissao_repassada': 8,
-            'valor_minimo': 0,
-            'valor_maximo': float('inf')
-        },
-        'Via AF - TC Diferenciada': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 0,
-            'comissao_repassada': 0,
-            'valor_minimo': 0,
-            'valor_maximo': float('inf')
-        },
-        'NÃO COMISSIONADO': {
-            'tipo_comissao': 'percentual',
-            'comissao_recebida': 0,
-            'comissao_repassada': 0,
-            'valor_minimo': 0,
-            'valor_maximo': float('inf')
-        }
-    }
-    
-    session['tabela_config'] = default_config
     session.modified = True
 
 def is_valid_file(filename: str) -> bool:
@@ -192,30 +129,6 @@ def is_valid_file(filename: str) -> bool:
     ext = filename.rsplit('.', 1)[1].lower()
     return ext in ['csv', 'xls', 'xlsx']
 
-def read_file(file):
-    """Read CSV or Excel file into a pandas DataFrame."""
-    try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file, encoding='utf-8-sig')
-        elif file.filename.endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(file)
-        else:
-            raise ValueError("Formato de arquivo não suportado")
-        
-        if df.empty:
-            return None
-            
-        # Convert DataFrame to list of dictionaries
-        dados = df.replace({pd.NA: None}).to_dict('records')
-        
-        # Log converted data
-        app.logger.info(f"Converted data sample: {dados[:2] if dados else 'No data'}")
-        
-        return dados
-    except Exception as e:
-        app.logger.error(f"Erro ao ler arquivo: {str(e)}")
-        raise e
-
 def convert_to_float(value: str) -> float:
     """Convert a Brazilian currency string to float."""
     try:
@@ -255,10 +168,15 @@ def format_client_name(nome: str, documento: str) -> str:
         return f"{nome} ({documento})"
     return nome
 
-def get_table_config(tabela: str, valor: float = None):
-    """Get commission configuration for a table based on value range."""
+def get_table_config(tabela: str, valor: float = None, tabela_config: Optional[Dict] = None):
+    """Get commission configuration for a table based on value range.
+
+    `tabela_config` maps table names to configurations (defaults to the
+    tables currently in force in the shared registry); it is never modified.
+    """
     try:
-        tabela_config = session.get('tabela_config', {})
+        if tabela_config is None:
+            tabela_config = commission_tables.snapshot().config_for()
         
         # Se não houver configuração, retorna configuração padrão
         if not tabela_config:
@@ -271,9 +189,7 @@ def get_table_config(tabela: str, valor: float = None):
         
         # Se a tabela existir exatamente como está, retorna ela
         if tabela in tabela_config:
-            config = tabela_config[tabela]
-            config['nome_tabela'] = tabela
-            return config
+            return dict(tabela_config[tabela], nome_tabela=tabela)
             
         # Se não encontrou a tabela exata, procura pela faixa de valor
         for nome_tabela, config in tabela_config.items():
@@ -301,8 +217,7 @@ def get_table_config(tabela: str, valor: float = None):
                 mesma_empresa = True
                 
             if mesma_empresa and valor and valor_minimo <= valor <= valor_maximo:
-                config['nome_tabela'] = nome_tabela
-                return config
+                return dict(config, nome_tabela=nome_tabela)
         
         # Se não encontrou nenhuma tabela correspondente
         return {
@@ -321,13 +236,43 @@ def get_table_config(tabela: str, valor: float = None):
             'nome_tabela': tabela
         }
 
-def calcular_comissoes(dados: List[Dict]):
+def aplicar_comissoes(calculadas: List[tuple]) -> None:
+    """Compute the commission values of all rows at once in integer cents (see commission_engine)."""
+    valores, liquidos, fixas, recebidas, repassadas = zip(*(parametros for _, parametros in calculadas))
+    fixas = np.array(fixas, dtype=bool)
+    valor_cents = commission_engine.to_cents(valores)
+    liquido_cents = commission_engine.to_cents(liquidos)
+    # Comissão fixa em centavos, percentual em pontos-base
+    recebidas_fixas = commission_engine.to_cents(recebidas)
+    repassadas_fixas = commission_engine.to_cents(repassadas)
+    recebida_cents, repassada_cents = commission_engine.compute_commissions(
+        valor_cents, liquido_cents, fixas,
+        np.where(fixas, recebidas_fixas, commission_engine.to_basis_points(recebidas)),
+        np.where(fixas, repassadas_fixas, commission_engine.to_basis_points(repassadas))
+    )
+
+    for i, (linha, (valor, valor_liquido, fixa, recebida, repassada)) in enumerate(calculadas):
+        linha['comissao_recebida_valor'] = int(recebida_cents[i]) / 100
+        linha['comissao_repassada_valor'] = int(repassada_cents[i]) / 100
+        if fixa:
+            linha['comissao_recebida_percentual'] = (recebida / valor * 100) if valor > 0 else 0
+            linha['comissao_repassada_percentual'] = (repassada / valor_liquido * 100) if valor_liquido > 0 else 0
+        else:
+            linha['comissao_recebida_percentual'] = recebida
+            linha['comissao_repassada_percentual'] = repassada
+
+def calcular_comissoes(dados: ccb_dataset.CCBDataset):
     """Calculate commissions based on provided data and table configurations."""
     comissoes = {}
     erros = []  # Lista para armazenar erros
+    calculadas = []  # (linha, parâmetros do cálculo)
+    # Mesma versão das tabelas para todas as linhas; a vigência segue a data do desembolso
+    tabelas = commission_tables.snapshot()
+    session['versao_tabela'] = tabelas.version
     
     try:
         for linha in dados:
+            linha = dict(linha)  # as linhas do upload são somente leitura
             ccb = linha.get("CCB", "")
             erro_linha = {}
             
@@ -353,7 +298,7 @@ def calcular_comissoes(dados: List[Dict]):
                 # Processamento do valor bruto
                 try:
                     valor = convert_to_float(valor_bruto) if valor_bruto else 0
-                    if valor <= 0:
+                    if not np.isfinite(valor) or valor <= 0:
                         erro_linha['valor'] = 'Valor Bruto inválido (zero ou negativo)'
                         valor = 0
                 except (ValueError, TypeError) as e:
@@ -363,7 +308,8 @@ def calcular_comissoes(dados: List[Dict]):
                 linha['Valor Bruto'] = valor
                 
                 # Get table configuration based on value range
-                config = get_table_config(tabela, valor)
+                config = get_table_config(tabela, valor,
+                                          tabelas.config_for(warehouse.parse_date(linha.get(warehouse.DATE_COLUMN))))
                 if not config:
                     erro_linha['config'] = f'Configuração não encontrada para tabela {tabela}'
                     config = {
@@ -373,57 +319,37 @@ def calcular_comissoes(dados: List[Dict]):
                         'nome_tabela': tabela
                     }
                 
-                # Cálculo das comissões
+                # Parâmetros do cálculo; os valores saem de uma vez para todas as linhas, em centavos
                 try:
                     tipo_comissao = config.get('tipo_comissao', 'percentual')
                     valor_liquido = linha.get('Valor Líquido', 0)
                     if isinstance(valor_liquido, str):
                         valor_liquido = convert_to_float(valor_liquido)
                     
-                    # Garantir que valor_liquido seja um número
-                    if not valor_liquido or valor_liquido <= 0:
+                    # Garantir que valor_liquido seja um número; NaN (célula vazia no pandas)
+                    # passaria pelas comparações e viraria lixo em to_cents
+                    if pd.isna(valor_liquido) or not valor_liquido or not np.isfinite(valor_liquido) or valor_liquido <= 0:
                         valor_liquido = 0
                         app.logger.warning(f"Valor líquido inválido para CCB {ccb}")
                     
                     if tipo_comissao == 'fixa':
-                        comissao_recebida_valor = float(config.get('comissao_fixa_recebida', 0))
-                        comissao_repassada_valor = float(config.get('comissao_fixa_repassada', 0))
-                        comissao_recebida_percentual = (comissao_recebida_valor / valor * 100) if valor > 0 else 0
-                        comissao_repassada_percentual = (comissao_repassada_valor / valor_liquido * 100) if valor_liquido > 0 else 0
+                        parametros = (valor, valor_liquido, True,
+                                      float(config.get('comissao_fixa_recebida', 0)),
+                                      float(config.get('comissao_fixa_repassada', 0)))
                     else:
-                        # Pegar as porcentagens da configuração
-                        comissao_recebida_percentual = float(config.get('comissao_recebida', 0))
-                        comissao_repassada_percentual = float(config.get('comissao_repassada', 0))
-                        
-                        # Calcular valores - recebida sobre bruto, repassada sobre líquido
-                        comissao_recebida_valor = valor * (comissao_recebida_percentual / 100)
-                        comissao_repassada_valor = valor_liquido * (comissao_repassada_percentual / 100)
-                        
-                        app.logger.debug(f"""
-                        CCB: {ccb}
-                        Valor Bruto: {valor}
-                        Valor Líquido: {valor_liquido}
-                        Comissão Recebida %: {comissao_recebida_percentual}
-                        Comissão Repassada %: {comissao_repassada_percentual}
-                        Comissão Recebida Valor: {comissao_recebida_valor}
-                        Comissão Repassada Valor: {comissao_repassada_valor}
-                        """)
+                        # Recebida sobre o bruto, repassada sobre o líquido
+                        parametros = (valor, valor_liquido, False,
+                                      float(config.get('comissao_recebida', 0)),
+                                      float(config.get('comissao_repassada', 0)))
                 
                     if 'nome_tabela' in config:
                         linha['Tabela'] = config['nome_tabela']
-                    
-                    linha['comissao_recebida_valor'] = comissao_recebida_valor
-                    linha['comissao_repassada_valor'] = comissao_repassada_valor
-                    linha['comissao_recebida_percentual'] = comissao_recebida_percentual
-                    linha['comissao_repassada_percentual'] = comissao_repassada_percentual
                     linha['tipo_comissao'] = tipo_comissao
+                    linha['versao_tabela'] = tabelas.version
                     
                 except (ValueError, TypeError) as e:
                     erro_linha['calculo'] = f'Erro ao calcular comissões: {str(e)}'
-                    linha['comissao_recebida_valor'] = 0
-                    linha['comissao_repassada_valor'] = 0
-                    linha['comissao_recebida_percentual'] = 0
-                    linha['comissao_repassada_percentual'] = 0
+                    parametros = (valor, 0, False, 0, 0)
                     linha['tipo_comissao'] = 'percentual'
                 
                 # Convert other monetary values
@@ -444,6 +370,7 @@ def calcular_comissoes(dados: List[Dict]):
                     })
                 
                 comissoes[str(ccb)] = linha
+                calculadas.append((linha, parametros))
                 
             except Exception as e:
                 app.logger.error(f'Erro ao processar CCB {ccb}: {str(e)}')
@@ -458,6 +385,9 @@ def calcular_comissoes(dados: List[Dict]):
         app.logger.error(f'Erro ao calcular comissões: {str(e)}')
         flash('Ocorreu um erro ao calcular as comissões, mas alguns dados foram processados.', 'warning')
     
+    if calculadas:
+        aplicar_comissoes(calculadas)
+    
     # Armazenar erros na sessão para exibição posterior
     session['erros_comissoes'] = erros
     
@@ -467,21 +397,29 @@ def calcular_comissoes(dados: List[Dict]):
 def index():
     """Handle the main page and file upload."""
     if request.method == 'POST':
-        if 'file' not in request.files:
+        files = [file for file in request.files.getlist('file') if file.filename]
+        if not files:
             flash('Nenhum arquivo selecionado', 'error')
             return redirect(request.url)
             
-        file = request.files['file']
-        if file.filename == '':
-            flash('Nenhum arquivo selecionado', 'error')
-            return redirect(request.url)
-            
-        if file and is_valid_file(file.filename):
+        if all(is_valid_file(file.filename) for file in files):
             try:
-                dados = read_file(file)
+                # Todas as abas de todos os arquivos, lidas em paralelo e unidas em um só conjunto
+                dados, colunas, erros = read_batch([(file.filename, file.read()) for file in files])
+                for erro in erros:
+                    app.logger.error(f'Erro ao ler arquivo {erro}')
+                    flash(f'Erro ao ler o arquivo {erro}', 'warning')
                 if dados:
+                    app.logger.info(f"Batch upload: {len(files)} arquivo(s), {len(dados)} linhas, colunas: {colunas}")
+                    # Guardado por coluna (dicionário de valores repetidos), bem menor que a lista de dicts
+                    dados = ccb_dataset.CCBDataset.from_records(dados, colunas)
                     session['dados'] = dados
-                    flash('Arquivo carregado com sucesso!', 'success')
+                    # Índice de busca (CCB, documento e nome) montado uma vez por upload
+                    session['dados_id'] = search_index.register(dados)
+                    if len(files) == 1:
+                        flash('Arquivo carregado com sucesso!', 'success')
+                    else:
+                        flash(f'{len(files) - len(erros)} arquivos carregados com sucesso ({len(dados)} linhas)!', 'success')
                     return redirect(url_for('dados'))
                 else:
                     flash('O arquivo está vazio ou não contém dados válidos', 'error')
@@ -499,7 +437,8 @@ def dados():
     dados = session.get('dados')
     if not dados:
         return render_template('error.html')
-    return render_template('dados.html', dados=dados)
+    usuarios = list(dict.fromkeys(linha.get('Usuário') or linha.get('Usuario', 'N/A') for linha in dados))
+    return stream_page('dados.html', dados=iter(dados), usuarios=usuarios)
 
 @app.route('/comissoes')
 def comissoes():
@@ -520,25 +459,24 @@ def comissoes():
         session['comissoes'] = comissoes
         
         # Get unique tables and users for filters
-        tabelas = sorted(list(set(item.get('Tabela', '') for item in dados if item.get('Tabela'))))
-        usuarios = sorted(list(set(item.get('Usuario', item.get('Usuário', '')) for item in dados if item.get('Usuario') or item.get('Usuário'))))
+        tabelas = sorted(list(set(item.get('Tabela', '') for item in comissoes.values() if item.get('Tabela'))))
+        usuarios = sorted(list(set(item.get('Usuario', item.get('Usuário', '')) for item in comissoes.values() if item.get('Usuario') or item.get('Usuário'))))
         
         # Calculate totals
-        total_bruto = sum(float(item.get('Valor Bruto', 0)) for item in comissoes.values())
-        total_liquido = sum(float(item.get('Valor Líquido', 0)) for item in comissoes.values())
-        total_comissao_recebida = sum(float(item.get('comissao_recebida_valor', 0)) for item in comissoes.values())
-        total_comissao_repassada = sum(float(item.get('comissao_repassada_valor', 0)) for item in comissoes.values())
+        # Totais exatos: somados em centavos inteiros
+        total_bruto = commission_engine.total_reais([float(item.get('Valor Bruto', 0)) for item in comissoes.values()])
+        total_liquido = commission_engine.total_reais([float(item.get('Valor Líquido', 0)) for item in comissoes.values()])
+        total_comissao_recebida = commission_engine.total_reais([float(item.get('comissao_recebida_valor', 0)) for item in comissoes.values()])
+        total_comissao_repassada = commission_engine.total_reais([float(item.get('comissao_repassada_valor', 0)) for item in comissoes.values()])
         
         # Get errors if any
         erros = session.get('erros_comissoes', [])
         if erros:
             flash(f'Foram encontrados {len(erros)} problemas durante o processamento. Verifique os detalhes na tabela.', 'warning')
         
-        # Convert dict_values to list before passing to template
-        comissoes_list = list(comissoes.values())
-        
-        return render_template('comissoes.html', 
-                             comissoes=comissoes_list, 
+        return stream_page('comissoes.html',
+                             comissoes=iter(comissoes.values()),
+                             total_comissoes=len(comissoes),
                              tabelas=tabelas,
                              usuarios=usuarios,
                              erros=erros,
@@ -564,8 +502,9 @@ def tabela():
     # Get unique tables from the data
     tabelas = sorted(list(set(item['Tabela'] for item in dados if item.get('Tabela'))))
     
-    # Get existing configuration
-    tabela_config = session.get('tabela_config', {})
+    # Get existing configuration (registro compartilhado)
+    registro = commission_tables.snapshot()
+    tabela_config = registro.config_for()
     
     # Prepare table data for template
     tabelas_data = {}
@@ -576,7 +515,7 @@ def tabela():
             'comissao_repassada': config.get('comissao_repassada', 0)
         }
     
-    return render_template('tabela.html', tabelas=tabelas_data)
+    return render_template('tabela.html', tabelas=tabelas_data, versao=registro.version)
 
 @app.route('/salvar_tabela', methods=['POST'])
 def salvar_tabela():
@@ -586,6 +525,14 @@ def salvar_tabela():
         if not tabela:
             flash('Por favor, selecione uma tabela', 'error')
             return redirect(url_for('tabela'))
+
+        # Vigência opcional: sem data, a configuração vale desde sempre
+        vigencia = None
+        if request.form.get('vigencia'):
+            vigencia = warehouse.parse_date(request.form.get('vigencia'))
+            if vigencia is None:
+                flash('Data de vigência inválida', 'error')
+                return redirect(url_for('tabela'))
             
         # Check if it's fixed or percentage commission
         if request.form.get('comissao_fixa_recebida') is not None:
@@ -605,8 +552,7 @@ def salvar_tabela():
                 flash('A comissão repassada não pode ser maior que a recebida', 'error')
                 return redirect(url_for('tabela'))
                 
-            config = session.get('tabela_config', {})
-            config[tabela] = {
+            config = {
                 'tipo_comissao': 'fixa',
                 'comissao_recebida': 0,
                 'comissao_repassada': 0,
@@ -634,17 +580,15 @@ def salvar_tabela():
                 flash('A comissão repassada não pode ser maior que a recebida', 'error')
                 return redirect(url_for('tabela'))
                 
-            config = session.get('tabela_config', {})
-            config[tabela] = {
+            config = {
                 'tipo_comissao': 'percentual',
                 'comissao_recebida': comissao_recebida,
                 'comissao_repassada': comissao_repassada
             }
         
-        session['tabela_config'] = config
-        session.modified = True
+        versao = commission_tables.save_table(tabela, config, effective_from=vigencia, author=request.remote_addr)
         
-        flash(f'Configuração para tabela {tabela} salva com sucesso!', 'success')
+        flash(f'Configuração para tabela {tabela} salva com sucesso (versão {versao})!', 'success')
         return redirect(url_for('comissoes'))
         
     except Exception as e:
@@ -670,10 +614,9 @@ def resultado():
     ccb_str = str(ccb).strip()
     
     # Procura nos dados brutos
-    for item in dados:
-        if str(item.get('CCB', '')).strip() == ccb_str:
-            contrato_raw = item
-            break
+    pos = indice_busca(dados).find_ccb(ccb_str)
+    if pos is not None:
+        contrato_raw = dados[pos]
     
     # Se não encontrou nos dados brutos, tenta nas comissões
     if not contrato_raw:
@@ -737,6 +680,27 @@ def carregar_dados():
     """Load data from session."""
     return session.get('dados', [])
 
+def indice_busca(dados: ccb_dataset.CCBDataset) -> search_index.SearchIndex:
+    """Search index of the uploaded data (rebuilt if this worker lacks it)."""
+    return search_index.get_index(session.get('dados_id'), dados)
+
+# Tamanho padrão e máximo da lista de sugestões
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+@app.route('/api/autocomplete')
+def autocomplete():
+    """Suggest contracts by CCB or CPF/CNPJ prefix and by (accent-insensitive) client name."""
+    dados = carregar_dados()
+    query = request.args.get('q', '').strip()
+    if not dados or not query:
+        return jsonify({'items': []})
+    try:
+        limit = min(max(int(request.args.get('limit', AUTOCOMPLETE_LIMIT)), 1), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro limit inválido'}), 400
+    return jsonify({'items': indice_busca(dados).suggest(query, limit)})
+
 @app.route('/verificar_ccb/<ccb>')
 def verificar_ccb(ccb):
     try:
@@ -744,7 +708,7 @@ def verificar_ccb(ccb):
         if not dados:
             return jsonify({'exists': False, 'error': 'Nenhum dado carregado'})
         
-        exists = any(str(linha.get('CCB', '')).strip() == str(ccb).strip() for linha in dados)
+        exists = indice_busca(dados).find_ccb(str(ccb).strip()) is not None
         return jsonify({'exists': exists})
     except Exception as e:
         app.logger.error(f"Error checking CCB {ccb}: {str(e)}")
@@ -962,37 +926,205 @@ def print_comissoes():
             comissoes_list = comissoes
             
         # Filter by user if specified
-        if selected_user and selected_user.strip():
-            filtered_list = []
+        selected_user = selected_user.strip().lower()
+
+        def selecionadas():
             for item in comissoes_list:
                 user = item.get('Usuário') or item.get('Usuario', '')
-                if user and user.lower() == selected_user.lower():
-                    filtered_list.append(item)
-            comissoes_list = filtered_list
-            
-        if not comissoes_list:
+                if not selected_user or (user and user.lower() == selected_user):
+                    yield item
+
+        total = sum(1 for _ in selecionadas())
+        if not total:
             flash('Nenhuma comissão encontrada para o usuário selecionado.', 'error')
             return redirect(url_for('comissoes'))
             
         # Log the data being passed to template
-        app.logger.info(f"Passing {len(comissoes_list)} comissões to template")
-        app.logger.info(f"Sample comissão: {comissoes_list[0] if comissoes_list else 'No data'}")
+        app.logger.info(f"Passing {total} comissões to template")
+        app.logger.info(f"Sample comissão: {next(selecionadas())}")
         
-        # Ensure all required fields are present
-        for item in comissoes_list:
-            if not item.get('Cliente'):
-                nome = item.get('Nome', item.get('nome', ''))
-                documento = item.get('Documento', item.get('documento', item.get('CPF', '')))
-                item['Cliente'] = format_client_name(nome, documento)
+        def linhas():
+            # Ensure all required fields are present
+            for item in selecionadas():
+                if not item.get('Cliente'):
+                    nome = item.get('Nome', item.get('nome', ''))
+                    documento = item.get('Documento', item.get('documento', item.get('CPF', '')))
+                    item['Cliente'] = format_client_name(nome, documento)
+                yield item
         
-        return render_template('print_comissoes.html', comissoes=comissoes_list)
+        return stream_page('print_comissoes.html', comissoes=linhas())
             
     except Exception as e:
         app.logger.error(f'Erro detalhado na rota /print_comissoes: {str(e)}', exc_info=True)
         flash(f'Ocorreu um erro ao gerar a visualização de impressão: {str(e)}', 'error')
         return redirect(url_for('comissoes'))
 
+def comissoes_para_exportar():
+    """Commissions in the session filtered by the ?usuario= and ?tabela= query parameters."""
+    comissoes = session.get('comissoes') or {}
+    if isinstance(comissoes, dict):
+        comissoes = comissoes.values()
+    return filter_comissoes(comissoes, request.args.get('usuario'), request.args.get('tabela'))
+
+@app.route('/exportar/comissoes.csv')
+def exportar_comissoes_csv():
+    """Stream the computed commissions as CSV."""
+    if not session.get('comissoes'):
+        flash('Nenhum dado de comissão encontrado.', 'error')
+        return redirect(url_for('comissoes'))
+
+    filename = export_filename('csv', request.args.get('usuario'), request.args.get('tabela'))
+    return Response(
+        stream_with_context(iter_csv(comissoes_para_exportar())),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/exportar/comissoes.xlsx')
+def exportar_comissoes_xlsx():
+    """Export the computed commissions as XLSX, written row by row to a temporary file."""
+    if not session.get('comissoes'):
+        flash('Nenhum dado de comissão encontrado.', 'error')
+        return redirect(url_for('comissoes'))
+
+    try:
+        path = write_xlsx(comissoes_para_exportar())
+    except Exception as e:
+        app.logger.error(f'Erro ao exportar comissões: {str(e)}', exc_info=True)
+        flash('Ocorreu um erro ao exportar as comissões.', 'error')
+        return redirect(url_for('comissoes'))
+
+    response = send_file(
+        path,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=export_filename('xlsx', request.args.get('usuario'), request.args.get('tabela'))
+    )
+    response.call_on_close(lambda: os.remove(path))
+    return response
+
+@app.route('/historico/salvar', methods=['POST'])
+def salvar_historico():
+    """Persist the commissions in the session into the historical warehouse."""
+    comissoes = session.get('comissoes')
+    if not comissoes:
+        flash('Nenhum dado de comissão encontrado.', 'error')
+        return redirect(url_for('comissoes'))
+
+    try:
+        fontes = sorted({str(item.get('Arquivo')) for item in comissoes.values() if item.get('Arquivo')})
+        resultado = warehouse.save_run(comissoes.values(), source=', '.join(fontes) or None,
+                                       config_version=session.get('versao_tabela'))
+        mensagem = f"{resultado['saved']} comissões salvas no histórico"
+        if resultado['skipped']:
+            mensagem += f" ({resultado['skipped']} sem CCB foram ignoradas)"
+        flash(mensagem, 'success')
+    except Exception as e:
+        app.logger.error(f'Erro ao salvar histórico: {str(e)}', exc_info=True)
+        flash('Erro ao salvar as comissões no histórico.', 'error')
+    return redirect(url_for('comissoes'))
+
+def intervalo_datas(args):
+    """Parse the inicio/fim parameters (AAAA-MM-DD, inclusive); raises ValueError."""
+    inicio = warehouse.parse_date(args.get('inicio')) if args.get('inicio') else None
+    fim = warehouse.parse_date(args.get('fim')) if args.get('fim') else None
+    if (args.get('inicio') and inicio is None) or (args.get('fim') and fim is None):
+        raise ValueError('Datas devem estar no formato AAAA-MM-DD')
+    return inicio, fim
+
+@app.route('/api/historico')
+def api_historico():
+    """Aggregate historical commissions.
+
+    Query parameters: agrupar (usuario, tabela, parceiro, month or total),
+    inicio/fim (AAAA-MM-DD, inclusive) and the usuario/tabela/parceiro filters.
+    """
+    agrupar = request.args.get('agrupar', 'usuario')
+    try:
+        inicio, fim = intervalo_datas(request.args)
+        grupos = warehouse.aggregate(
+            None if agrupar == 'total' else agrupar,
+            inicio, fim,
+            usuario=request.args.get('usuario'),
+            tabela=request.args.get('tabela'),
+            parceiro=request.args.get('parceiro')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    for grupo in grupos:
+        for campo in [campo for campo in grupo if campo.endswith('_cents')]:
+            grupo[campo[:-len('_cents')]] = grupo[campo] / 100
+    return jsonify({'agrupar': agrupar, 'grupos': grupos})
+
+@app.route('/api/tabelas')
+def api_tabelas():
+    """Commission tables of the current registry version, with every effective date."""
+    registro = commission_tables.snapshot()
+    tabelas = {
+        nome: [dict(commission_tables.public(config), vigencia=vigencia or None) for vigencia, config in entradas]
+        for nome, entradas in registro.entries.items()
+    }
+    return jsonify({'versao': registro.version, 'tabelas': tabelas})
+
+@app.route('/api/tabelas/historico')
+def api_tabelas_historico():
+    """Audit trail of the commission tables (newest first), optionally for one table."""
+    try:
+        limite = min(max(int(request.args.get('limite', 100)), 1), 1000)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro limite inválido'}), 400
+    return jsonify({'alteracoes': commission_tables.history(request.args.get('tabela') or None, limite)})
+
+@app.route('/conciliacao/executar', methods=['POST'])
+def executar_conciliacao():
+    """Reconcile the stored commissions against the bank credits imported in financeiro.
+
+    Parameters: inicio/fim (disbursement dates) and completa=1 to redo the
+    reconciliations already closed.
+    """
+    try:
+        inicio, fim = intervalo_datas(request.values)
+        resultado = reconciliation.run(inicio, fim, full=request.values.get('completa') == '1')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        app.logger.error(f'Erro na conciliação: {str(e)}', exc_info=True)
+        return jsonify({'error': 'Erro ao executar a conciliação'}), 500
+    return jsonify(resultado)
+
+@app.route('/api/conciliacao')
+def api_conciliacao():
+    """Reconciliation report: totals per status, reconciled CCBs and credits with no expected commission.
+
+    Query parameters: status (matched, partial or unmatched), inicio/fim and limite.
+    """
+    try:
+        inicio, fim = intervalo_datas(request.args)
+        limite = min(max(int(request.args.get('limite', 200)), 1), 5000)
+        relatorio = reconciliation.report(request.args.get('status') or None, inicio, fim, limite)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(relatorio)
+
+@app.route('/api/conciliacao/parceiros', methods=['POST'])
+def parceiro_conciliacao():
+    """Set (or clear, with an empty cnpj) the paying CNPJ of a partner."""
+    dados = request.get_json(silent=True) or request.form
+    parceiro = (dados.get('parceiro') or '').strip()
+    if not parceiro:
+        return jsonify({'error': 'Parâmetro parceiro é obrigatório'}), 400
+    try:
+        reconciliation.set_partner_cnpj(parceiro, dados.get('cnpj') or '')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True})
+
 if __name__ == '__main__':
+    # Só aqui: no portal o profiler envolve todos os sub-apps (ver wsgi.py)
+    RequestProfiler(app)
     print("Starting Comissoes app on http://127.0.0.1:5001/")
     try:
         app.run(host='127.0.0.1', port=5001, debug=True)
@@ -0,0 +1,126 @@
+import io
+import os
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+# Add the project root to Python path (leitor de planilhas compartilhado)
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from spreadsheet import read_spreadsheet, sheet_names
+
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', min(4, os.cpu_count() or 1)))
+SOURCE_COLUMN = 'Arquivo'
+SHEET_COLUMN = 'Planilha'
+
+_executor = None
+
+
+def parse_upload(filename: str, content: bytes) -> List[Tuple[object, List[Dict]]]:
+    """Read every sheet of an uploaded file into (sheet, records) pairs.
+
+    Runs in a worker process, so it only receives and returns picklable data.
+    """
+    sheets = []
+    for sheet in sheet_names(io.BytesIO(content), filename):
+        df = read_spreadsheet(io.BytesIO(content), filename, sheet_name=sheet)
+        df = df.dropna(how='all')
+        if df.empty:
+            continue
+        sheets.append((sheet, df.replace({pd.NA: None}).to_dict('records')))
+    return sheets
+
+
+def column_key(name) -> str:
+    """Key used to match the same column across files ('Usuário ' == 'usuario')."""
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode()
+    return ' '.join(text.lower().split())
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS)
+    return _executor
+
+
+def _parse_all(files: List[Tuple[str, bytes]]) -> List[object]:
+    """Parse the files in the process pool (one result or exception per file, in order).
+
+    Falls back to this process if the pool is unavailable.
+    """
+    if len(files) == 1 or UPLOAD_WORKERS <= 1:
+        return [_safe_parse(name, content) for name, content in files]
+
+    global _executor
+    try:
+        executor = _get_executor()
+        futures = {executor.submit(parse_upload, name, content): i for i, (name, content) in enumerate(files)}
+        results = [None] * len(files)
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                results[futures[future]] = e
+        return results
+    except (BrokenProcessPool, OSError):
+        _executor = None
+        return [_safe_parse(name, content) for name, content in files]
+
+
+def _safe_parse(filename: str, content: bytes):
+    try:
+        return parse_upload(filename, content)
+    except Exception as e:
+        return e
+
+
+def read_batch(files: List[Tuple[str, bytes]]) -> Tuple[List[Dict], List[str], List[str]]:
+    """Parse several files (all sheets) and merge them into one dataset.
+
+    Columns with the same name up to case, accents and spacing are merged under
+    the first spelling seen; rows missing a column get None. Each row records
+    its source file and sheet. Returns (rows, columns, errors), keeping the
+    order of the uploaded files.
+    """
+    results = _parse_all(files)
+
+    columns: Dict[str, str] = {}  # column_key -> canonical name
+    parsed = []
+    errors = []
+    for (name, _), result in zip(files, results):
+        if isinstance(result, Exception):
+            errors.append(f'{name}: {result}')
+            continue
+        for sheet, records in result:
+            renames = {}
+            for column in (records[0].keys() if records else []):
+                canonical = columns.setdefault(column_key(column), str(column))
+                if canonical != column:
+                    renames[column] = canonical
+            parsed.append((name, sheet, records, renames))
+
+    names = list(columns.values())
+    multiple_sheets = any(len(result) > 1 for result in results if not isinstance(result, Exception))
+    dados = []
+    for name, sheet, records, renames in parsed:
+        for record in records:
+            row = dict.fromkeys(names)
+            for column, value in record.items():
+                row[renames.get(column, column)] = value
+            row[SOURCE_COLUMN] = name
+            if multiple_sheets:
+                row[SHEET_COLUMN] = sheet
+            dados.append(row)
+
+    extra = [SOURCE_COLUMN] + ([SHEET_COLUMN] if multiple_sheets else [])
+    return dados, names + extra, errors
+
@@ -0,0 +1,271 @@
+"""Armazenamento compacto das linhas de CCB carregadas (substitui a lista de dicts).
+
+Cada coluna é guardada uma única vez, no formato mais enxuto para o tipo dos
+seus valores:
+- inteiros, decimais e datas: arrays numpy tipados (com máscara de vazios);
+- valores repetidos (tabela, usuário, parceiro, status...): dicionário de
+  valores distintos + códigos inteiros de 1 a 4 bytes por linha;
+- textos quase únicos (nome, link, CPF): um único str concatenado e os
+  offsets de cada linha.
+
+As linhas são lidas por `Row`, uma visão somente leitura com a interface de
+dict (row['CCB'], row.get('Usuário')), usada pelos templates e pelo cálculo.
+Execute `python ccb_dataset.py` para comparar o consumo de memória com a
+lista de dicts.
+"""
+import gc
+import pickle
+import random
+import tracemalloc
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CATEGORY_MAX_RATIO = 0.5  # até esta fração de valores distintos a coluna vira dicionário
+
+
+def _codes_dtype(size: int):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if size <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+
+class _TypedColumn:
+    """int, float ou pd.Timestamp em um array numpy, com máscara dos vazios"""
+    __slots__ = ('values', 'missing', 'kind')
+
+    def __init__(self, values: List, kind: str):
+        self.kind = kind
+        missing = np.array([value is None for value in values], dtype=bool)
+        self.missing = missing if missing.any() else None
+        if kind == 'int':
+            self.values = np.array([0 if value is None else value for value in values], dtype=np.int64)
+        elif kind == 'float':
+            self.values = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        else:
+            self.values = np.array([np.datetime64('NaT') if value is None else value.to_datetime64()
+                                    for value in values], dtype='datetime64[ns]')
+
+    def get(self, i: int):
+        if self.missing is not None and self.missing[i]:
+            return None
+        value = self.values[i]
+        if self.kind == 'int':
+            return int(value)
+        if self.kind == 'float':
+            return float(value)
+        return pd.Timestamp(value)
+
+
+class _CategoryColumn:
+    """Valores distintos uma vez e um código por linha"""
+    __slots__ = ('categories', 'codes')
+
+    def __init__(self, values: List, categories: Dict):
+        self.categories = list(categories)
+        self.codes = np.array([categories[value] for value in values], dtype=_codes_dtype(len(categories)))
+
+    def get(self, i: int):
+        return self.categories[self.codes[i]]
+
+
+class _TextColumn:
+    """Textos concatenados em um único str, fatiados pelos offsets"""
+    __slots__ = ('text', 'offsets', 'missing')
+
+    def __init__(self, values: List):
+        missing = np.array([value is None for value in values], dtype=bool)
+        self.missing = missing if missing.any() else None
+        strings = ['' if value is None else value for value in values]
+        self.text = ''.join(strings)
+        self.offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in strings], out=self.offsets[1:])
+
+    def get(self, i: int):
+        if self.missing is not None and self.missing[i]:
+            return None
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+
+class _ObjectColumn:
+    """Qualquer outra coisa (tipos misturados e não hasheáveis), como lista"""
+    __slots__ = ('values',)
+
+    def __init__(self, values: List):
+        self.values = values
+
+    def get(self, i: int):
+        return self.values[i]
+
+
+def _encode(values: List):
+    kinds = {type(value) for value in values if value is not None}
+    if kinds == {int}:
+        return _TypedColumn(values, 'int')
+    if kinds == {float}:
+        return _TypedColumn(values, 'float')
+    if kinds == {pd.Timestamp} and all(value is None or value.tz is None for value in values):
+        return _TypedColumn(values, 'datetime')
+    if not kinds:
+        return _CategoryColumn(values, {None: 0})
+
+    try:
+        categories = {}
+        for value in values:
+            if value not in categories:
+                categories[value] = len(categories)
+    except TypeError:
+        return _ObjectColumn(values)
+    if len(categories) <= max(1, len(values) * CATEGORY_MAX_RATIO) or kinds != {str}:
+        return _CategoryColumn(values, categories)
+    return _TextColumn(values)
+
+
+class Row(Mapping):
+    """Visão somente leitura de uma linha, com a interface de dict"""
+    __slots__ = ('_dataset', '_index')
+
+    def __init__(self, dataset: 'CCBDataset', index: int):
+        self._dataset = dataset
+        self._index = index
+
+    def __getitem__(self, key):
+        column = self._dataset._columns.get(key)
+        if column is None:
+            raise KeyError(key)
+        return column.get(self._index)
+
+    def get(self, key, default=None):
+        column = self._dataset._columns.get(key)
+        return default if column is None else column.get(self._index)
+
+    def __contains__(self, key):
+        return key in self._dataset._columns
+
+    def __iter__(self):
+        return iter(self._dataset._columns)
+
+    def __len__(self):
+        return len(self._dataset._columns)
+
+    def __repr__(self):
+        return f'Row({dict(self)!r})'
+
+
+class CCBDataset:
+    """Linhas de CCB carregadas, coluna a coluna (ver docstring do módulo).
+
+    Pode ser usado onde a lista de dicts era usada para leitura: len(),
+    iteração, dados[i] e `if not dados`. As linhas são somente leitura; use
+    dict(linha) para obter uma cópia alterável.
+    """
+
+    def __init__(self, columns: Dict, length: int):
+        self._columns = columns
+        self._length = length
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], columns: Optional[List[str]] = None) -> 'CCBDataset':
+        records = records if isinstance(records, list) else list(records)
+        if columns is None:
+            columns = list(dict.fromkeys(key for record in records for key in record))
+        encoded = {name: _encode([record.get(name) for record in records]) for name in columns}
+        return cls(encoded, len(records))
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index: int) -> Row:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('índice fora do conjunto de dados')
+        return Row(self, index)
+
+    def __iter__(self) -> Iterator[Row]:
+        for index in range(self._length):
+            yield Row(self, index)
+
+    def column(self, name: str) -> List:
+        """Todos os valores de uma coluna (None para as linhas sem valor)."""
+        column = self._columns.get(name)
+        if column is None:
+            return [None] * self._length
+        if isinstance(column, _CategoryColumn):
+            categories = column.categories
+            return [categories[code] for code in column.codes.tolist()]
+        return [column.get(i) for i in range(self._length)]
+
+    def to_records(self) -> List[Dict]:
+        return [dict(row) for row in self]
+
+
+def _sample_records(rows: int) -> List[Dict]:
+    """Linhas parecidas com as de uma exportação de CCBs"""
+    rng = random.Random(42)
+    tabelas = ['BRAVE 1 - 50 a 250', 'BRAVE 2 - 250,01 - 3800', 'BRAVE 3 - 3800,01 - 30.000',
+               'VIA INVEST 1 - 75 A 250', 'VIA INVEST 2 - 250,01 A 1.000', 'VIA INVEST DIF - COM REDUÇAO']
+    usuarios = [f'USUÁRIO {i}' for i in range(60)]
+    parceiros = ['BRAVE', 'VIA INVEST', 'AF360']
+    status = ['PAGO', 'PENDENTE', 'CANCELADO', 'EM ANÁLISE']
+    nomes = ['JOÃO', 'MARIA', 'JOSÉ', 'ANA', 'CARLOS', 'LUÍZA', 'PAULO', 'MÁRCIA']
+    sobrenomes = ['SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'LIMA', 'PEREIRA', 'CONCEIÇÃO']
+    start = datetime(2024, 1, 1)
+    records = []
+    for n in range(rows):
+        bruto = round(rng.uniform(100, 30000), 2)
+        records.append({
+            'CCB': 100000000 + n,
+            'Nome': f'{rng.choice(nomes)} {rng.choice(sobrenomes)} {rng.choice(sobrenomes)}',
+            'CPF/CNPJ': f'{rng.randint(0, 999):03d}.{rng.randint(0, 999):03d}.{rng.randint(0, 999):03d}-{rng.randint(0, 99):02d}',
+            'Usuário': rng.choice(usuarios),
+            'Tabela': rng.choice(tabelas),
+            'Parceiro': rng.choice(parceiros),
+            'Status': rng.choice(status),
+            'Data do Desembolso': pd.Timestamp(start + timedelta(days=rng.randrange(365))),
+            'Parcelas': rng.choice([6, 12, 18, 24]),
+            'Valor Parcela': round(bruto / 10, 2),
+            'Valor Bruto': bruto,
+            'Valor Líquido': round(bruto * 0.9, 2),
+            'Link de assinatura': f'https://assinatura.example.com/contrato/{rng.getrandbits(64):016x}',
+            'Arquivo': 'exportacao.xlsx',
+        })
+    return records
+
+
+def benchmark(rows: int = 100000) -> Dict:
+    """Memória ocupada pela lista de dicts e pelo CCBDataset com as mesmas linhas"""
+    # As linhas chegam do processo de leitura (batch_upload) serializadas com pickle
+    frame = pd.DataFrame(_sample_records(rows))
+    payload = pickle.dumps(frame.replace({pd.NA: None}).to_dict('records'))
+    columns = list(frame.columns)
+    del frame
+
+    tracemalloc.start()
+    records = pickle.loads(payload)
+    records_bytes = tracemalloc.get_traced_memory()[0]
+    dataset = CCBDataset.from_records(records, columns)
+    del records
+    gc.collect()
+    dataset_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    expected = pickle.loads(payload)
+    assert all(dict(dataset[i]) == expected[i] for i in range(0, rows, max(1, rows // 1000)))
+    return {'rows': rows, 'records_bytes': records_bytes, 'dataset_bytes': dataset_bytes,
+            'ratio': records_bytes / dataset_bytes}
+
+
+if __name__ == '__main__':
+    result = benchmark()
+    print(f"{result['rows']} linhas")
+    print(f"  lista de dicts: {result['records_bytes'] / 2 ** 20:8.1f} MB")
+    print(f"  CCBDataset:     {result['dataset_bytes'] / 2 ** 20:8.1f} MB  ({result['ratio']:.1f}x menor)")
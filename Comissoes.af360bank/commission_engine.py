@@ -0,0 +1,145 @@
+"""Cálculo de comissões em ponto fixo: centavos e pontos-base em int64.
+
+Regras de arredondamento (todas "meio para longe do zero", o ROUND_HALF_UP
+do Decimal):
+- valores em reais viram centavos inteiros; o ruído de representação do
+  float (ex.: 1.005 * 100 = 100.49999...) é descartado antes, na 6ª casa;
+- percentuais viram pontos-base (1% = 100 bp), com a mesma regra;
+- comissão percentual = centavos * bp / 10000, arredondada uma única vez,
+  em aritmética inteira;
+- comissão fixa é o próprio valor configurado, em centavos.
+
+Os totais são somas de inteiros, então são exatos. Execute
+`python commission_engine.py` para comparar com o laço em float e com
+Decimal linha a linha.
+"""
+import random
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+CENTS_PER_UNIT = 100
+BASIS_POINTS_PER_PERCENT = 100
+BASIS_POINTS_DIVISOR = 100 * BASIS_POINTS_PER_PERCENT  # bp que equivalem a 100%
+NOISE_DECIMALS = 6
+
+
+def _round_half_up(values):
+    values = np.round(np.asarray(values, dtype=np.float64), NOISE_DECIMALS)
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+def to_cents(values):
+    """Reais (float) -> centavos (int64)"""
+    return _round_half_up(np.asarray(values, dtype=np.float64) * CENTS_PER_UNIT)
+
+
+def to_basis_points(percentages):
+    """Percentuais (2.5 = 2,5%) -> pontos-base (int64)"""
+    return _round_half_up(np.asarray(percentages, dtype=np.float64) * BASIS_POINTS_PER_PERCENT)
+
+
+def apply_rate(cents, basis_points):
+    """centavos * bp / 10000, arredondado meio para longe do zero, só com inteiros"""
+    product = np.asarray(cents, dtype=np.int64) * np.asarray(basis_points, dtype=np.int64)
+    rounded = (np.abs(product) + BASIS_POINTS_DIVISOR // 2) // BASIS_POINTS_DIVISOR
+    return np.where(product < 0, -rounded, rounded)
+
+
+def compute_commissions(valor_cents, liquido_cents, fixa, recebida, repassada):
+    """Comissão recebida (sobre o bruto) e repassada (sobre o líquido), em centavos
+
+    `fixa` indica as linhas de comissão fixa; nelas `recebida`/`repassada`
+    são centavos, nas demais são pontos-base.
+    """
+    fixa = np.asarray(fixa, dtype=bool)
+    recebida = np.asarray(recebida, dtype=np.int64)
+    repassada = np.asarray(repassada, dtype=np.int64)
+    recebida_cents = np.where(fixa, recebida, apply_rate(valor_cents, recebida))
+    repassada_cents = np.where(fixa, repassada, apply_rate(liquido_cents, repassada))
+    return recebida_cents, repassada_cents
+
+
+def cents_to_reais(cents):
+    return np.asarray(cents, dtype=np.int64) / CENTS_PER_UNIT
+
+
+def total_reais(values):
+    """Soma exata de valores em reais (cada um arredondado ao centavo)"""
+    return int(to_cents(values).sum()) / CENTS_PER_UNIT
+
+
+def _decimal_commission(valor, percentual):
+    cents = Decimal(str(valor)).quantize(Decimal('0.01'), ROUND_HALF_UP)
+    rate = Decimal(str(percentual)).quantize(Decimal('0.01'), ROUND_HALF_UP)
+    return (cents * rate / 100).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+
+def _legacy_loop(valores, liquidos, percentuais_recebida, percentuais_repassada):
+    """O cálculo em float de calcular_comissoes, linha a linha (incluindo o log de debug montado por linha)"""
+    linhas = []
+    for valor, valor_liquido, pr, pp in zip(valores, liquidos, percentuais_recebida, percentuais_repassada):
+        comissao_recebida_valor = valor * (pr / 100)
+        comissao_repassada_valor = valor_liquido * (pp / 100)
+        f"""
+        Valor Bruto: {valor}
+        Valor Líquido: {valor_liquido}
+        Comissão Recebida %: {pr}
+        Comissão Repassada %: {pp}
+        Comissão Recebida Valor: {comissao_recebida_valor}
+        Comissão Repassada Valor: {comissao_repassada_valor}
+        """
+        linhas.append({'comissao_recebida_valor': comissao_recebida_valor,
+                       'comissao_repassada_valor': comissao_repassada_valor})
+    return linhas
+
+
+def benchmark(rows=200000):
+    """Compara o laço em float atual, Decimal linha a linha e o motor em centavos"""
+    rng = random.Random(42)
+    valores = [round(rng.uniform(500, 80000), 2) for _ in range(rows)]
+    liquidos = [round(valor * rng.uniform(0.8, 0.95), 2) for valor in valores]
+    taxas = [0.5, 1.25, 2.0, 2.35, 3.0, 4.75, 6.0]
+    recebidas = [rng.choice(taxas) for _ in range(rows)]
+    repassadas = [rng.choice(taxas) for _ in range(rows)]
+
+    start = time.perf_counter()
+    linhas = _legacy_loop(valores, liquidos, recebidas, repassadas)
+    float_time = time.perf_counter() - start
+    float_cents = [round(linha['comissao_recebida_valor'] * 100) for linha in linhas]
+
+    start = time.perf_counter()
+    decimal_cents = [int(_decimal_commission(valor, pr) * 100) for valor, pr in zip(valores, recebidas)]
+    decimal_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recebida_cents, repassada_cents = compute_commissions(
+        to_cents(valores), to_cents(liquidos), np.zeros(rows, dtype=bool),
+        to_basis_points(recebidas), to_basis_points(repassadas)
+    )
+    engine_time = time.perf_counter() - start
+
+    decimal_total = sum(decimal_cents)
+    return {
+        'rows': rows,
+        'float_seconds': float_time,
+        'decimal_seconds': decimal_time,
+        'engine_seconds': engine_time,
+        # Soma em float dos valores exibidos (arredondados) e linhas que divergem do Decimal
+        'float_total': sum(linha['comissao_recebida_valor'] for linha in linhas),
+        'float_mismatched_rows': sum(1 for a, b in zip(float_cents, decimal_cents) if a != b),
+        'decimal_total_cents': decimal_total,
+        'engine_total_cents': int(recebida_cents.sum()),
+        'engine_mismatched_rows': int(np.count_nonzero(recebida_cents != np.asarray(decimal_cents))),
+    }
+
+
+if __name__ == '__main__':
+    result = benchmark()
+    print(f"{result['rows']} linhas")
+    print(f"  float (laço atual):   {result['float_seconds'] * 1000:8.1f} ms  total {result['float_total']:.6f}"
+          f"  ({result['float_mismatched_rows']} linhas diferentes do Decimal)")
+    print(f"  Decimal por linha:    {result['decimal_seconds'] * 1000:8.1f} ms  total {result['decimal_total_cents'] / 100:.2f}")
+    print(f"  centavos (int64):     {result['engine_seconds'] * 1000:8.1f} ms  total {result['engine_total_cents'] / 100:.2f}"
+          f"  ({result['engine_mismatched_rows']} linhas diferentes do Decimal)")
@@ -0,0 +1,319 @@
+"""Registro central das tabelas de comissão, compartilhado por todos os usuários.
+
+Cada alteração cria uma nova versão completa das tabelas (as anteriores
+continuam consultáveis) e uma linha de auditoria com o antes e o depois.
+Uma tabela pode ter várias entradas com datas de vigência diferentes; vale,
+para cada contrato, a entrada mais recente que já estava em vigor na data
+do desembolso.
+
+Cada processo guarda o snapshot compilado da versão mais recente e só o
+recarrega quando o número da versão muda (uma consulta por cálculo).
+"""
+import json
+import math
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import warehouse
+
+FIELDS = ('tipo_comissao', 'comissao_recebida', 'comissao_repassada', 'comissao_fixa_recebida',
+          'comissao_fixa_repassada', 'valor_minimo', 'valor_maximo')
+TIPOS = ('percentual', 'fixa')
+SEED_AUTHOR = 'sistema'
+
+# Tabelas iniciais do registro (antes copiadas para cada sessão)
+DEFAULT_TABLES = {
+    'BRAVE 1 - 50 a 250': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 28,
+        'comissao_repassada': 26,
+        'valor_minimo': 50,
+        'valor_maximo': 250
+    },
+    'BRAVE 2 - 250,01 - 3800': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 24,
+        'comissao_repassada': 22,
+        'valor_minimo': 250.01,
+        'valor_maximo': 3800
+    },
+    'BRAVE 3 - 3800,01 - 30.000': {
+        'tipo_comissao': 'fixa',
+        'comissao_fixa_recebida': 1200,
+        'comissao_fixa_repassada': 1050,
+        'valor_minimo': 3800.01,
+        'valor_maximo': 30000
+    },
+    'BRAVE DIFERENCIADA - COM REDUÇÃO': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 8,
+        'comissao_repassada': 6,
+        'valor_minimo': 0,
+        'valor_maximo': float('inf')
+    },
+    'VIA INVEST 1 - 75 A 250': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 26,
+        'comissao_repassada': 24,
+        'valor_minimo': 75,
+        'valor_maximo': 250
+    },
+    'VIA INVEST 2 - 250,01 A 1.000': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 21,
+        'comissao_repassada': 19,
+        'valor_minimo': 250.01,
+        'valor_maximo': 1000
+    },
+    'VIA INVEST 3 - 1.000,01 A 30.000': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 15,
+        'comissao_repassada': 13,
+        'valor_minimo': 1000.01,
+        'valor_maximo': 30000
+    },
+    'VIA INVEST DIF - COM REDUÇAO': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 10,
+        'comissao_repassada': 8,
+        'valor_minimo': 0,
+        'valor_maximo': float('inf')
+    },
+    'Via AF - TC Diferenciada': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 0,
+        'comissao_repassada': 0,
+        'valor_minimo': 0,
+        'valor_maximo': float('inf')
+    },
+    'NÃO COMISSIONADO': {
+        'tipo_comissao': 'percentual',
+        'comissao_recebida': 0,
+        'comissao_repassada': 0,
+        'valor_minimo': 0,
+        'valor_maximo': float('inf')
+    }
+}
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS commission_table_versions (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        author TEXT,
+        note TEXT
+    )''',
+    # Uma cópia completa das tabelas por versão; effective_from '' = desde sempre
+    '''CREATE TABLE IF NOT EXISTS commission_tables (
+        version INTEGER NOT NULL REFERENCES commission_table_versions(version),
+        nome TEXT NOT NULL,
+        effective_from TEXT NOT NULL DEFAULT '',
+        tipo_comissao TEXT NOT NULL,
+        comissao_recebida REAL NOT NULL DEFAULT 0,
+        comissao_repassada REAL NOT NULL DEFAULT 0,
+        comissao_fixa_recebida REAL NOT NULL DEFAULT 0,
+        comissao_fixa_repassada REAL NOT NULL DEFAULT 0,
+        valor_minimo REAL NOT NULL DEFAULT 0,
+        valor_maximo REAL,
+        PRIMARY KEY (version, nome, effective_from)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS commission_table_audit (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        version INTEGER NOT NULL,
+        changed_at TEXT NOT NULL,
+        author TEXT,
+        nome TEXT NOT NULL,
+        effective_from TEXT NOT NULL,
+        action TEXT NOT NULL,
+        before TEXT,
+        after TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_commission_table_audit_nome ON commission_table_audit(nome, id)',
+]
+
+_initialized = set()
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _connect(database: str) -> sqlite3.Connection:
+    """Conexão com o registro; o esquema e as tabelas padrão são preparados uma vez por processo."""
+    if database in _initialized:
+        return warehouse.open_connection(database)
+    with _lock:
+        conn = warehouse.get_connection(database)
+        if database not in _initialized:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            try:
+                # Mesma trava de save_table: só um processo semeia um registro vazio
+                conn.execute('BEGIN IMMEDIATE')
+                if conn.execute('SELECT 1 FROM commission_table_versions LIMIT 1').fetchone() is None:
+                    _seed(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                conn.close()
+                raise
+            _initialized.add(database)
+    return conn
+
+
+def _seed(conn: sqlite3.Connection) -> None:
+    now = datetime.now().isoformat(timespec='seconds')
+    version = conn.execute('INSERT INTO commission_table_versions (created_at, author, note) VALUES (?, ?, ?)',
+                           (now, SEED_AUTHOR, 'Tabelas padrão')).lastrowid
+    for nome, config in DEFAULT_TABLES.items():
+        entry = _entry(config)
+        _write_entry(conn, version, nome, '', entry)
+        conn.execute('''INSERT INTO commission_table_audit
+                        (version, changed_at, author, nome, effective_from, action, before, after)
+                        VALUES (?, ?, ?, ?, '', 'seed', NULL, ?)''',
+                     (version, now, SEED_AUTHOR, nome, json.dumps(public(entry))))
+
+
+def _entry(config: Dict) -> Dict:
+    """Configuração completa, com os campos ausentes no padrão."""
+    entry = {field: config.get(field, 0) for field in FIELDS}
+    entry['tipo_comissao'] = config.get('tipo_comissao') or 'percentual'
+    entry['valor_maximo'] = config.get('valor_maximo', math.inf)
+    if entry['valor_maximo'] is None:
+        entry['valor_maximo'] = math.inf
+    return entry
+
+
+def _write_entry(conn: sqlite3.Connection, version: int, nome: str, effective_from: str, entry: Dict) -> None:
+    values = [entry[field] for field in FIELDS]
+    values[-1] = None if math.isinf(values[-1]) else values[-1]  # infinito fica NULL
+    conn.execute(f'''INSERT OR REPLACE INTO commission_tables (version, nome, effective_from, {', '.join(FIELDS)})
+                     VALUES (?, ?, ?, {', '.join('?' * len(FIELDS))})''', [version, nome, effective_from] + values)
+
+
+def public(entry: Dict) -> Dict:
+    """Cópia serializável em JSON (sem limite máximo vira None)."""
+    return {**entry, 'valor_maximo': None if math.isinf(entry['valor_maximo']) else entry['valor_maximo']}
+
+
+def _row_entry(row) -> Dict:
+    entry = dict(zip(FIELDS, row))
+    if entry['valor_maximo'] is None:
+        entry['valor_maximo'] = math.inf
+    return entry
+
+
+class Snapshot:
+    """Tabelas de uma versão, prontas para consulta (somente leitura)."""
+
+    def __init__(self, version: int, entries: Dict[str, List]):
+        self.version = version
+        # nome -> [(effective_from, config)], vigência mais recente primeiro
+        self.entries = {nome: sorted(items, key=lambda item: item[0], reverse=True)
+                        for nome, items in entries.items()}
+        self._by_day = {}
+
+    def config_for(self, day: Optional[date] = None) -> Dict[str, Dict]:
+        """nome -> configuração em vigor em `day` (hoje, se omitido).
+
+        O dicionário é compartilhado entre as requisições: não altere.
+        """
+        key = (day or date.today()).isoformat()
+        tables = self._by_day.get(key)
+        if tables is None:
+            tables = {}
+            for nome, items in self.entries.items():
+                for effective_from, config in items:
+                    if effective_from <= key:
+                        tables[nome] = config
+                        break
+            self._by_day[key] = tables
+        return tables
+
+
+def snapshot(database: str = warehouse.WAREHOUSE_DB) -> Snapshot:
+    """Snapshot da versão mais recente, recarregado só quando a versão muda."""
+    global _snapshot
+    conn = _connect(database)
+    try:
+        version = conn.execute('SELECT MAX(version) FROM commission_table_versions').fetchone()[0]
+        current = _snapshot
+        if current is not None and current[0] == database and current[1].version == version:
+            return current[1]
+        entries = {}
+        for nome, effective_from, *values in conn.execute(f'''
+            SELECT nome, effective_from, {', '.join(FIELDS)} FROM commission_tables WHERE version = ?
+        ''', (version,)):
+            entries.setdefault(nome, []).append((effective_from, _row_entry(values)))
+    finally:
+        conn.close()
+
+    loaded = Snapshot(version, entries)
+    with _lock:
+        if _snapshot is None or _snapshot[0] != database or _snapshot[1].version <= version:
+            _snapshot = (database, loaded)
+    return loaded
+
+
+def save_table(nome: str, config: Dict, effective_from: Optional[date] = None, author: Optional[str] = None,
+               note: Optional[str] = None, database: str = warehouse.WAREHOUSE_DB) -> int:
+    """Grava a configuração de uma tabela como uma nova versão e devolve o número dela.
+
+    Campos omitidos em `config` mantêm o valor atual da tabela (faixa de
+    valores, por exemplo).
+    """
+    if config.get('tipo_comissao', 'percentual') not in TIPOS:
+        raise ValueError(f'tipo_comissao deve ser um de {TIPOS}')
+    since = effective_from.isoformat() if effective_from else ''
+
+    conn = _connect(database)
+    try:
+        conn.execute('BEGIN IMMEDIATE')  # uma versão por vez, mesmo com vários workers
+        previous = conn.execute('SELECT MAX(version) FROM commission_table_versions').fetchone()[0]
+        rows = conn.execute(f'''
+            SELECT effective_from, {', '.join(FIELDS)} FROM commission_tables
+            WHERE version = ? AND nome = ? ORDER BY effective_from DESC
+        ''', (previous, nome)).fetchall()
+        before = next((_row_entry(values) for effective_from, *values in rows if effective_from == since), None)
+        base = before or next((_row_entry(values) for effective_from, *values in rows if effective_from <= since),
+                              _row_entry(rows[0][1:]) if rows else {})
+        after = _entry({**base, **config})
+
+        now = datetime.now().isoformat(timespec='seconds')
+        version = conn.execute('INSERT INTO commission_table_versions (created_at, author, note) VALUES (?, ?, ?)',
+                               (now, author, note)).lastrowid
+        conn.execute(f'''
+            INSERT INTO commission_tables (version, nome, effective_from, {', '.join(FIELDS)})
+            SELECT ?, nome, effective_from, {', '.join(FIELDS)} FROM commission_tables WHERE version = ?
+        ''', (version, previous))
+        _write_entry(conn, version, nome, since, after)
+        conn.execute('''INSERT INTO commission_table_audit
+                        (version, changed_at, author, nome, effective_from, action, before, after)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (version, now, author, nome, since, 'update' if before else 'create',
+                      json.dumps(public(before)) if before else None, json.dumps(public(after))))
+        conn.commit()
+        return version
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def history(nome: Optional[str] = None, limit: int = 100, database: str = warehouse.WAREHOUSE_DB) -> List[Dict]:
+    """Alterações mais recentes primeiro (de uma tabela, se `nome` for informado)."""
+    conn = _connect(database)
+    conn.row_factory = sqlite3.Row
+    try:
+        where = 'WHERE nome = ?' if nome else ''
+        rows = conn.execute(f'SELECT * FROM commission_table_audit {where} ORDER BY id DESC LIMIT ?',
+                            ([nome] if nome else []) + [limit]).fetchall()
+    finally:
+        conn.close()
+    changes = []
+    for row in rows:
+        change = dict(row)
+        for field in ('before', 'after'):
+            change[field] = json.loads(change[field]) if change[field] else None
+        changes.append(change)
+    return changes
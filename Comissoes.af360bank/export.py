@@ -0,0 +1,104 @@
+import csv
+import io
+import math
+import os
+import tempfile
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, Optional
+
+from werkzeug.utils import secure_filename
+
+CSV_CHUNK_ROWS = 1000  # linhas acumuladas antes de cada envio do CSV
+
+# (cabeçalho, getter) de cada coluna exportada
+EXPORT_COLUMNS = [
+    ('CCB', lambda item: item.get('CCB', '')),
+    ('Cliente', lambda item: item.get('Cliente', '')),
+    ('Usuário', lambda item: item.get('Usuário') or item.get('Usuario', '')),
+    ('Tabela', lambda item: item.get('Tabela', '')),
+    ('Valor Bruto', lambda item: item.get('Valor Bruto', 0)),
+    ('Valor Líquido', lambda item: item.get('Valor Líquido', 0)),
+    ('Comissão Recebida (%)', lambda item: item.get('comissao_recebida_percentual', 0)),
+    ('Comissão Recebida', lambda item: item.get('comissao_recebida_valor', 0)),
+    ('Comissão Repassada (%)', lambda item: item.get('comissao_repassada_percentual', 0)),
+    ('Comissão Repassada', lambda item: item.get('comissao_repassada_valor', 0)),
+    ('Tipo de Comissão', lambda item: item.get('tipo_comissao', '')),
+    ('Arquivo', lambda item: item.get('Arquivo', '')),
+]
+
+
+def filter_comissoes(comissoes: Iterable[Dict], usuario: Optional[str] = None,
+                     tabela: Optional[str] = None) -> Iterator[Dict]:
+    """Yield the commissions matching the user and table filters (case-insensitive)."""
+    usuario = (usuario or '').strip().lower()
+    tabela = (tabela or '').strip().lower()
+    for item in comissoes:
+        if usuario and (item.get('Usuário') or item.get('Usuario') or '').lower() != usuario:
+            continue
+        if tabela and (item.get('Tabela') or '').lower() != tabela:
+            continue
+        yield item
+
+
+def _csv_value(value):
+    # Números com vírgula decimal, como o Excel em pt-BR espera. Pelo menos duas
+    # casas (valores em reais), mas sem arredondar: percentuais saem com a mesma
+    # precisão gravada no XLSX
+    if isinstance(value, float):
+        if not math.isfinite(value) or round(value, 2) == value:
+            text = f'{value:.2f}'
+        else:
+            text = format(Decimal(repr(value)), 'f')  # decimal completo, sem notação científica
+        return text.replace('.', ',')
+    return '' if value is None else value
+
+
+def iter_csv(comissoes: Iterable[Dict]) -> Iterator[str]:
+    """Generate the CSV export in chunks of CSV_CHUNK_ROWS rows.
+
+    Uses ';' as separator and a UTF-8 BOM so Excel opens it with accents and
+    decimal commas intact.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+
+    rows = 0
+    for item in comissoes:
+        writer.writerow([_csv_value(getter(item)) for _, getter in EXPORT_COLUMNS])
+        rows += 1
+        if rows % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_xlsx(comissoes: Iterable[Dict]) -> str:
+    """Write the XLSX export to a temporary file and return its path.
+
+    openpyxl's write-only mode serializes each row as it is appended, so
+    memory stays constant regardless of the number of rows.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Comissões')
+    sheet.append([header for header, _ in EXPORT_COLUMNS])
+    for item in comissoes:
+        sheet.append([getter(item) for _, getter in EXPORT_COLUMNS])
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def export_filename(extension: str, usuario: Optional[str] = None, tabela: Optional[str] = None) -> str:
+    parts = ['comissoes'] + [part for part in (usuario, tabela) if part and part.strip()]
+    return secure_filename(f"{'_'.join(parts)}.{extension}")
@@ -0,0 +1,496 @@
+"""Conciliação das comissões a receber com os créditos do extrato bancário.
+
+As comissões previstas vêm do histórico (`warehouse.commissions`, uma linha
+por CCB com `recebida_cents`) e os créditos vêm da tabela `transactions` do
+financeiro (PIX/TED/PAGAMENTO com valor positivo). Cada previsão é um
+intervalo de valor (± tolerância) e de data (janela ao redor do desembolso);
+os créditos ficam ordenados por valor, então cada previsão encontra seus
+candidatos com bisect em vez de comparar todos os pares. Quando o CNPJ do
+parceiro é conhecido (`reconciliation_partners`), só créditos desse CNPJ
+entram na disputa.
+
+Etapas, na ordem:
+1. valor: um crédito para uma previsão;
+2. dia / mês: um crédito pagando a soma das previsões do parceiro no dia ou
+   no mês;
+3. parcial: crédito do mesmo CNPJ na janela, mas com valor diferente.
+
+O resultado fica em `reconciliation_results` (uma linha por CCB). Uma nova
+execução mantém as conciliações já fechadas cujo valor previsto não mudou e
+só processa o restante. Execute `python reconciliation.py` para medir com
+um ano de dados sintéticos.
+"""
+import bisect
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import warehouse
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FINANCEIRO_DB = os.environ.get(
+    'FINANCEIRO_DB', os.path.join(project_root, 'financeiro.af360bank', 'instance', 'financas.db'))
+
+CREDIT_TYPES = ('PIX RECEBIDO', 'TED RECEBIDA', 'PAGAMENTO')
+TOLERANCE_CENTS = 5  # diferença aceita entre previsto e recebido (arredondamentos do parceiro)
+DAYS_BEFORE = 3  # créditos aceitos antes da data do desembolso
+DAYS_AFTER = 45  # e depois dela
+STATUSES = ('matched', 'partial', 'unmatched')
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS reconciliation_partners (
+        parceiro TEXT PRIMARY KEY,
+        cnpj TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS reconciliation_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        start TEXT,
+        end TEXT,
+        tolerance_cents INTEGER NOT NULL,
+        days_before INTEGER NOT NULL,
+        days_after INTEGER NOT NULL,
+        kept INTEGER NOT NULL DEFAULT 0,
+        matched INTEGER NOT NULL DEFAULT 0,
+        partial INTEGER NOT NULL DEFAULT 0,
+        unmatched INTEGER NOT NULL DEFAULT 0,
+        unmatched_credits INTEGER NOT NULL DEFAULT 0,
+        seconds REAL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS reconciliation_results (
+        ccb TEXT PRIMARY KEY,
+        run_id INTEGER NOT NULL REFERENCES reconciliation_runs(id),
+        status TEXT NOT NULL,
+        match_type TEXT,
+        expected_date TEXT NOT NULL,
+        expected_cents INTEGER NOT NULL,
+        parceiro TEXT NOT NULL DEFAULT '',
+        cnpj TEXT NOT NULL DEFAULT '',
+        transaction_key TEXT,
+        transaction_date TEXT,
+        received_cents INTEGER,
+        difference_cents INTEGER
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_reconciliation_status ON reconciliation_results(status, expected_date)',
+    'CREATE INDEX IF NOT EXISTS idx_reconciliation_transaction ON reconciliation_results(transaction_key)',
+    # Créditos que sobraram na última execução (sem comissão prevista)
+    '''CREATE TABLE IF NOT EXISTS reconciliation_credits (
+        transaction_key TEXT PRIMARY KEY,
+        run_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        cents INTEGER NOT NULL,
+        cnpj TEXT NOT NULL DEFAULT '',
+        description TEXT
+    )''',
+]
+
+CNPJ_PATTERN = re.compile(r'(?<!\d)(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})(?!\d)')
+NON_DIGITS = re.compile(r'\D')
+
+
+class Expected(NamedTuple):
+    ccb: str
+    day: int  # date.toordinal()
+    cents: int
+    parceiro: str
+    cnpj: str
+
+
+class Credit(NamedTuple):
+    key: str  # fingerprint da transação (estável entre reimportações)
+    day: int
+    cents: int
+    cnpj: str
+    description: str
+
+
+def normalize_cnpj(value) -> str:
+    if not value:
+        return ''
+    digits = NON_DIGITS.sub('', str(value))
+    if len(digits) == 15 and digits.startswith('0'):
+        digits = digits[1:]
+    return digits if len(digits) == 14 else ''
+
+
+def credit_cnpj(document, description) -> str:
+    """CNPJ da contraparte: o documento da transação ou o que aparece na descrição."""
+    cnpj = normalize_cnpj(document)
+    if not cnpj:
+        match = CNPJ_PATTERN.search(description or '')
+        cnpj = normalize_cnpj(match.group(1)) if match else ''
+    return cnpj
+
+
+class _CreditIndex:
+    """Créditos ordenados por valor (geral e por CNPJ) e, sob demanda, por data (por CNPJ)"""
+
+    def __init__(self, credits: List[Credit]):
+        self.credits = credits
+        self.used = [False] * len(credits)
+        by_amount = sorted(range(len(credits)), key=lambda i: (credits[i].cents, credits[i].day))
+        self._all = ([credits[i].cents for i in by_amount], by_amount)
+        self._by_cnpj = defaultdict(lambda: ([], []))
+        for i in by_amount:
+            if credits[i].cnpj:
+                amounts, ids = self._by_cnpj[credits[i].cnpj]
+                amounts.append(credits[i].cents)
+                ids.append(i)
+        self._by_day = None
+
+    def by_amount(self, cnpj: str, cents: int, day: int, first_day: int, last_day: int,
+                  tolerance: int) -> Optional[int]:
+        """Crédito livre com valor em cents ± tolerance e data na janela; o mais
+        próximo em valor e, no empate, em data."""
+        amounts, ids = self._by_cnpj.get(cnpj, ([], [])) if cnpj else self._all
+        best, best_key = None, None
+        for j in range(bisect.bisect_left(amounts, cents - tolerance), bisect.bisect_right(amounts, cents + tolerance)):
+            i = ids[j]
+            credit = self.credits[i]
+            if self.used[i] or not first_day <= credit.day <= last_day:
+                continue
+            key = (abs(credit.cents - cents), abs(credit.day - day))
+            if best_key is None or key < best_key:
+                best, best_key = i, key
+        return best
+
+    def by_day(self, cnpj: str, day: int, first_day: int, last_day: int) -> Optional[int]:
+        """Crédito livre do CNPJ com data na janela, o mais próximo de `day`."""
+        if self._by_day is None:
+            # Montado na primeira chamada, só com os créditos que ainda estão livres
+            self._by_day = defaultdict(lambda: ([], []))
+            for i in sorted(range(len(self.credits)), key=lambda i: self.credits[i].day):
+                if self.credits[i].cnpj and not self.used[i]:
+                    days, ids = self._by_day[self.credits[i].cnpj]
+                    days.append(self.credits[i].day)
+                    ids.append(i)
+        days, ids = self._by_day.get(cnpj, ([], []))
+        best, best_distance = None, None
+        for j in range(bisect.bisect_left(days, first_day), bisect.bisect_right(days, last_day)):
+            i = ids[j]
+            if not self.used[i] and (best_distance is None or abs(days[j] - day) < best_distance):
+                best, best_distance = i, abs(days[j] - day)
+        return best
+
+
+def match(expected: List[Expected], credits: List[Credit], tolerance: int = TOLERANCE_CENTS,
+          days_before: int = DAYS_BEFORE, days_after: int = DAYS_AFTER) -> Tuple[List[Dict], List[Credit]]:
+    """Concilia as previsões com os créditos.
+
+    Retorna (um resultado por previsão, créditos que sobraram).
+    """
+    index = _CreditIndex(credits)
+    results = {}
+
+    def close(item, status, match_type, i=None, received=None):
+        credit = credits[i] if i is not None else None
+        results[item.ccb] = {
+            'ccb': item.ccb, 'status': status, 'match_type': match_type,
+            'expected_day': item.day, 'expected_cents': item.cents,
+            'parceiro': item.parceiro, 'cnpj': item.cnpj,
+            'transaction_key': credit.key if credit else None,
+            'transaction_day': credit.day if credit else None,
+            'received_cents': received,
+            'difference_cents': received - item.cents if received is not None else None,
+        }
+
+    # 1. Um crédito para cada previsão
+    pending = []
+    for item in sorted(expected, key=lambda item: (item.day, item.cents)):
+        i = index.by_amount(item.cnpj, item.cents, item.day,
+                            item.day - days_before, item.day + days_after, tolerance)
+        if i is None:
+            pending.append(item)
+        else:
+            index.used[i] = True
+            close(item, 'matched', 'valor', i, credits[i].cents)
+
+    # 2. Um crédito pagando várias previsões do parceiro (no dia, depois no mês)
+    def month_of(item):
+        day = date.fromordinal(item.day)
+        return day.year * 12 + day.month
+
+    for match_type, period in (('dia', lambda item: item.day), ('mes', month_of)):
+        groups = defaultdict(list)
+        for item in pending:
+            groups[(item.parceiro, item.cnpj, period(item))].append(item)
+        pending = []
+        for (_, cnpj, _), items in groups.items():
+            if len(items) < 2:
+                pending.extend(items)
+                continue
+            total = sum(item.cents for item in items)
+            first_day = min(item.day for item in items) - days_before
+            last_day = max(item.day for item in items) + days_after
+            i = index.by_amount(cnpj, total, max(item.day for item in items), first_day, last_day,
+                                tolerance * len(items))
+            if i is None:
+                pending.extend(items)
+                continue
+            index.used[i] = True
+            # A diferença do grupo (se houver) fica na primeira CCB
+            residual = credits[i].cents - total
+            for n, item in enumerate(items):
+                close(item, 'matched', match_type, i, item.cents + (residual if n == 0 else 0))
+
+    # 3. Crédito do mesmo CNPJ na janela, com valor diferente do previsto
+    for item in pending:
+        i = index.by_day(item.cnpj, item.day, item.day - days_before, item.day + days_after) if item.cnpj else None
+        if i is None:
+            close(item, 'unmatched', None)
+        else:
+            index.used[i] = True
+            close(item, 'partial', 'parcial', i, credits[i].cents)
+
+    leftover = [credit for i, credit in enumerate(credits) if not index.used[i]]
+    return [results[item.ccb] for item in expected], leftover
+
+
+def get_connection(database: str = warehouse.WAREHOUSE_DB) -> sqlite3.Connection:
+    conn = warehouse.get_connection(database)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def set_partner_cnpj(parceiro: str, cnpj: str, database: str = warehouse.WAREHOUSE_DB) -> None:
+    """Associa o CNPJ pagador a um parceiro (vazio remove a associação)."""
+    normalized = normalize_cnpj(cnpj)
+    if cnpj and not normalized:
+        raise ValueError('CNPJ inválido')
+    conn = get_connection(database)
+    try:
+        if normalized:
+            conn.execute('INSERT OR REPLACE INTO reconciliation_partners (parceiro, cnpj) VALUES (?, ?)',
+                         (parceiro, normalized))
+        else:
+            conn.execute('DELETE FROM reconciliation_partners WHERE parceiro = ?', (parceiro,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _load_expected(conn: sqlite3.Connection, start: Optional[date], end: Optional[date]) -> List[Expected]:
+    where = ['c.recebida_cents > 0']
+    params = []
+    if start:
+        where.append('c.date >= ?')
+        params.append(start.isoformat())
+    if end:
+        where.append('c.date <= ?')
+        params.append(end.isoformat())
+    rows = conn.execute(f'''
+        SELECT c.ccb, c.date, c.recebida_cents, c.parceiro, COALESCE(p.cnpj, '')
+        FROM commissions c LEFT JOIN reconciliation_partners p ON p.parceiro = c.parceiro
+        WHERE {' AND '.join(where)}
+    ''', params)
+    return [Expected(ccb, date.fromisoformat(day).toordinal(), cents, parceiro, cnpj)
+            for ccb, day, cents, parceiro, cnpj in rows]
+
+
+def _load_credits(financeiro_db: str, first: Optional[date], last: Optional[date]) -> List[Credit]:
+    if not os.path.exists(financeiro_db):
+        raise FileNotFoundError(f'Banco do financeiro não encontrado: {financeiro_db}')
+    where = [f"type IN ({','.join('?' * len(CREDIT_TYPES))})", 'value > 0']
+    params = list(CREDIT_TYPES)
+    if first:
+        where.append('date >= ?')
+        params.append(first.isoformat())
+    if last:
+        # `date` pode vir com horário; o dia seguinte exclusivo cobre os dois formatos
+        where.append('date < ?')
+        params.append((last + timedelta(days=1)).isoformat())
+    conn = sqlite3.connect(f'file:{financeiro_db}?mode=ro', uri=True, timeout=warehouse.BUSY_TIMEOUT)
+    try:
+        # Banco ainda não migrado pelo financeiro (sem fingerprint): as chaves caem no id
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(transactions)')}
+        fingerprint = 'fingerprint' if 'fingerprint' in columns else 'NULL'
+        rows = conn.execute(f'''
+            SELECT id, {fingerprint}, date, value, document, description
+            FROM transactions WHERE {' AND '.join(where)}
+        ''', params).fetchall()
+    finally:
+        conn.close()
+
+    credits = []
+    for transaction_id, fingerprint, day, value, document, description in rows:
+        try:
+            parsed = date.fromisoformat(str(day)[:10])  # formato gravado pelo financeiro
+        except ValueError:
+            parsed = warehouse.parse_date(day)
+        if parsed is None:
+            continue
+        credits.append(Credit(fingerprint or f'id:{transaction_id}', parsed.toordinal(),
+                              warehouse.to_cents(value), credit_cnpj(document, description), description or ''))
+    return credits
+
+
+def run(start: Optional[date] = None, end: Optional[date] = None, full: bool = False,
+        tolerance: int = TOLERANCE_CENTS, days_before: int = DAYS_BEFORE, days_after: int = DAYS_AFTER,
+        database: str = warehouse.WAREHOUSE_DB, financeiro_db: str = FINANCEIRO_DB) -> Dict:
+    """Concilia as comissões com desembolso entre `start` e `end` (inclusive).
+
+    Conciliações fechadas em execuções anteriores são mantidas (e seus
+    créditos ficam reservados) enquanto o valor previsto da CCB não mudar;
+    `full=True` refaz tudo.
+    """
+    began = time.perf_counter()
+    conn = get_connection(database)
+    try:
+        expected = _load_expected(conn, start, end)
+        kept, reserved = set(), set()
+        if not full:
+            current = {item.ccb: item.cents for item in expected}
+            for ccb, key, cents in conn.execute('''
+                SELECT ccb, transaction_key, expected_cents FROM reconciliation_results WHERE status = 'matched'
+            '''):
+                if current.get(ccb) == cents:
+                    kept.add(ccb)
+                # Reservado só se a conciliação continua valendo (mantida ou fora do período);
+                # CCBs com valor alterado voltam a disputar o próprio crédito
+                if key and (ccb in kept or ccb not in current):
+                    reserved.add(key)
+        pending = [item for item in expected if item.ccb not in kept]
+
+        first = start - timedelta(days=days_before) if start else None
+        last = end + timedelta(days=days_after) if end else None
+        credits = [credit for credit in _load_credits(financeiro_db, first, last) if credit.key not in reserved]
+        results, leftover = match(pending, credits, tolerance, days_before, days_after)
+
+        counts = {status: 0 for status in STATUSES}
+        for result in results:
+            counts[result['status']] += 1
+
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO reconciliation_runs (created_at, start, end, tolerance_cents, days_before, days_after)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (datetime.now().isoformat(timespec='seconds'), start.isoformat() if start else None,
+              end.isoformat() if end else None, tolerance, days_before, days_after))
+        run_id = cursor.lastrowid
+        if full:
+            cursor.execute('DELETE FROM reconciliation_results')
+        cursor.executemany('INSERT OR REPLACE INTO reconciliation_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+            (r['ccb'], run_id, r['status'], r['match_type'], date.fromordinal(r['expected_day']).isoformat(),
+             r['expected_cents'], r['parceiro'], r['cnpj'], r['transaction_key'],
+             date.fromordinal(r['transaction_day']).isoformat() if r['transaction_day'] else None,
+             r['received_cents'], r['difference_cents'])
+            for r in results
+        ])
+        cursor.execute('DELETE FROM reconciliation_credits')
+        cursor.executemany('INSERT OR REPLACE INTO reconciliation_credits VALUES (?, ?, ?, ?, ?, ?)', [
+            (credit.key, run_id, date.fromordinal(credit.day).isoformat(), credit.cents, credit.cnpj,
+             credit.description)
+            for credit in leftover
+        ])
+        seconds = time.perf_counter() - began
+        cursor.execute('''
+            UPDATE reconciliation_runs
+            SET kept = ?, matched = ?, partial = ?, unmatched = ?, unmatched_credits = ?, seconds = ?
+            WHERE id = ?
+        ''', (len(kept), counts['matched'], counts['partial'], counts['unmatched'], len(leftover), seconds, run_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {'run_id': run_id, 'kept': len(kept), 'processed': len(results), **counts,
+            'credits': len(credits), 'unmatched_credits': len(leftover), 'seconds': seconds}
+
+
+def report(status: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None,
+           limit: int = 200, database: str = warehouse.WAREHOUSE_DB) -> Dict:
+    """Resumo por situação, as conciliações (filtradas) e os créditos sem previsão."""
+    if status is not None and status not in STATUSES:
+        raise ValueError(f'status deve ser um de {STATUSES}')
+    where, params = [], []
+    if start:
+        where.append('expected_date >= ?')
+        params.append(start.isoformat())
+    if end:
+        where.append('expected_date <= ?')
+        params.append(end.isoformat())
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ''
+
+    conn = get_connection(database)
+    conn.row_factory = sqlite3.Row
+    try:
+        resumo = {name: {'ccbs': 0, 'expected_cents': 0, 'received_cents': 0} for name in STATUSES}
+        for row in conn.execute(f'''
+            SELECT status, COUNT(*) AS ccbs, SUM(expected_cents) AS expected_cents,
+                   COALESCE(SUM(received_cents), 0) AS received_cents
+            FROM reconciliation_results {where_sql} GROUP BY status
+        ''', params):
+            resumo[row['status']] = {key: row[key] for key in ('ccbs', 'expected_cents', 'received_cents')}
+
+        item_where = where + (['status = ?'] if status else [])
+        itens = [dict(row) for row in conn.execute(f'''
+            SELECT * FROM reconciliation_results
+            {f"WHERE {' AND '.join(item_where)}" if item_where else ''}
+            ORDER BY expected_date, ccb LIMIT ?
+        ''', params + ([status] if status else []) + [limit])]
+        creditos = [dict(row) for row in conn.execute(
+            'SELECT * FROM reconciliation_credits ORDER BY date LIMIT ?', (limit,))]
+        ultima = conn.execute('SELECT * FROM reconciliation_runs ORDER BY id DESC LIMIT 1').fetchone()
+    finally:
+        conn.close()
+    return {'resumo': resumo, 'itens': itens, 'creditos_sem_previsao': creditos,
+            'execucao': dict(ultima) if ultima else None}
+
+
+def benchmark(ccbs: int = 120000, partners: int = 12) -> Dict:
+    """Um ano de comissões e créditos sintéticos: conciliação completa e incremental"""
+    rng = random.Random(42)
+    year_start = date(date.today().year - 1, 1, 1)
+    parceiros = [(f'PARCEIRO {i}', f'{10 ** 13 + i * 7919:014d}') for i in range(partners)]
+
+    rows, transactions = [], []
+    for n in range(ccbs):
+        parceiro, cnpj = rng.choice(parceiros)
+        day = year_start + timedelta(days=rng.randrange(365))
+        recebida = round(rng.uniform(50, 3000), 2)
+        rows.append({'CCB': str(n), warehouse.DATE_COLUMN: day.isoformat(), 'Parceiro': parceiro,
+                     'Valor Bruto': recebida * 30, 'comissao_recebida_valor': recebida})
+        paid = day + timedelta(days=rng.randint(0, 30))
+        outcome = rng.random()
+        if outcome < 0.75:
+            transactions.append((paid, recebida, cnpj))
+        elif outcome < 0.85:
+            transactions.append((paid, round(recebida * 0.8, 2), cnpj))
+    for _ in range(ccbs // 10):  # créditos que não são comissão
+        transactions.append((year_start + timedelta(days=rng.randrange(400)), round(rng.uniform(10, 5000), 2), ''))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'comissoes.db')
+        financeiro_db = os.path.join(tmp, 'financas.db')
+        warehouse.save_run(rows, source='benchmark', database=database)
+        for parceiro, cnpj in parceiros:
+            set_partner_cnpj(parceiro, cnpj, database=database)
+
+        conn = sqlite3.connect(financeiro_db)
+        conn.execute('''CREATE TABLE transactions (id INTEGER PRIMARY KEY, date DATE, description TEXT,
+                        document TEXT, value REAL, type TEXT, fingerprint TEXT)''')
+        conn.executemany('INSERT INTO transactions (date, description, document, value, type, fingerprint) '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         [(day.isoformat(), f'PIX RECEBIDO (CNPJ: {cnpj})' if cnpj else 'PIX RECEBIDO', None,
+                           value, 'PIX RECEBIDO', f'fp{n}') for n, (day, value, cnpj) in enumerate(transactions)])
+        conn.commit()
+        conn.close()
+
+        first = run(database=database, financeiro_db=financeiro_db)
+        second = run(database=database, financeiro_db=financeiro_db)
+    return {'ccbs': ccbs, 'credits': len(transactions), 'full': first, 'incremental': second}
+
+
+if __name__ == '__main__':
+    result = benchmark()
+    print(f"{result['ccbs']} comissões, {result['credits']} créditos")
+    for name in ('full', 'incremental'):
+        r = result[name]
+        print(f"  {name:12s} {r['seconds']:.2f}s  mantidas {r['kept']}, conciliadas {r['matched']}, "
+              f"parciais {r['partial']}, sem crédito {r['unmatched']}, créditos sem previsão {r['unmatched_credits']}")
@@ -0,0 +1,218 @@
+import bisect
+import random
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+NAME_FIELDS = ('Nome', 'nome', 'Cliente')
+DOCUMENT_FIELDS = ('CPF/CNPJ', 'Documento', 'documento', 'CPF', 'CNPJ')
+MIN_NAME_SCORE = 0.5  # fração mínima dos trigramas da busca presentes no nome
+CACHE_SIZE = 8  # índices mantidos em memória por processo (um por upload)
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalize_text(value) -> str:
+    """Minúsculas, sem acentos e com espaços simples ('  João ' -> 'joao')."""
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in text.lower()).split())
+
+
+def normalize_key(value) -> str:
+    """CCB/documento sem pontuação ('123.456.789-00' -> '12345678900')."""
+    return ''.join(ch for ch in str(value or '').upper() if ch.isalnum())
+
+
+def _first(row: Dict, fields) -> str:
+    for field in fields:
+        if row.get(field):
+            return str(row[field]).strip()
+    return ''
+
+
+def _trigrams(text: str, prefix: bool = False) -> List[str]:
+    # Cada palavra ganha dois espaços antes, então 'jo' já casa com o início de 'joao';
+    # na busca a última palavra fica sem o espaço final (ainda está sendo digitada)
+    words = text.split()
+    grams = []
+    for i, word in enumerate(words):
+        padded = '  ' + word + ('' if prefix and i == len(words) - 1 else ' ')
+        grams.extend(padded[j:j + 3] for j in range(len(padded) - 2))
+    return list(dict.fromkeys(grams))
+
+
+class SearchIndex:
+    """Índice de busca de um conjunto de dados carregado.
+
+    CCB e CPF/CNPJ ficam em listas ordenadas (busca por prefixo com bisect);
+    nomes ficam em listas invertidas de trigramas, sem acentos, e a busca
+    conta quantos trigramas da consulta cada nome contém.
+    """
+
+    def __init__(self, dados: List[Dict]):
+        self.rows = []  # (ccb, nome, documento) de cada linha
+        ccbs, documents, postings = [], [], {}
+        name_grams = []
+        grams_by_name = {}  # nomes se repetem (várias CCBs por cliente)
+        for pos, row in enumerate(dados):
+            ccb = str(row.get('CCB') or '').strip()
+            nome = _first(row, NAME_FIELDS)
+            documento = _first(row, DOCUMENT_FIELDS)
+            self.rows.append((ccb, nome, documento))
+            if ccb:
+                ccbs.append((normalize_key(ccb), pos))
+            if documento:
+                documents.append((normalize_key(documento), pos))
+            grams = grams_by_name.get(nome)
+            if grams is None:
+                grams = grams_by_name[nome] = _trigrams(normalize_text(nome))
+            name_grams.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(pos)
+
+        ccbs.sort()
+        documents.sort()
+        self._ccb_keys = [key for key, _ in ccbs]
+        self._ccb_pos = [pos for _, pos in ccbs]
+        self._doc_keys = [key for key, _ in documents]
+        self._doc_pos = [pos for _, pos in documents]
+        self._postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self._name_grams = np.array(name_grams, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def find_ccb(self, ccb) -> Optional[int]:
+        """Posição da linha com exatamente esta CCB (ignorando pontuação), ou None."""
+        key = normalize_key(ccb)
+        i = bisect.bisect_left(self._ccb_keys, key)
+        if key and i < len(self._ccb_keys) and self._ccb_keys[i] == key:
+            return self._ccb_pos[i]
+        return None
+
+    @staticmethod
+    def _prefix(keys, positions, prefix, limit):
+        found = []
+        i = bisect.bisect_left(keys, prefix)
+        while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+            found.append(positions[i])
+            i += 1
+        return found
+
+    def _names(self, text, limit):
+        grams = _trigrams(text, prefix=True)
+        arrays = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not arrays:
+            return []
+        hits = np.bincount(np.concatenate(arrays), minlength=len(self.rows))
+        candidates = np.flatnonzero(hits >= max(1, int(np.ceil(len(grams) * MIN_NAME_SCORE))))
+        if not len(candidates):
+            return []
+        # Mais trigramas em comum primeiro; no empate, o nome mais curto (mais parecido)
+        score = hits[candidates] / len(grams)
+        order = np.lexsort((self._name_grams[candidates], -score))[:limit]
+        return [(int(candidates[i]), float(score[i])) for i in order]
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        """Melhores ocorrências para o texto digitado: prefixos de CCB e de
+        documento primeiro, depois nomes parecidos."""
+        results, seen = [], set()
+
+        def add(pos, campo, score):
+            if pos not in seen and len(results) < limit:
+                seen.add(pos)
+                ccb, nome, documento = self.rows[pos]
+                results.append({'ccb': ccb, 'nome': nome, 'documento': documento,
+                                'campo': campo, 'score': round(score, 3)})
+
+        key = normalize_key(query)
+        if key:
+            for pos in self._prefix(self._ccb_keys, self._ccb_pos, key, limit):
+                add(pos, 'ccb', 1.0)
+            if key.isdigit():
+                for pos in self._prefix(self._doc_keys, self._doc_pos, key, limit):
+                    add(pos, 'documento', 1.0)
+        text = normalize_text(query)
+        if any(ch.isalpha() for ch in text):
+            for pos, score in self._names(text, limit):
+                add(pos, 'nome', score)
+        return results
+
+
+def _store(key: str, index: SearchIndex) -> None:
+    with _lock:
+        _cache[key] = index
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def register(dados: List[Dict]) -> str:
+    """Constrói o índice de um upload e devolve a chave guardada na sessão."""
+    key = uuid.uuid4().hex
+    _store(key, SearchIndex(dados))
+    return key
+
+
+def get_index(key: Optional[str], dados: List[Dict]) -> SearchIndex:
+    """Índice do upload `key`; reconstruído a partir de `dados` se este
+    processo ainda não o tiver (outro worker, reinício)."""
+    with _lock:
+        index = _cache.get(key) if key else None
+        if index is not None and len(index) == len(dados):
+            _cache.move_to_end(key)
+            return index
+    index = SearchIndex(dados)
+    if key:
+        _store(key, index)
+    return index
+
+
+def benchmark(rows=100000, queries=200):
+    """Tempo de construção e de consulta do índice com dados sintéticos"""
+    rng = random.Random(42)
+    first = ['João', 'Maria', 'José', 'Ana', 'Antônio', 'Francisca', 'Carlos', 'Luíza', 'Paulo', 'Márcia']
+    last = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Gonçalves', 'Araújo', 'Conceição']
+    dados = [{
+        'CCB': f'{rng.randint(10 ** 8, 10 ** 9 - 1)}',
+        'Nome': f'{rng.choice(first)} {rng.choice(last)} {rng.choice(last)}',
+        'CPF/CNPJ': f'{rng.randint(0, 999):03d}.{rng.randint(0, 999):03d}.{rng.randint(0, 999):03d}-{rng.randint(0, 99):02d}',
+    } for _ in range(rows)]
+
+    start = time.perf_counter()
+    index = SearchIndex(dados)
+    build = time.perf_counter() - start
+
+    samples = []
+    for _ in range(queries):
+        row = rng.choice(dados)
+        samples.extend([row['CCB'][:rng.randint(3, 9)], row['CPF/CNPJ'][:rng.randint(3, 14)],
+                        normalize_text(row['Nome'])[:rng.randint(3, 20)]])
+
+    timings = []
+    for query in samples:
+        start = time.perf_counter()
+        index.suggest(query)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'rows': rows,
+        'build_seconds': build,
+        'queries': len(samples),
+        'median_ms': timings[len(timings) // 2] * 1000,
+        'p99_ms': timings[int(len(timings) * 0.99)] * 1000,
+        'max_ms': timings[-1] * 1000,
+    }
+
+
+if __name__ == '__main__':
+    result = benchmark()
+    print(f"{result['rows']} linhas, índice construído em {result['build_seconds']:.2f}s")
+    print(f"{result['queries']} buscas: mediana {result['median_ms']:.2f} ms, "
+          f"p99 {result['p99_ms']:.2f} ms, máx {result['max_ms']:.2f} ms")
@@ -14,7 +14,8 @@ const handleDetails = {
                         const dados = JSON.parse(contratoData);
                         console.log('Parsed data:', dados);
                         if (dados.CCB) {
-                            window.location.href = `/resultado?ccb=${dados.CCB}`;
+                            // SCRIPT_ROOT: prefixo onde o app está montado ('' quando roda sozinho, '/comissoes' no portal)
+                            window.location.href = `${window.SCRIPT_ROOT || ''}/resultado?ccb=${encodeURIComponent(dados.CCB)}`;
                         } else {
                             console.error('CCB não encontrado nos dados');
                         }
@@ -0,0 +1,340 @@
+"""Histórico de comissões calculadas, para consultas entre meses.
+
+Cada CCB salvo ocupa uma linha em `commissions` (salvar de novo substitui a
+linha anterior) com valores em centavos inteiros e a coluna `month`
+(AAAA-MM) que particiona os dados. `commission_monthly` guarda os totais por
+mês/usuário/tabela/parceiro e é recalculada apenas para os meses tocados
+por cada gravação. As consultas somam os meses inteiros do intervalo na
+tabela mensal e só leem as linhas individuais nas pontas parciais, então o
+custo não cresce com os anos de histórico.
+
+Execute `python warehouse.py` para medir as consultas com dados sintéticos.
+"""
+import calendar
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+WAREHOUSE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'comissoes.db')
+BUSY_TIMEOUT = 30  # seconds
+GROUP_COLUMNS = ('usuario', 'tabela', 'parceiro', 'month')
+DATE_COLUMN = 'Data do Desembolso'
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS commission_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        source TEXT,
+        rows INTEGER NOT NULL DEFAULT 0,
+        config_version INTEGER
+    )''',
+    '''CREATE TABLE IF NOT EXISTS commissions (
+        ccb TEXT PRIMARY KEY,
+        run_id INTEGER NOT NULL REFERENCES commission_runs(id),
+        date TEXT NOT NULL,
+        month TEXT NOT NULL,
+        cliente TEXT,
+        usuario TEXT NOT NULL DEFAULT '',
+        tabela TEXT NOT NULL DEFAULT '',
+        parceiro TEXT NOT NULL DEFAULT '',
+        valor_bruto_cents INTEGER NOT NULL DEFAULT 0,
+        valor_liquido_cents INTEGER NOT NULL DEFAULT 0,
+        recebida_cents INTEGER NOT NULL DEFAULT 0,
+        repassada_cents INTEGER NOT NULL DEFAULT 0
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_commissions_date ON commissions(date)',
+    'CREATE INDEX IF NOT EXISTS idx_commissions_month ON commissions(month, usuario, tabela, parceiro)',
+    '''CREATE TABLE IF NOT EXISTS commission_monthly (
+        month TEXT NOT NULL,
+        usuario TEXT NOT NULL,
+        tabela TEXT NOT NULL,
+        parceiro TEXT NOT NULL,
+        contratos INTEGER NOT NULL,
+        valor_bruto_cents INTEGER NOT NULL,
+        valor_liquido_cents INTEGER NOT NULL,
+        recebida_cents INTEGER NOT NULL,
+        repassada_cents INTEGER NOT NULL,
+        PRIMARY KEY (month, usuario, tabela, parceiro)
+    )''',
+]
+
+# Colunas adicionadas depois da criação das tabelas: (tabela, coluna, tipo)
+MIGRATIONS = [
+    ('commission_runs', 'config_version', 'INTEGER'),  # versão das tabelas de comissão usada
+]
+
+TOTALS_SQL = '''COUNT(*), SUM(valor_bruto_cents), SUM(valor_liquido_cents),
+                SUM(recebida_cents), SUM(repassada_cents)'''
+ROLLUP_TOTALS_SQL = '''SUM(contratos), SUM(valor_bruto_cents), SUM(valor_liquido_cents),
+                       SUM(recebida_cents), SUM(repassada_cents)'''
+
+
+def open_connection(database: str = WAREHOUSE_DB) -> sqlite3.Connection:
+    """Connection without the schema checks, for databases already set up by get_connection."""
+    conn = sqlite3.connect(database, timeout=BUSY_TIMEOUT)
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def get_connection(database: str = WAREHOUSE_DB) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(database), exist_ok=True)
+    conn = open_connection(database)
+    conn.execute('PRAGMA journal_mode=WAL')
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for table, column, kind in MIGRATIONS:
+        if column not in {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {kind}')
+    return conn
+
+
+def to_cents(value) -> int:
+    """Round a monetary value to whole cents, with the same rule as commission_engine.to_cents."""
+    try:
+        value = float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    cents = int(round(abs(value) * 100, 6) + 0.5)
+    return cents if value >= 0 else -cents
+
+
+def parse_date(value) -> Optional[date]:
+    """Accepts datetime/Timestamp values and 'dd/mm/aaaa' or 'aaaa-mm-dd' strings."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()[:10]
+    for fmt in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _row(item: Dict, run_id: int, fallback: date) -> Optional[Tuple]:
+    ccb = str(item.get('CCB') or '').strip()
+    if not ccb or ccb.startswith('SEM_CCB_'):
+        return None
+    when = parse_date(item.get(DATE_COLUMN)) or fallback
+    return (
+        ccb, run_id, when.isoformat(), when.strftime('%Y-%m'),
+        item.get('Cliente') or item.get('Nome') or '',
+        str(item.get('Usuário') or item.get('Usuario') or ''),
+        str(item.get('Tabela') or ''),
+        str(item.get('Parceiro') or ''),
+        to_cents(item.get('Valor Bruto')),
+        to_cents(item.get('Valor Líquido')),
+        to_cents(item.get('comissao_recebida_valor')),
+        to_cents(item.get('comissao_repassada_valor')),
+    )
+
+
+def _refresh_months(cursor: sqlite3.Cursor, months: Iterable[str]) -> None:
+    """Recalcula `commission_monthly` para os meses informados"""
+    months = sorted(set(months))
+    for start in range(0, len(months), 500):
+        chunk = months[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'DELETE FROM commission_monthly WHERE month IN ({placeholders})', chunk)
+        cursor.execute(f'''
+            INSERT INTO commission_monthly
+            SELECT month, usuario, tabela, parceiro, {TOTALS_SQL}
+            FROM commissions WHERE month IN ({placeholders})
+            GROUP BY month, usuario, tabela, parceiro
+        ''', chunk)
+
+
+def save_run(comissoes: Iterable[Dict], source: Optional[str] = None, config_version: Optional[int] = None,
+             database: str = WAREHOUSE_DB) -> Dict[str, int]:
+    """Persist a computed commission run; CCBs already stored are replaced.
+
+    Rows without a disbursement date are filed under today's date; rows
+    without a CCB cannot be deduplicated and are skipped. `config_version`
+    records which version of the commission tables produced the values.
+    """
+    conn = get_connection(database)
+    try:
+        cursor = conn.cursor()
+        now = datetime.now()
+        cursor.execute('INSERT INTO commission_runs (created_at, source, config_version) VALUES (?, ?, ?)',
+                       (now.isoformat(timespec='seconds'), source, config_version))
+        run_id = cursor.lastrowid
+
+        rows = []
+        skipped = 0
+        for item in comissoes:
+            row = _row(item, run_id, now.date())
+            if row is None:
+                skipped += 1
+            else:
+                rows.append(row)
+
+        # Meses antigos das CCBs regravadas também precisam ser recalculados
+        months = {row[3] for row in rows}
+        ccbs = [row[0] for row in rows]
+        for start in range(0, len(ccbs), 500):
+            chunk = ccbs[start:start + 500]
+            cursor.execute(f"SELECT DISTINCT month FROM commissions WHERE ccb IN ({','.join('?' * len(chunk))})", chunk)
+            months.update(month for month, in cursor.fetchall())
+
+        cursor.executemany('INSERT OR REPLACE INTO commissions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        _refresh_months(cursor, months)
+        cursor.execute('UPDATE commission_runs SET rows = ? WHERE id = ?', (len(rows), run_id))
+        conn.commit()
+        return {'run_id': run_id, 'saved': len(rows), 'skipped': skipped, 'months': len(months)}
+    finally:
+        conn.close()
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _month_end(day: date) -> date:
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _split_range(start: Optional[date], end: Optional[date]):
+    """Divide [start, end] em meses inteiros e pontas parciais (intervalos de datas)"""
+    first_full = start if start is None or start.day == 1 else _month_end(start) + timedelta(days=1)
+    last_full = end if end is None or end == _month_end(end) else _month_start(end) - timedelta(days=1)
+
+    if first_full is not None and last_full is not None and first_full > last_full:
+        return None, [(start, end)]
+
+    months = (first_full.strftime('%Y-%m') if first_full else None,
+              last_full.strftime('%Y-%m') if last_full else None)
+    partial = []
+    if start is not None and first_full != start:
+        partial.append((start, first_full - timedelta(days=1)))
+    if end is not None and last_full != end:
+        partial.append((last_full + timedelta(days=1), end))
+    return months, partial
+
+
+def aggregate(group_by: Optional[str] = 'usuario', start: Optional[date] = None, end: Optional[date] = None,
+              usuario: Optional[str] = None, tabela: Optional[str] = None, parceiro: Optional[str] = None,
+              database: str = WAREHOUSE_DB) -> List[Dict]:
+    """Commission totals between `start` and `end` (inclusive), grouped by
+    usuario, tabela, parceiro or month (None for a single total row).
+    Amounts are returned in cents."""
+    if group_by is not None and group_by not in GROUP_COLUMNS:
+        raise ValueError(f'group_by deve ser um de {GROUP_COLUMNS}')
+
+    filters = []
+    params = []
+    for column, value in (('usuario', usuario), ('tabela', tabela), ('parceiro', parceiro)):
+        if value:
+            filters.append(f'{column} = ?')
+            params.append(value)
+
+    key = group_by or "''"
+    group_sql = f'GROUP BY {group_by}' if group_by else ''
+    months, partial = _split_range(start, end)
+
+    queries = []
+    if months is not None:
+        where = list(filters)
+        month_params = list(params)
+        if months[0]:
+            where.append('month >= ?')
+            month_params.append(months[0])
+        if months[1]:
+            where.append('month <= ?')
+            month_params.append(months[1])
+        queries.append((f'''SELECT {key}, {ROLLUP_TOTALS_SQL} FROM commission_monthly
+                            {'WHERE ' + ' AND '.join(where) if where else ''} {group_sql}''', month_params))
+    for first, last in partial:
+        where = filters + ['date BETWEEN ? AND ?']
+        queries.append((f'''SELECT {key}, {TOTALS_SQL} FROM commissions
+                            WHERE {' AND '.join(where)} {group_sql}''',
+                        params + [first.isoformat(), last.isoformat()]))
+
+    totals: Dict[str, List[int]] = {}
+    conn = get_connection(database)
+    try:
+        for sql, query_params in queries:
+            for group, *values in conn.execute(sql, query_params):
+                if not values[0]:
+                    continue
+                current = totals.setdefault(group, [0] * 5)
+                for i, value in enumerate(values):
+                    current[i] += value or 0
+    finally:
+        conn.close()
+
+    return [
+        {
+            'grupo': group,
+            'contratos': values[0],
+            'valor_bruto_cents': values[1],
+            'valor_liquido_cents': values[2],
+            'comissao_recebida_cents': values[3],
+            'comissao_repassada_cents': values[4],
+        }
+        for group, values in sorted(totals.items(), key=lambda item: str(item[0]))
+    ]
+
+
+def benchmark(years: int = 5, rows_per_month: int = 20000) -> Dict[str, float]:
+    """Grava `years` anos de comissões sintéticas e mede as consultas agregadas"""
+    rng = random.Random(42)
+    usuarios = [f'USUARIO {i}' for i in range(40)]
+    tabelas = [f'TABELA {i}' for i in range(25)]
+    parceiros = [f'PARCEIRO {i}' for i in range(10)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        today = date.today()
+        start_save = time.perf_counter()
+        ccb = 0
+        for months_ago in range(years * 12):
+            year, month = divmod(today.year * 12 + today.month - 1 - months_ago, 12)
+            month += 1
+            last_day = calendar.monthrange(year, month)[1]
+            rows = []
+            for _ in range(rows_per_month):
+                ccb += 1
+                bruto = rng.uniform(1000, 50000)
+                rows.append({
+                    'CCB': str(ccb),
+                    DATE_COLUMN: date(year, month, rng.randint(1, last_day)).strftime('%d/%m/%Y'),
+                    'Usuário': rng.choice(usuarios),
+                    'Tabela': rng.choice(tabelas),
+                    'Parceiro': rng.choice(parceiros),
+                    'Valor Bruto': bruto,
+                    'Valor Líquido': bruto * 0.9,
+                    'comissao_recebida_valor': bruto * 0.03,
+                    'comissao_repassada_valor': bruto * 0.015,
+                })
+            save_run(rows, source='benchmark', database=database)
+        save_time = time.perf_counter() - start_save
+
+        end = today
+        start = date(today.year - 1, today.month, 15)
+        timings = {}
+        for name, kwargs in [
+            ('por usuário, 12 meses', {'group_by': 'usuario', 'start': start, 'end': end}),
+            ('por tabela, tudo', {'group_by': 'tabela'}),
+            ('por mês, um usuário', {'group_by': 'month', 'usuario': usuarios[0]}),
+            ('parceiro, intervalo parcial', {'group_by': 'parceiro', 'start': start, 'end': start + timedelta(days=40)}),
+        ]:
+            began = time.perf_counter()
+            aggregate(database=database, **kwargs)
+            timings[name] = time.perf_counter() - began
+        return {'rows': ccb, 'save_seconds': save_time, 'queries': timings}
+
+
+if __name__ == '__main__':
+    result = benchmark()
+    print(f"{result['rows']} comissões gravadas em {result['save_seconds']:.1f}s")
+    for name, seconds in result['queries'].items():
+        print(f"  {name:30s} {seconds * 1000:.1f} ms")
@@ -0,0 +1,173 @@
+"""Pipeline de arquivos estáticos: nomes com hash, gzip/brotli e cache imutável.
+
+`python assets.py` copia os arquivos de cada pasta static para `static/dist/`
+com o hash do conteúdo no nome (ex.: css/styles.3f2a9c1b7d.css), grava versões
+.gz e .br dos arquivos de texto e um `manifest.json`. Em tempo de execução,
+`StaticAssets(app)` faz `url_for('static', filename=...)` apontar para a versão
+com hash e serve essas versões pré-comprimidas com Cache-Control imutável.
+Sem manifest (ou com o arquivo original alterado depois do build) os arquivos
+originais continuam sendo servidos normalmente.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:  # compressão brotli opcional
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 10
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.json', '.txt', '.map')
+MIN_COMPRESS_BYTES = 256          # abaixo disso a compressão não compensa
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Encodings aceitos, em ordem de preferência
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIRS = [
+    os.path.join(project_root, 'static'),
+    os.path.join(project_root, 'Comissoes.af360bank', 'static'),
+    os.path.join(project_root, 'financeiro.af360bank', 'static'),
+]
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def _compress(path):
+    """Grava path.gz (e path.br, se o brotli estiver instalado) ao lado do arquivo"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return []
+
+    written = []
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        with open(path + '.gz', 'wb') as f:
+            f.write(compressed)
+        written.append('gzip')
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            with open(path + '.br', 'wb') as f:
+                f.write(compressed)
+            written.append('br')
+    return written
+
+
+def build(static_dir):
+    """Gera `static_dir/dist` e o manifest; retorna o manifest (original -> versão com hash)"""
+    dist = os.path.join(static_dir, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for name in files:
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            base, ext = os.path.splitext(relative)
+            hashed = f'{base}.{content_hash(source)}{ext}'
+
+            target = os.path.join(dist, *hashed.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+                _compress(target)
+            manifest[relative] = f'{DIST_DIR}/{hashed}'
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_dir):
+    """Lê o manifest, ignorando entradas cujo original mudou depois do build"""
+    path = os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        built_at = os.path.getmtime(path)
+    except (OSError, ValueError):
+        return {}
+
+    fresh = {}
+    for original, hashed in manifest.items():
+        source = os.path.join(static_dir, *original.split('/'))
+        target = os.path.join(static_dir, *hashed.split('/'))
+        try:
+            if os.path.getmtime(source) <= built_at and os.path.exists(target):
+                fresh[original] = hashed
+        except OSError:
+            continue
+    return fresh
+
+
+class StaticAssets:
+    """Liga o manifest ao `url_for('static')` e serve os arquivos com hash"""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.hashed = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.has_static_folder:
+            return
+        self.static_folder = app.static_folder
+        self.manifest = load_manifest(app.static_folder)
+        self.hashed = set(self.manifest.values())
+        if not self.manifest:
+            return
+
+        app.url_defaults(self._rewrite_url)
+        self._send_static = app.view_functions['static']
+        app.view_functions['static'] = self.send_static
+
+    def _rewrite_url(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.manifest.get(values['filename'], values['filename'])
+
+    def send_static(self, filename):
+        if filename not in self.hashed:
+            return self._send_static(filename)
+
+        from flask import request, send_from_directory
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        accepted = request.accept_encodings
+        # Maior q primeiro (empate: ordem de ENCODINGS); q=0 significa recusado
+        for encoding, suffix in sorted(ENCODINGS, key=lambda item: -accepted[item[0]]):
+            if accepted[encoding] > 0 and os.path.exists(os.path.join(self.static_folder, filename + suffix)):
+                response = send_from_directory(self.static_folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.static_folder, filename, mimetype=mimetype)
+
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+if __name__ == '__main__':
+    for static_dir in sys.argv[1:] or STATIC_DIRS:
+        manifest = build(static_dir)
+        print(f"{static_dir}: {len(manifest)} arquivos em {DIST_DIR}/"
+              f"{'' if brotli is not None else ' (sem brotli: instale o pacote brotli)'}")
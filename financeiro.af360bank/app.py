@@ -1,10 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, Response, stream_with_context
 from datetime import datetime, timedelta
-import sqlite3
 import os
 import pandas as pd
 from werkzeug.utils import secure_filename
 from read_excel import process_excel_file
+from spreadsheet import read_spreadsheet
+from database import get_db_connection, writing
+from fingerprint import normalize_description, transaction_fingerprint, known_fingerprints, backfill_fingerprints
+from progress import ProgressRegistry, FINISHED_STATUSES
+from jobs import JobExecutor, JobCancelled, QueueFull
+from ratelimit import rate_limit
+from classifier import import_classifier, fallback_transaction_type, find_enrich_cnpj
 from functools import wraps
 import time
 import requests
@@ -12,56 +18,45 @@ from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 import uuid
 import threading
+import json
+from markupsafe import escape
 
-UPLOAD_FOLDER = 'uploads'
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+INSTANCE_FOLDER = os.path.join(BASE_DIR, 'instance')
 
 app = Blueprint('financeiro', __name__,
                 template_folder='templates',
                 static_folder='static')
 
 # Ensure the upload and instance folders exist
-for folder in ['instance', 'uploads']:
+for folder in [INSTANCE_FOLDER, UPLOAD_FOLDER]:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
-# Rate limiting configuration
-RATE_LIMIT_WINDOW = 60  # seconds
-REQUEST_LIMIT = 60      # requests per window
-request_history = {}
-
-def rate_limit():
-    def decorator(f):
-        @wraps(f)
-        def wrapped(*args, **kwargs):
-            now = time.time()
-            client_ip = request.remote_addr
-            
-            # Initialize or clean old requests
-            if client_ip not in request_history:
-                request_history[client_ip] = []
-            request_history[client_ip] = [t for t in request_history[client_ip] if t > now - RATE_LIMIT_WINDOW]
-            
-            # Check rate limit
-            if len(request_history[client_ip]) >= REQUEST_LIMIT:
-                return jsonify({'error': 'Rate limit exceeded. Please try again later.'}), 429
-            
-            # Add current request
-            request_history[client_ip].append(now)
-            return f(*args, **kwargs)
-        return wrapped
-    return decorator
+# Colunas adicionadas depois da criação das tabelas: (tabela, coluna, tipo)
+MIGRATIONS = [
+    ('transactions', 'fingerprint', 'TEXT'),  # chave que impede importar a mesma linha duas vezes
+]
+
+def table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return cursor.fetchone() is not None
 
 # Database initialization
-def init_db():
-    conn = sqlite3.connect('instance/financas.db')
+def init_db(conn=None):
+    """Cria o que ainda não existe; nunca apaga dados (roda na importação do
+    módulo, em cada worker do gunicorn quando o portal monta o financeiro).
+
+    Tudo roda em uma única transação IMMEDIATE: com vários workers subindo
+    juntos, só o primeiro cria as tabelas novas e as preenche com o histórico.
+    """
+    conn = conn or get_db_connection()
     c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
     
-    # Primeiro, verifica se a tabela existe
-    c.execute("DROP TABLE IF EXISTS transactions")
-    
-    # Cria a tabela com a nova estrutura
     c.execute('''
-        CREATE TABLE transactions (
+        CREATE TABLE IF NOT EXISTS transactions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             date DATE NOT NULL,
             description TEXT NOT NULL,
@@ -70,10 +65,120 @@ def init_db():
             type TEXT NOT NULL,
             identifier TEXT,
             transaction_type TEXT NOT NULL,
+            fingerprint TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
+    # Bancos criados por versões anteriores não têm as colunas novas
+    for table, column, kind in MIGRATIONS:
+        if column not in {row[1] for row in c.execute(f'PRAGMA table_info({table})')}:
+            c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {kind}')
+    
+    # Linhas importadas antes da deduplicação: sem a impressão digital, reimportar
+    # o mesmo extrato duplicaria todas elas
+    backfill_fingerprints(c)
+    
+    # Impede que a mesma linha de extrato seja importada duas vezes
+    c.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint
+        ON transactions (fingerprint)
+    ''')
+    
+    # Índice usado pelo detalhamento paginado por tipo
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_type_date
+        ON transactions (type, date, id)
+    ''')
+
+    # Índices da listagem /api/transactions (ordenação por data ou valor, filtro por documento)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_transactions_value ON transactions (value, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_transactions_document_date ON transactions (document, date, id)')
+    
+    # Busca textual sobre as descrições (que já trazem a razão social após o
+    # enriquecimento) e o documento. Os gatilhos mantêm o índice em dia em toda
+    # inserção da importação e em toda atualização do enriquecimento.
+    rebuild_fts = not table_exists(c, 'transactions_fts')
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            description, document,
+            content='transactions', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    if rebuild_fts:
+        # Os gatilhos só cobrem o que entrar daqui em diante: indexa o histórico uma vez
+        c.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+            INSERT INTO transactions_fts (rowid, description, document)
+            VALUES (new.id, new.description, new.document);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description, document)
+            VALUES ('delete', old.id, old.description, old.document);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, document ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description, document)
+            VALUES ('delete', old.id, old.description, old.document);
+            INSERT INTO transactions_fts (rowid, description, document)
+            VALUES (new.id, new.description, new.document);
+        END
+    ''')
+    
+    # Resumo por tipo e mês, mantido incrementalmente durante a importação
+    seed_summary = not table_exists(c, 'transaction_summary')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_summary (
+            type TEXT NOT NULL,
+            month TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (type, month)
+        )
+    ''')
+    if seed_summary:
+        # Banco anterior ao resumo: parte das transações já gravadas (mesmas chaves de write_chunk)
+        c.execute('''
+            INSERT INTO transaction_summary (type, month, count, total)
+            SELECT type, substr(date, 1, 7), COUNT(*), SUM(value)
+            FROM transactions
+            GROUP BY type, substr(date, 1, 7)
+        ''')
+
+    # Entradas e saídas por dia e por mês de cada tipo, usadas pelo dashboard
+    for table, period, length in (('cashflow_daily', 'day', 10), ('cashflow_monthly', 'month', 7)):
+        seed_cashflow = not table_exists(c, table)
+        c.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {period} TEXT NOT NULL,
+                type TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                inflow REAL NOT NULL DEFAULT 0,
+                outflow REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY ({period}, type)
+            )
+        ''')
+        if seed_cashflow:
+            # Banco anterior ao dashboard: parte das transações já gravadas (mesmas regras de write_chunk)
+            c.execute(f'''
+                INSERT INTO {table} ({period}, type, count, inflow, outflow)
+                SELECT substr(date, 1, {length}), type, COUNT(*),
+                       TOTAL(CASE WHEN value > 0 THEN value END),
+                       TOTAL(CASE WHEN value < 0 THEN -value END)
+                FROM transactions
+                GROUP BY substr(date, 1, {length}), type
+            ''')
+
+    # Versão dos resumos: muda a cada importação e identifica as respostas em cache
+    c.execute('CREATE TABLE IF NOT EXISTS rollup_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)')
+    c.execute('INSERT OR IGNORE INTO rollup_version (id, version) VALUES (1, 0)')
+
     conn.commit()
     conn.close()
 
@@ -109,13 +214,18 @@ def get_company_info(cnpj):
         failed_cnpjs.add(cnpj)
     return None
 
-def get_db_connection():
-    conn = sqlite3.connect('instance/financas.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+# Registro global do progresso dos uploads (expira sozinho após o término)
+upload_progress = ProgressRegistry()
 
-# Dicionário global para armazenar o progresso do upload
-upload_progress = {}
+# Executor das importações: fila FIFO com número limitado de workers
+import_executor = JobExecutor(progress=upload_progress)
+
+# Intervalo máximo sem eventos no stream de progresso (mantém a conexão viva)
+PROGRESS_STREAM_KEEPALIVE = 15  # seconds
+# Duração máxima de um stream; depois disso o cliente passa a fazer polling
+PROGRESS_STREAM_MAX_DURATION = 300  # seconds
+# A cada quantas linhas o progresso é publicado durante a importação
+PROGRESS_UPDATE_EVERY = 50
 
 @app.route('/')
 def index():
@@ -135,27 +245,30 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        process_id = str(uuid.uuid4())
+        # Prefixo evita que uploads simultâneos com o mesmo nome se sobrescrevam
+        filepath = os.path.join(UPLOAD_FOLDER, f'{process_id}_{filename}')
         
         # Salva o arquivo
         file.save(filepath)
         
         # Inicializa o progresso
-        process_id = str(uuid.uuid4())
-        upload_progress[process_id] = {
-            'status': 'processing',
-            'current': 0,
-            'total': 0,
-            'message': 'Iniciando processamento...'
-        }
+        upload_progress.create(process_id)
         
-        # Processa o arquivo em uma thread separada
-        thread = threading.Thread(target=process_file_with_progress, args=(filepath, process_id))
-        thread.start()
+        # Enfileira o processamento no executor de importações
+        try:
+            job = import_executor.submit(process_file_with_progress, filepath, process_id,
+                                         job_id=process_id,
+                                         on_discard=lambda: os.remove(filepath))
+        except QueueFull as e:
+            os.remove(filepath)
+            upload_progress.update(process_id, status='error', stage='error', message=str(e))
+            return jsonify({'success': False, 'message': str(e)}), 503
         
         return jsonify({
             'success': True,
             'process_id': process_id,
+            'queue_position': job.queue_position,
             'message': 'Arquivo enviado e sendo processado'
         })
     
@@ -190,18 +303,122 @@ def extract_transaction_info(description, value):
     
     return transaction_info
 
-def process_file_with_progress(filepath, process_id):
+# Quantidade de linhas verificadas/inseridas por vez durante a importação
+IMPORT_CHUNK_SIZE = 500
+# Tempo máximo de cada consulta de CNPJ durante a importação
+CNPJ_LOOKUP_TIMEOUT = 5  # seconds
+
+def prepare_chunk(cursor, chunk, job=None):
+    """Descarta as linhas já importadas e enriquece as novas com a razão social.
+
+    Roda fora da transação de escrita: as consultas de CNPJ são lentas. Com um
+    job, o cancelamento e o tempo limite são verificados antes de cada consulta,
+    que nunca espera além do tempo que resta ao job.
+    """
+    known = known_fingerprints(cursor, [t['fingerprint'] for t in chunk])
+    rows = []
+    for t in chunk:
+        if t['fingerprint'] in known:
+            continue
+        timeout = CNPJ_LOOKUP_TIMEOUT
+        if job is not None:
+            job.check()
+            timeout = job.remaining(CNPJ_LOOKUP_TIMEOUT)
+        rows.append(dict(t, description=extract_and_enrich_cnpj(t['description'], t['type'], timeout)))
+    return rows
+
+def write_chunk(conn, rows):
+    """Grava as linhas novas e os resumos em uma única transação curta"""
+    inserted = 0
+    summary_delta = {}
+    cashflow_delta = {}
+    with writing(conn) as cursor:
+        for t in rows:
+            cursor.execute('''
+                INSERT OR IGNORE INTO transactions (date, description, value, type, transaction_type, fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (t['date'], t['description'], t['value'], t['type'],
+                  'receita' if t['value'] > 0 else 'despesa', t['fingerprint']))
+            # Outra importação pode ter gravado a mesma linha depois do prepare_chunk
+            if cursor.rowcount != 1:
+                continue
+
+            inserted += 1
+            key = (t['type'], t['date'][:7])
+            count, total = summary_delta.get(key, (0, 0.0))
+            summary_delta[key] = (count + 1, total + t['value'])
+
+            flow = cashflow_delta.setdefault((t['date'][:10], t['type']), [0, 0.0, 0.0])
+            flow[0] += 1
+            if t['value'] > 0:
+                flow[1] += t['value']
+            else:
+                flow[2] -= t['value']
+
+        update_summary(cursor, summary_delta)
+        update_cashflow(cursor, cashflow_delta)
+    return inserted
+
+def import_chunk(conn, chunk, job=None):
+    """Insere um bloco de transações, ignorando as que já foram importadas.
+
+    Cada bloco é gravado e commitado sozinho, então importações simultâneas
+    se alternam entre os blocos em vez de esperar uma pela outra inteira.
+    """
+    inserted = write_chunk(conn, prepare_chunk(conn.cursor(), chunk, job))
+    return inserted, len(chunk) - inserted
+
+def update_summary(cursor, summary_delta):
+    """Soma as transações novas ao resumo por tipo e mês"""
+    if not summary_delta:
+        return
+    cursor.executemany('''
+        INSERT INTO transaction_summary (type, month, count, total)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (type, month) DO UPDATE SET
+            count = count + excluded.count,
+            total = total + excluded.total
+    ''', [(tipo, month, count, total) for (tipo, month), (count, total) in summary_delta.items()])
+
+def update_cashflow(cursor, cashflow_delta):
+    """Soma as transações novas às entradas/saídas diárias e mensais e avança a versão"""
+    if not cashflow_delta:
+        return
+    monthly = {}
+    for (day, tipo), (count, inflow, outflow) in cashflow_delta.items():
+        flow = monthly.setdefault((day[:7], tipo), [0, 0.0, 0.0])
+        flow[0] += count
+        flow[1] += inflow
+        flow[2] += outflow
+
+    for table, period, delta in (('cashflow_daily', 'day', cashflow_delta), ('cashflow_monthly', 'month', monthly)):
+        cursor.executemany(f'''
+            INSERT INTO {table} ({period}, type, count, inflow, outflow)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT ({period}, type) DO UPDATE SET
+                count = count + excluded.count,
+                inflow = inflow + excluded.inflow,
+                outflow = outflow + excluded.outflow
+        ''', [(key, tipo, count, inflow, outflow) for (key, tipo), (count, inflow, outflow) in delta.items()])
+    cursor.execute('UPDATE rollup_version SET version = version + 1 WHERE id = 1')
+
+def process_file_with_progress(filepath, process_id, job=None):
+    conn = None
     try:
         print(f"Iniciando processamento do arquivo: {filepath}")
         
-        # Lê o arquivo Excel
-        df = pd.read_excel(filepath)
+        upload_progress.update(process_id, stage='reading', message='Lendo arquivo...')
+        
+        # Lê o arquivo Excel (no pool de processos, se habilitado)
+        if job is not None:
+            df = import_executor.run_cpu(job, read_spreadsheet, filepath)
+        else:
+            df = read_spreadsheet(filepath)
         print(f"Arquivo lido com sucesso. Total de linhas: {len(df)}")
         print(f"Colunas encontradas: {df.columns.tolist()}")
         
         total_rows = len(df)
-        upload_progress[process_id]['total'] = total_rows
-        upload_progress[process_id]['message'] = 'Lendo arquivo...'
+        upload_progress.update(process_id, total=total_rows)
         
         # Encontra as colunas corretas
         data_col = find_matching_column(df, ['Data', 'DATE', 'DT', 'AGENCIA'])
@@ -211,16 +428,27 @@ def process_file_with_progress(filepath, process_id):
         if not all([data_col, desc_col, valor_col]):
             raise Exception(f"Colunas necessárias não encontradas. Colunas disponíveis: {df.columns.tolist()}")
         
-        # Conecta ao banco de dados
+        # Conecta ao banco de dados (cada bloco é commitado em import_chunk)
         conn = get_db_connection()
-        cursor = conn.cursor()
         
         # Processa cada linha
         processed_rows = 0
-        for index, row in df.iterrows():
+        skipped_rows = 0
+        occurrences = {}
+        pending = []
+        
+        # Classifica a coluna de descrições de uma vez, com as regras pré-compiladas
+        keyword_types = import_classifier.classify_many(df[desc_col])
+        
+        for position, (index, row) in enumerate(df.iterrows()):
             # Atualiza o progresso
-            upload_progress[process_id]['current'] = index + 1
-            upload_progress[process_id]['message'] = f'Processando linha {index + 1} de {total_rows}'
+            if index % PROGRESS_UPDATE_EVERY == 0 or index + 1 == total_rows:
+                if job is not None:
+                    job.check()
+                upload_progress.update(process_id,
+                                       stage='importing',
+                                       current=index + 1,
+                                       message=f'Processando linha {index + 1} de {total_rows}')
             
             try:
                 # Processa a data
@@ -273,100 +501,148 @@ def process_file_with_progress(filepath, process_id):
                 
                 # Detecta o tipo de transação
                 description_upper = description.upper()
-                transaction_type = None
-                
-                # Mapeamento de palavras-chave para tipos de transação
-                type_mapping = {
-                    'PIX RECEBIDO': ['PIX RECEBIDO'],
-                    'PIX ENVIADO': ['PIX ENVIADO'],
-                    'TED RECEBIDA': ['TED RECEBIDA', 'TED CREDIT'],
-                    'TED ENVIADA': ['TED ENVIADA', 'TED DEBIT'],
-                    'PAGAMENTO': ['PAGAMENTO', 'PGTO', 'PAG'],
-                    'TARIFA': ['TARIFA', 'TAR'],
-                    'IOF': ['IOF'],
-                    'RESGATE': ['RESGATE'],
-                    'APLICACAO': ['APLICACAO', 'APLICAÇÃO'],
-                    'COMPRA': ['COMPRA'],
-                    'COMPENSACAO': ['COMPENSACAO', 'COMPENSAÇÃO'],
-                    'CHEQUE': ['CHEQUE'],
-                    'TRANSFERENCIA': ['TRANSFERENCIA', 'TRANSF'],
-                    'JUROS': ['JUROS'],
-                    'MULTA': ['MULTA']
-                }
-                
-                # Primeiro, tenta encontrar o tipo pela descrição
-                for tipo, keywords in type_mapping.items():
-                    if any(keyword in description_upper for keyword in keywords):
-                        transaction_type = tipo
-                        break
-                
-                # Se não encontrou tipo específico, usa PIX/TED baseado no valor
-                if transaction_type is None:
-                    if 'PIX' in description_upper:
-                        transaction_type = 'PIX RECEBIDO' if value > 0 else 'PIX ENVIADO'
-                    elif 'TED' in description_upper:
-                        transaction_type = 'TED RECEBIDA' if value > 0 else 'TED ENVIADA'
-                    else:
-                        # Tipo genérico baseado no valor
-                        transaction_type = 'CREDITO' if value > 0 else 'DEBITO'
+                # Tipo pela descrição (classificado para a coluna inteira); senão PIX/TED pelo valor
+                transaction_type = keyword_types[position] or fallback_transaction_type(description_upper, value)
                 
                 print(f"Tipo de transação detectado: {transaction_type}")
                 
-                # Extrai CNPJ se presente
-                if transaction_type:
-                    description = extract_and_enrich_cnpj(description, transaction_type)
-                
-                # Insere no banco de dados
-                cursor.execute('''
-                    INSERT INTO transactions (date, description, value, type, transaction_type)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (date.strftime('%Y-%m-%d'), description, value, transaction_type, 'receita' if value > 0 else 'despesa'))
+                # Linhas idênticas no mesmo extrato são diferenciadas pela ordem em que aparecem
+                date_str = date.strftime('%Y-%m-%d')
+                key = (date_str, round(value, 2), normalize_description(description))
+                occurrence = occurrences.get(key, 0)
+                occurrences[key] = occurrence + 1
                 
-                processed_rows += 1
+                pending.append({
+                    'date': date_str,
+                    'description': description,
+                    'value': value,
+                    'type': transaction_type,
+                    'fingerprint': transaction_fingerprint(date_str, value, description, occurrence)
+                })
                 
             except Exception as row_error:
                 print(f"Erro ao processar linha {index + 1}: {str(row_error)}")
                 print(f"Dados da linha: {row.to_dict()}")
                 continue
+            
+            # Verifica e insere o bloco acumulado
+            if len(pending) >= IMPORT_CHUNK_SIZE:
+                inserted, skipped = import_chunk(conn, pending, job)
+                processed_rows += inserted
+                skipped_rows += skipped
+                pending = []
+        
+        if pending:
+            inserted, skipped = import_chunk(conn, pending, job)
+            processed_rows += inserted
+            skipped_rows += skipped
         
-        # Commit e fecha conexão
-        conn.commit()
         conn.close()
         
-        print(f"Processamento concluído. Total de linhas processadas: {processed_rows}")
+        print(f"Processamento concluído. Total de linhas processadas: {processed_rows}, já existentes: {skipped_rows}")
         
         # Atualiza status final
-        upload_progress[process_id]['status'] = 'completed'
-        upload_progress[process_id]['message'] = f'Processamento concluído! {processed_rows} transações importadas.'
+        upload_progress.update(
+            process_id,
+            status='completed',
+            stage='completed',
+            current=total_rows,
+            imported=processed_rows,
+            skipped=skipped_rows,
+            message=(f'Processamento concluído! {processed_rows} transações importadas, '
+                     f'{skipped_rows} já existentes ignoradas.')
+        )
         
         # Remove o arquivo após processamento
         os.remove(filepath)
         
+    except JobCancelled as e:
+        # Os blocos já gravados ficam; reenviar o arquivo importa só o restante (fingerprints)
+        print(f"Processamento interrompido: {str(e)}")
+        if conn is not None:
+            conn.close()
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+        
     except Exception as e:
         print(f"Erro geral no processamento: {str(e)}")
         if 'df' in locals():
             print("Exemplo das primeiras linhas do DataFrame:")
             print(df.head())
         
-        upload_progress[process_id]['status'] = 'error'
-        upload_progress[process_id]['message'] = f'Erro: {str(e)}'
+        # A conexão é reaproveitada pela thread: não deixa transação pendente
+        if conn is not None:
+            conn.close()
+        
+        upload_progress.update(process_id, status='error', stage='error', message=f'Erro: {str(e)}')
+        raise
 
 @app.route('/upload_progress/<process_id>')
 def get_upload_progress(process_id):
     """Retorna o progresso atual do upload"""
-    if process_id not in upload_progress:
+    progress_data = upload_progress.get(process_id)
+    if progress_data is None:
         return jsonify({'error': 'Process ID not found'}), 404
     
-    progress_data = upload_progress[process_id]
+    return jsonify(progress_data)
+
+@app.route('/upload_progress/<process_id>/stream')
+def stream_upload_progress(process_id):
+    """Transmite o progresso do upload via Server-Sent Events"""
+    if process_id not in upload_progress:
+        return jsonify({'error': 'Process ID not found'}), 404
     
-    # Se o processamento foi concluído ou teve erro, remove do dicionário após alguns segundos
-    if progress_data['status'] in ['completed', 'error']:
-        def cleanup():
-            time.sleep(30)  # Mantém o resultado por 30 segundos
-            upload_progress.pop(process_id, None)
-        threading.Thread(target=cleanup).start()
+    def events():
+        version = None
+        deadline = time.monotonic() + PROGRESS_STREAM_MAX_DURATION
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Libera a thread do worker; o cliente continua via polling
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            
+            progress_data = upload_progress.wait(process_id, version,
+                                                 min(PROGRESS_STREAM_KEEPALIVE, remaining))
+            if progress_data is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Process ID not found'})}\n\n"
+                return
+            
+            if progress_data['version'] == version:
+                # Nada mudou: envia só um comentário para manter a conexão
+                yield ": keep-alive\n\n"
+                continue
+            
+            version = progress_data['version']
+            yield f"event: progress\ndata: {json.dumps(progress_data)}\n\n"
+            
+            if progress_data['status'] in FINISHED_STATUSES:
+                return
     
-    return jsonify(progress_data)
+    return Response(stream_with_context(events()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs')
+def list_jobs():
+    """Retorna o estado do executor de importações e dos jobs recentes"""
+    return jsonify(import_executor.stats())
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Retorna o estado de um job de importação (incluindo a posição na fila)"""
+    status = import_executor.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancela um job de importação enfileirado ou em execução"""
+    if not import_executor.cancel(job_id):
+        return jsonify({'success': False, 'message': 'Job não encontrado ou já finalizado'}), 404
+    return jsonify({'success': True, 'status': import_executor.status(job_id)})
 
 @app.route('/recebidos')
 def recebidos():
@@ -442,6 +718,7 @@ def recebidos():
                          failed_cnpjs=len(failed_cnpjs))
 
 @app.route('/retry_failed_cnpjs', methods=['GET', 'POST'])
+@rate_limit(limit=10)
 def retry_failed_cnpjs():
     if request.method == 'GET':
         return jsonify({
@@ -454,7 +731,6 @@ def retry_failed_cnpjs():
     still_failed = set()
     
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     try:
         for cnpj in failed_cnpjs.copy():
@@ -469,21 +745,22 @@ def retry_failed_cnpjs():
                     data = response.json()
                     cnpj_cache[cnpj] = data
                     
-                    # Atualiza as descrições no banco de dados
-                    cursor.execute('''
-                        SELECT id, description FROM transactions 
-                        WHERE description LIKE ?
-                    ''', (f'%{cnpj}%',))
-                    
-                    rows = cursor.fetchall()
-                    for row in rows:
-                        transaction_id, description = row
-                        new_description = description.replace(cnpj, f"{data['razao_social']} (CNPJ: {cnpj})")
+                    # Atualiza as descrições no banco de dados (transação curta por CNPJ)
+                    with writing(conn) as cursor:
                         cursor.execute('''
-                            UPDATE transactions 
-                            SET description = ? 
-                            WHERE id = ?
-                        ''', (new_description, transaction_id))
+                            SELECT id, description FROM transactions 
+                            WHERE description LIKE ?
+                        ''', (f'%{cnpj}%',))
+                        
+                        rows = cursor.fetchall()
+                        for row in rows:
+                            transaction_id, description = row
+                            new_description = description.replace(cnpj, f"{data['razao_social']} (CNPJ: {cnpj})")
+                            cursor.execute('''
+                                UPDATE transactions 
+                                SET description = ? 
+                                WHERE id = ?
+                            ''', (new_description, transaction_id))
                     
                     success_count += 1
                 else:
@@ -496,9 +773,6 @@ def retry_failed_cnpjs():
             # Pequena pausa entre requisições para evitar rate limit
             time.sleep(0.5)
         
-        # Commit as alterações
-        conn.commit()
-        
         # Atualiza o conjunto de CNPJs que falharam
         failed_cnpjs.clear()
         failed_cnpjs.update(still_failed)
@@ -524,25 +798,23 @@ def transactions_summary():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get transactions grouped by type, excluding PIX RECEBIDO, TED RECEBIDA, and PAGAMENTO
+    # Totais por tipo a partir do resumo mensal, excluding PIX RECEBIDO, TED RECEBIDA, and PAGAMENTO
     cursor.execute('''
         SELECT 
             type,
-            COUNT(*) as count,
-            SUM(value) as total,
-            GROUP_CONCAT(description || ' (' || value || ')') as details
-        FROM transactions 
+            SUM(count) as count,
+            SUM(total) as total
+        FROM transaction_summary 
         WHERE type NOT IN ('PIX RECEBIDO', 'TED RECEBIDA', 'PAGAMENTO')
         GROUP BY type
-        ORDER BY type, date DESC
+        ORDER BY type
     ''')
     
     summary = {}
     for row in cursor.fetchall():
         summary[row['type']] = {
             'count': row['count'],
-            'total': row['total'],
-            'details': row['details'].split(',') if row['details'] else []
+            'total': row['total']
         }
     
     conn.close()
@@ -551,7 +823,333 @@ def transactions_summary():
                          active_page='transactions_summary',
                          summary=summary)
 
+# Tamanho padrão e máximo das páginas de detalhamento
+DETAILS_PAGE_SIZE = 50
+DETAILS_MAX_PAGE_SIZE = 200
+
+@app.route('/transactions_summary/details')
+def transactions_summary_details():
+    """Retorna, paginadas, as transações de um tipo (mais recentes primeiro)"""
+    tipo = request.args.get('type')
+    if not tipo:
+        return jsonify({'error': 'Parâmetro type é obrigatório'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', DETAILS_PAGE_SIZE)), DETAILS_MAX_PAGE_SIZE)
+        after_id = request.args.get('after_id', type=int)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de paginação inválidos'}), 400
+    after_date = request.args.get('after_date')
+    
+    query = '''
+        SELECT id, date, description, value
+        FROM transactions
+        WHERE type = ?
+    '''
+    params = [tipo]
+    
+    # Paginação por chave (date, id): o custo não cresce com a profundidade
+    if after_date and after_id is not None:
+        query += " AND (date < ? OR (date = ? AND id < ?))"
+        params.extend([after_date, after_date, after_id])
+    
+    query += " ORDER BY date DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    conn.close()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{
+        'id': row['id'],
+        'date': row['date'],
+        'description': row['description'],
+        'value': row['value']
+    } for row in rows]
+    
+    next_page = None
+    if has_more:
+        next_page = {'after_date': rows[-1]['date'], 'after_id': rows[-1]['id']}
+    
+    return jsonify({'type': tipo, 'items': items, 'next': next_page})
+
+# Ordenações aceitas por /api/transactions (coluna usada junto com id na chave da página)
+TRANSACTION_SORTS = {'date': 'date', 'value': 'value'}
+
+@app.route('/api/transactions')
+def api_transactions():
+    """Lista transações em JSON, paginada por chave (coluna de ordenação, id)
+
+    Filtros: type, start/end (AAAA-MM-DD, inclusivos), sign (credit/debit) e
+    document. Ordenação: sort=date|value e order=desc|asc. A próxima página
+    é pedida com os valores de `next` (after, after_id), então o custo de
+    uma página não depende da profundidade.
+    """
+    sort = request.args.get('sort', 'date')
+    order = request.args.get('order', 'desc').lower()
+    sign = request.args.get('sign')
+    if sort not in TRANSACTION_SORTS or order not in ('asc', 'desc') or sign not in (None, 'credit', 'debit'):
+        return jsonify({'error': 'Parâmetros sort/order/sign inválidos'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', DETAILS_PAGE_SIZE)), 1), DETAILS_MAX_PAGE_SIZE)
+        after_id = request.args.get('after_id', type=int)
+        after = request.args.get('after')
+        if after is not None and sort == 'value':
+            after = float(after)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de paginação inválidos'}), 400
+
+    column = TRANSACTION_SORTS[sort]
+    conditions = []
+    params = []
+    if request.args.get('type'):
+        conditions.append('type = ?')
+        params.append(request.args['type'])
+    if request.args.get('start'):
+        conditions.append('date >= ?')
+        params.append(request.args['start'])
+    if request.args.get('end'):
+        conditions.append('date <= ?')
+        params.append(request.args['end'])
+    if sign == 'credit':
+        conditions.append('value > 0')
+    elif sign == 'debit':
+        conditions.append('value < 0')
+    if request.args.get('document'):
+        conditions.append('document = ?')
+        params.append(request.args['document'])
+
+    # Continua depois do último item da página anterior
+    if after is not None and after_id is not None:
+        op = '<' if order == 'desc' else '>'
+        # Comparação de tuplas: o SQLite busca direto a posição no índice (coluna, id)
+        conditions.append(f'({column}, id) {op} (?, ?)')
+        params.extend([after, after_id])
+
+    query = 'SELECT id, date, description, document, value, type, transaction_type FROM transactions'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {column} {order.upper()}, id {order.upper()} LIMIT ?'
+    params.append(limit + 1)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [dict(row) for row in rows]
+
+    next_page = None
+    if has_more:
+        next_page = {'after': rows[-1][column], 'after_id': rows[-1]['id']}
+
+    return jsonify({'items': items, 'next': next_page})
+
+# Janelas padrão (e máxima) dos gráficos do dashboard
+DASHBOARD_MONTHS = 12
+DASHBOARD_DAYS = 30
+DASHBOARD_MAX_PERIODS = 120
+# Respostas do dashboard já montadas, por (versão, meses, dias)
+dashboard_cache = {}
+dashboard_cache_lock = threading.Lock()
+
+# Tamanho padrão e máximo da lista de resultados da busca
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+# Quantas ocorrências (as mais recentes) entram no ranking por relevância;
+# limita o custo de termos muito comuns, que casariam com boa parte da base
+SEARCH_RANK_CANDIDATES = 2000
+# Marcadores do highlight(); trocados por <mark> depois de escapar o texto
+SEARCH_MARK_START = '\x02'
+SEARCH_MARK_END = '\x03'
+
+def fts_query(text):
+    """Converte o texto digitado em uma consulta FTS5 segura
+
+    Cada palavra vira um termo entre aspas (operadores e pontuação do usuário
+    não são interpretados) e a última é buscada como prefixo, para que a busca
+    funcione enquanto se digita.
+    """
+    terms = [''.join(ch for ch in word if ch.isalnum()) for word in text.split()]
+    terms = [term for term in terms if term]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+def highlight_html(text):
+    return str(escape(text)).replace(SEARCH_MARK_START, '<mark>').replace(SEARCH_MARK_END, '</mark>')
+
+@app.route('/api/search')
+def api_search():
+    """Busca transações por descrição, razão social ou documento
+
+    Resultados ordenados por relevância (bm25) entre as SEARCH_RANK_CANDIDATES
+    ocorrências mais recentes, com os termos encontrados destacados em
+    `highlight` (HTML já escapado, termos em <mark>). Aceita os filtros type,
+    start e end (AAAA-MM-DD).
+    """
+    query = fts_query(request.args.get('q', ''))
+    if query is None:
+        return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'Parâmetro limit inválido'}), 400
+
+    conditions = ['transactions_fts MATCH ?']
+    params = [query]
+    if request.args.get('type'):
+        conditions.append('t.type = ?')
+        params.append(request.args['type'])
+    if request.args.get('start'):
+        conditions.append('t.date >= ?')
+        params.append(request.args['start'])
+    if request.args.get('end'):
+        conditions.append('t.date <= ?')
+        params.append(request.args['end'])
+    params.extend([SEARCH_RANK_CANDIDATES, limit, SEARCH_MARK_START, SEARCH_MARK_END, query])
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    # O índice percorre as ocorrências da mais recente para a mais antiga e
+    # para ao juntar os candidatos; só a página final é lida e destacada
+    cursor.execute(f'''
+        WITH candidates AS (
+            SELECT transactions_fts.rowid AS id, transactions_fts.rank AS rank
+            FROM transactions_fts
+            JOIN transactions t ON t.id = transactions_fts.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY transactions_fts.rowid DESC
+            LIMIT ?
+        ), top AS (
+            SELECT id, rank FROM candidates ORDER BY rank LIMIT ?
+        )
+        SELECT t.id, t.date, t.description, t.document, t.value, t.type,
+               highlight(transactions_fts, 0, ?, ?) AS highlight
+        FROM top
+        JOIN transactions_fts ON transactions_fts.rowid = top.id
+        JOIN transactions t ON t.id = top.id
+        WHERE transactions_fts MATCH ?
+        ORDER BY top.rank
+    ''', params)
+    rows = cursor.fetchall()
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    items = []
+    for row in rows:
+        item = dict(row)
+        item['highlight'] = highlight_html(row['highlight'])
+        items.append(item)
+    return jsonify({'query': request.args['q'], 'items': items, 'elapsed_ms': round(elapsed * 1000, 2)})
+
+def rollup_version(cursor):
+    cursor.execute('SELECT version FROM rollup_version WHERE id = 1')
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def cashflow_totals(cursor):
+    cursor.execute('SELECT COALESCE(SUM(inflow), 0), COALESCE(SUM(outflow), 0) FROM cashflow_monthly')
+    receitas, despesas = cursor.fetchone()
+    return {'receitas': receitas, 'despesas': despesas, 'saldo': receitas - despesas}
+
+def cashflow_series(cursor, table, period, limit):
+    """Entradas e saídas dos últimos `limit` períodos com movimento, em ordem cronológica"""
+    cursor.execute(f'''
+        SELECT {period}, SUM(inflow), SUM(outflow)
+        FROM {table}
+        GROUP BY {period}
+        ORDER BY {period} DESC
+        LIMIT ?
+    ''', (limit,))
+    rows = cursor.fetchall()[::-1]
+    return [row[0] for row in rows], [round(row[1], 2) for row in rows], [round(row[2], 2) for row in rows]
+
+def build_dashboard_data(cursor, version, months, days):
+    month_labels, month_income, month_expenses = cashflow_series(cursor, 'cashflow_monthly', 'month', months)
+    day_labels, day_income, day_expenses = cashflow_series(cursor, 'cashflow_daily', 'day', days)
+
+    # Despesas por tipo dentro da janela mensal
+    categories = {'labels': [], 'values': []}
+    if month_labels:
+        cursor.execute('''
+            SELECT type, SUM(outflow) AS total
+            FROM cashflow_monthly
+            WHERE month >= ?
+            GROUP BY type
+            HAVING total > 0
+            ORDER BY total DESC
+        ''', (month_labels[0],))
+        for row in cursor.fetchall():
+            categories['labels'].append(row[0])
+            categories['values'].append(round(row[1], 2))
+
+    return {
+        'version': version,
+        'summary': {key: round(value, 2) for key, value in cashflow_totals(cursor).items()},
+        'expenses_by_category': categories,
+        'monthly_data': {'months': month_labels, 'income': month_income, 'expenses': month_expenses},
+        'daily_data': {'days': day_labels, 'income': day_income, 'expenses': day_expenses}
+    }
+
+@app.route('/dashboard')
+def dashboard():
+    conn = get_db_connection()
+    summary = cashflow_totals(conn.cursor())
+    conn.close()
+    return render_template('dashboard.html', active_page='dashboard', summary=summary)
+
+@app.route('/api/dashboard_data')
+def api_dashboard_data():
+    """Dados dos gráficos do dashboard, lidos dos resumos diários/mensais
+
+    A resposta leva um ETag com a versão dos resumos: enquanto nada novo for
+    importado, o navegador recebe 304 e o servidor reaproveita a resposta
+    já montada.
+    """
+    try:
+        months = min(max(int(request.args.get('months', DASHBOARD_MONTHS)), 1), DASHBOARD_MAX_PERIODS)
+        days = min(max(int(request.args.get('days', DASHBOARD_DAYS)), 1), DASHBOARD_MAX_PERIODS)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros months/days inválidos'}), 400
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        version = rollup_version(cursor)
+        etag = f'dashboard-{version}-{months}-{days}'
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            key = (version, months, days)
+            with dashboard_cache_lock:
+                data = dashboard_cache.get(key)
+            if data is None:
+                data = build_dashboard_data(cursor, version, months, days)
+                with dashboard_cache_lock:
+                    # Respostas de versões anteriores nunca mais serão usadas
+                    for old in [k for k in dashboard_cache if k[0] != version]:
+                        del dashboard_cache[old]
+                    dashboard_cache[key] = data
+            response = jsonify(data)
+    finally:
+        conn.close()
+
+    response.set_etag(etag)
+    # O navegador guarda a resposta, mas sempre revalida pelo ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/verify_cnpj/<cnpj>')
+@rate_limit(limit=30)
 def verify_cnpj(cnpj):
     """Verifica se um CNPJ é válido e retorna informações da empresa"""
     try:
@@ -571,28 +1169,13 @@ def verify_cnpj(cnpj):
 def cnpj_verification():
     return render_template('cnpj_verification.html', active_page='cnpj_verification')
 
-def extract_and_enrich_cnpj(description, transaction_type):
-    # Find sequence of 14 digits that could be a CNPJ
-    import re
-    
+def extract_and_enrich_cnpj(description, transaction_type, timeout=CNPJ_LOOKUP_TIMEOUT):
     # Only process PIX RECEBIDO, TED RECEBIDA, and PAGAMENTO
     if transaction_type not in ['PIX RECEBIDO', 'TED RECEBIDA', 'PAGAMENTO']:
         return description
     
-    # Try different CNPJ patterns
-    cnpj_patterns = [
-        r'CNPJ[:\s]*(\d{14,15})',  # CNPJ followed by 14 or 15 digits
-        r'CNPJ[:\s]*(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})',  # CNPJ followed by formatted number
-        r'\b(\d{14,15})\b',  # Just 14 or 15 digits
-        r'\b(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})\b'  # Formatted CNPJ
-    ]
-    
-    cnpj_match = None
-    for pattern in cnpj_patterns:
-        match = re.search(pattern, description)
-        if match:
-            cnpj_match = match
-            break
+    # Try different CNPJ patterns (pré-compilados em classifier.py)
+    cnpj_match = find_enrich_cnpj(description)
     
     if not cnpj_match:
         return description
@@ -611,7 +1194,7 @@ def extract_and_enrich_cnpj(description, transaction_type):
             new_description = description.replace(cnpj_match.group(0), f"{razao_social} (CNPJ: {cnpj})")
             return new_description
             
-        response = requests.get(f'https://brasilapi.com.br/api/cnpj/v1/{cnpj}', timeout=5)
+        response = requests.get(f'https://brasilapi.com.br/api/cnpj/v1/{cnpj}', timeout=timeout)
         if response.status_code == 200:
             data = response.json()
             cnpj_cache[cnpj] = data
@@ -0,0 +1,213 @@
+import re
+import time
+import random
+
+# Tipos usados pela leitura de extratos (read_excel.extract_transaction_info)
+STATEMENT_TYPE_RULES = {
+    'PIX RECEBIDO': ['PIX RECEBIDO'],
+    'PIX ENVIADO': ['PIX ENVIADO'],
+    'TED RECEBIDA': ['TED RECEBIDA', 'TED CREDIT'],
+    'TED ENVIADA': ['TED ENVIADA', 'TED DEBIT'],
+    'PAGAMENTO': ['PAGAMENTO', 'PGTO', 'PAG'],
+    'TARIFA': ['TARIFA', 'TAR'],
+    'IOF': ['IOF'],
+    'RESGATE': ['RESGATE'],
+    'APLICACAO': ['APLICACAO', 'APLICAÇÃO'],
+    'COMPRA': ['COMPRA'],
+    'COMPENSACAO': ['COMPENSACAO', 'COMPENSAÇÃO'],
+    'CHEQUE DEVOLVIDO': ['CHEQUE DEVOLVIDO', 'CH DEVOLVIDO'],
+    'JUROS': ['JUROS'],
+    'MULTA': ['MULTA'],
+    'ANTECIPACAO': ['ANTECIPACAO', 'ANTECIPAÇÃO'],
+    'CHEQUE EMITIDO': ['CHEQUE EMITIDO', 'CH EMITIDO']
+}
+
+# Tipos usados pela importação com progresso (app.process_file_with_progress)
+IMPORT_TYPE_RULES = {
+    'PIX RECEBIDO': ['PIX RECEBIDO'],
+    'PIX ENVIADO': ['PIX ENVIADO'],
+    'TED RECEBIDA': ['TED RECEBIDA', 'TED CREDIT'],
+    'TED ENVIADA': ['TED ENVIADA', 'TED DEBIT'],
+    'PAGAMENTO': ['PAGAMENTO', 'PGTO', 'PAG'],
+    'TARIFA': ['TARIFA', 'TAR'],
+    'IOF': ['IOF'],
+    'RESGATE': ['RESGATE'],
+    'APLICACAO': ['APLICACAO', 'APLICAÇÃO'],
+    'COMPRA': ['COMPRA'],
+    'COMPENSACAO': ['COMPENSACAO', 'COMPENSAÇÃO'],
+    'CHEQUE': ['CHEQUE'],
+    'TRANSFERENCIA': ['TRANSFERENCIA', 'TRANSF'],
+    'JUROS': ['JUROS'],
+    'MULTA': ['MULTA']
+}
+
+# Padrões de CNPJ usados na leitura de extratos, em ordem de preferência
+CNPJ_TEXT_PATTERN = re.compile(r'CNPJ[:\s]+(\d{12,14})')
+CNPJ_DIGITS_PATTERN = re.compile(r'\b\d{14}\b')
+CNPJ_FORMATTED_PATTERN = re.compile(r'\b\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}\b')
+
+# Padrões de CNPJ usados no enriquecimento das descrições, em ordem de preferência
+CNPJ_ENRICH_PATTERNS = [
+    re.compile(r'CNPJ[:\s]*(\d{14,15})'),  # CNPJ followed by 14 or 15 digits
+    re.compile(r'CNPJ[:\s]*(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})'),  # CNPJ followed by formatted number
+    re.compile(r'\b(\d{14,15})\b'),  # Just 14 or 15 digits
+    re.compile(r'\b(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})\b')  # Formatted CNPJ
+]
+
+
+class TransactionClassifier:
+    """Classifica descrições de transações por palavras-chave
+
+    As regras são compiladas uma única vez em uma alternância de todas as
+    palavras-chave (ordenadas por prioridade), e cada descrição é varrida
+    com um único `findall`. Vence o tipo que aparece primeiro nas regras,
+    exatamente como na busca `any(keyword in descricao)` tipo a tipo:
+    palavras-chave contidas em outras herdam a melhor prioridade, e as poucas
+    que podem se sobrepor parcialmente a uma de prioridade maior são
+    conferidas com uma busca posição a posição.
+    """
+
+    def __init__(self, rules):
+        self.types = list(rules)
+        priority = {}
+        for index, keywords in enumerate(rules.values()):
+            for keyword in keywords:
+                priority.setdefault(keyword, index)
+
+        # Uma palavra-chave que contém outra sempre implica a outra também
+        self._priority = {
+            keyword: min(p for other, p in priority.items() if other in keyword)
+            for keyword in priority
+        }
+        # Palavras-chave cujo final pode ser o começo de outra mais prioritária
+        self._overlapping = {
+            keyword for keyword in priority
+            if any(keyword.endswith(other[:size])
+                   for other, p in priority.items() if p < self._priority[keyword]
+                   for size in range(1, min(len(keyword), len(other))))
+        }
+
+        ordered = sorted(priority, key=lambda keyword: (priority[keyword], -len(keyword)))
+        self._pattern = re.compile('|'.join(re.escape(keyword) for keyword in ordered))
+
+    def _classify_overlapping(self, description):
+        best = None
+        pos = 0
+        while True:
+            match = self._pattern.search(description, pos)
+            if match is None:
+                break
+            found = self._priority[match.group()]
+            if best is None or found < best:
+                best = found
+            pos = match.start() + 1
+        return best
+
+    def classify(self, description):
+        """Retorna o tipo da descrição (já em maiúsculas) ou None"""
+        found = self._pattern.findall(description)
+        if not found:
+            return None
+        if self._overlapping and any(keyword in self._overlapping for keyword in found):
+            best = self._classify_overlapping(description)
+        else:
+            best = min(self._priority[keyword] for keyword in found)
+        return self.types[best]
+
+    def classify_many(self, descriptions):
+        """Classifica uma coluna inteira de descrições, avaliando cada descrição distinta uma vez"""
+        classify = self.classify
+        seen = {}
+        result = []
+        for description in descriptions:
+            description = str(description).upper()
+            tipo = seen.get(description, seen)
+            if tipo is seen:
+                tipo = seen[description] = classify(description)
+            result.append(tipo)
+        return result
+
+
+statement_classifier = TransactionClassifier(STATEMENT_TYPE_RULES)
+import_classifier = TransactionClassifier(IMPORT_TYPE_RULES)
+
+
+def fallback_transaction_type(description_upper, value):
+    """Tipo de uma linha importada sem palavra-chave: PIX/TED pelo sinal, senão crédito/débito"""
+    if 'PIX' in description_upper:
+        return 'PIX RECEBIDO' if value > 0 else 'PIX ENVIADO'
+    if 'TED' in description_upper:
+        return 'TED RECEBIDA' if value > 0 else 'TED ENVIADA'
+    # Tipo genérico baseado no valor
+    return 'CREDITO' if value > 0 else 'DEBITO'
+
+
+def find_statement_cnpj(historico):
+    """Procura um CNPJ no histórico (já em maiúsculas); retorna (cnpj, match_do_texto) ou (None, None)"""
+    cnpj_text_match = CNPJ_TEXT_PATTERN.search(historico)
+    if cnpj_text_match:
+        return str(int(cnpj_text_match.group(1))).zfill(14), cnpj_text_match
+
+    cnpj_match = CNPJ_DIGITS_PATTERN.search(historico)
+    if cnpj_match:
+        return str(int(cnpj_match.group())).zfill(14), None
+
+    cnpj_match = CNPJ_FORMATTED_PATTERN.search(historico)
+    if cnpj_match:
+        cnpj = ''.join(filter(str.isdigit, cnpj_match.group()))
+        return str(int(cnpj)).zfill(14), None
+
+    return None, None
+
+
+def find_enrich_cnpj(description):
+    """Retorna o primeiro match de CNPJ na descrição, seguindo a ordem dos padrões"""
+    for pattern in CNPJ_ENRICH_PATTERNS:
+        match = pattern.search(description)
+        if match:
+            return match
+    return None
+
+
+def _legacy_classify(rules, description):
+    for tipo, keywords in rules.items():
+        if any(keyword in description for keyword in keywords):
+            return tipo
+    return None
+
+
+def benchmark(rows=200000, unique=50000):
+    """Compara o classificador compilado com a busca aninhada original"""
+    words = ['PIX', 'RECEBIDO', 'ENVIADO', 'TED', 'CREDIT', 'DEBIT', 'PAGAMENTO', 'PGTO', 'TARIFA',
+             'IOF', 'RESGATE', 'APLICAÇÃO', 'COMPRA', 'CHEQUE', 'DEVOLVIDO', 'EMITIDO', 'JUROS',
+             'MULTA', 'TRANSF', 'CNPJ', 'LTDA', 'FORNECEDOR', 'CARTAO', 'DOC', 'BOLETO', 'SAQUE']
+    rng = random.Random(42)
+    samples = [' '.join(rng.choice(words) for _ in range(rng.randint(2, 8))) + f' {rng.randint(0, 10 ** 14)}'
+               for _ in range(unique)]
+    descriptions = [rng.choice(samples) for _ in range(rows)]
+
+    results = {}
+    for name, rules, classifier in [('statement', STATEMENT_TYPE_RULES, statement_classifier),
+                                    ('import', IMPORT_TYPE_RULES, import_classifier)]:
+        start = time.perf_counter()
+        legacy = [_legacy_classify(rules, d) for d in descriptions]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compiled = classifier.classify_many(descriptions)
+        compiled_time = time.perf_counter() - start
+
+        mismatches = sum(1 for a, b in zip(legacy, compiled) if a != b)
+        results[name] = {
+            'legacy_rows_per_s': rows / legacy_time,
+            'compiled_rows_per_s': rows / compiled_time,
+            'mismatches': mismatches
+        }
+    return results
+
+
+if __name__ == '__main__':
+    for name, result in benchmark().items():
+        print(f"{name}: original {result['legacy_rows_per_s']:,.0f} linhas/s, "
+              f"compilado {result['compiled_rows_per_s']:,.0f} linhas/s, "
+              f"divergências: {result['mismatches']}")
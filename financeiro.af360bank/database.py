@@ -0,0 +1,265 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+import weakref
+import os
+import time
+import tempfile
+import shutil
+
+DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'financas.db')
+BUSY_TIMEOUT = 30  # seconds
+CACHED_STATEMENTS = 256  # prepared statements reutilizados por conexão
+
+# PRAGMAs aplicados em toda conexão nova
+PRAGMAS = [
+    ('journal_mode', 'WAL'),               # leitores não bloqueiam durante importações
+    ('synchronous', 'NORMAL'),             # seguro com WAL e bem mais rápido que FULL
+    ('cache_size', -20000),                # ~20 MB de page cache
+    ('mmap_size', 256 * 1024 * 1024),      # 256 MB de leitura via mmap
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', BUSY_TIMEOUT * 1000),
+]
+
+
+class PooledConnection(sqlite3.Connection):
+    """Conexão reaproveitada pela thread: close() apenas devolve ao pool"""
+
+    def close(self):
+        # Mantém a semântica do close() original: o que não foi commitado é descartado
+        if self.in_transaction:
+            self.rollback()
+
+    def release(self):
+        """Fecha de fato a conexão"""
+        super().close()
+
+
+class ConnectionPool:
+    """Pool com uma conexão SQLite por thread, configurada com WAL e PRAGMAs ajustados"""
+
+    def __init__(self, database=DATABASE):
+        self.database = database
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=BUSY_TIMEOUT,
+            cached_statements=CACHED_STATEMENTS,
+            factory=PooledConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def connection(self):
+        """Retorna a conexão da thread atual, criando-a na primeira chamada"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def close_all(self):
+        """Fecha todas as conexões abertas pelo pool"""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for conn in connections:
+            try:
+                conn.release()
+            except sqlite3.ProgrammingError:
+                # Conexões de outras threads só podem ser fechadas por elas mesmas
+                pass
+        self._local = threading.local()
+
+
+pool = ConnectionPool()
+
+# Um escritor por vez neste processo: as importações concorrentes esperam aqui
+# em vez de estourar o busy_timeout do SQLite. Entre processos (workers do
+# gunicorn) o BEGIN IMMEDIATE e as transações curtas fazem o mesmo papel.
+write_lock = threading.Lock()
+
+
+def get_db_connection():
+    return pool.connection()
+
+
+@contextmanager
+def writing(conn):
+    """Transação de escrita curta: commit ao sair, rollback em caso de erro.
+
+    Nada lento (consultas HTTP, leitura de arquivos) deve rodar dentro dela.
+    """
+    with write_lock:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def benchmark_concurrency(writers=1, readers=4, rows=20000, batch=500):
+    """Executa importações e leituras em paralelo e conta erros de 'database is locked'"""
+    tmpdir = tempfile.mkdtemp()
+    bench_pool = ConnectionPool(os.path.join(tmpdir, 'bench.db'))
+    conn = bench_pool.connection()
+    conn.execute('''
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date DATE NOT NULL,
+            description TEXT NOT NULL,
+            document TEXT,
+            value REAL NOT NULL,
+            type TEXT NOT NULL,
+            transaction_type TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+    stats = {'inserted': 0, 'reads': 0, 'locked': 0}
+    stats_lock = threading.Lock()
+    done = threading.Event()
+
+    def writer():
+        conn = bench_pool.connection()
+        for start in range(0, rows, batch):
+            try:
+                conn.executemany('''
+                    INSERT INTO transactions (date, description, value, type, transaction_type)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [('2024-01-01', f'PIX RECEBIDO {i}', 10.0, 'PIX RECEBIDO', 'receita')
+                      for i in range(start, min(start + batch, rows))])
+                conn.commit()
+                with stats_lock:
+                    stats['inserted'] += min(batch, rows - start)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                with stats_lock:
+                    stats['locked'] += 1
+                conn.rollback()
+
+    def reader():
+        conn = bench_pool.connection()
+        while not done.is_set():
+            try:
+                conn.execute('''
+                    SELECT date, description, value, type, document
+                    FROM transactions
+                    WHERE type IN ('PIX RECEBIDO', 'TED RECEBIDA', 'PAGAMENTO')
+                    ORDER BY date DESC LIMIT 200
+                ''').fetchall()
+                with stats_lock:
+                    stats['reads'] += 1
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                with stats_lock:
+                    stats['locked'] += 1
+
+    start = time.perf_counter()
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    stats['elapsed'] = time.perf_counter() - start
+
+    bench_pool.close_all()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    return stats
+
+
+def benchmark_imports(writers=4, readers=4, rows=5000, batch=500):
+    """Várias importações simultâneas pelo caminho real (app.import_chunk), com leitores em paralelo"""
+    from app import init_db, import_chunk  # o app importa este módulo
+    from fingerprint import transaction_fingerprint
+
+    tmpdir = tempfile.mkdtemp()
+    bench_pool = ConnectionPool(os.path.join(tmpdir, 'bench.db'))
+    init_db(bench_pool.connection())
+
+    stats = {'inserted': 0, 'skipped': 0, 'reads': 0, 'locked': 0, 'slowest_chunk': 0.0}
+    stats_lock = threading.Lock()
+    done = threading.Event()
+
+    def writer(n):
+        conn = bench_pool.connection()
+        pending = []
+        for i in range(rows):
+            # Sem CNPJ na descrição: nenhuma consulta HTTP no enriquecimento
+            date = f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}'
+            description = f'PIX RECEBIDO IMPORTACAO {n} CLIENTE {i}'
+            value = 10.0 + i
+            pending.append({'date': date, 'description': description, 'value': value, 'type': 'PIX RECEBIDO',
+                            'fingerprint': transaction_fingerprint(date, value, description, 0)})
+            if len(pending) == batch or i == rows - 1:
+                began = time.perf_counter()
+                try:
+                    inserted, skipped = import_chunk(conn, pending)
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    with stats_lock:
+                        stats['locked'] += 1
+                else:
+                    with stats_lock:
+                        stats['inserted'] += inserted
+                        stats['skipped'] += skipped
+                        stats['slowest_chunk'] = max(stats['slowest_chunk'], time.perf_counter() - began)
+                pending = []
+
+    def reader():
+        conn = bench_pool.connection()
+        while not done.is_set():
+            conn.execute('SELECT type, SUM(count), SUM(total) FROM transaction_summary GROUP BY type').fetchall()
+            conn.execute('SELECT date, description, value FROM transactions ORDER BY date DESC, id DESC LIMIT 200').fetchall()
+            with stats_lock:
+                stats['reads'] += 1
+
+    start = time.perf_counter()
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    stats['elapsed'] = time.perf_counter() - start
+
+    bench_pool.close_all()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    return stats
+
+
+if __name__ == '__main__':
+    result = benchmark_concurrency()
+    print(f"Linhas inseridas: {result['inserted']}")
+    print(f"Leituras concluídas: {result['reads']}")
+    print(f"Erros 'database is locked': {result['locked']}")
+    print(f"Tempo total: {result['elapsed']:.2f}s")
+
+    for writers in (1, 4):
+        result = benchmark_imports(writers=writers)
+        print(f"\n{writers} importação(ões) simultânea(s) via import_chunk:")
+        print(f"  Linhas inseridas: {result['inserted']} (já existentes: {result['skipped']})")
+        print(f"  Leituras concluídas: {result['reads']}")
+        print(f"  Erros 'database is locked': {result['locked']}")
+        print(f"  Bloco mais lento: {result['slowest_chunk'] * 1000:.0f} ms")
+        print(f"  Tempo total: {result['elapsed']:.2f}s")
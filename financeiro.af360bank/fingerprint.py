@@ -0,0 +1,68 @@
+import hashlib
+import re
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_description(description):
+    """Normaliza a descrição para comparação (maiúsculas, espaços colapsados)"""
+    return _WHITESPACE.sub(' ', str(description)).strip().upper()
+
+
+def transaction_fingerprint(date, value, description, position):
+    """Gera a impressão digital de uma transação do extrato
+
+    `position` é a ordem da transação entre as linhas idênticas (mesma data,
+    valor e descrição) do mesmo extrato, assim lançamentos repetidos legítimos
+    continuam distintos e um extrato sobreposto gera as mesmas impressões.
+    """
+    cents = int(round(float(value) * 100))
+    key = f"{date}|{cents}|{normalize_description(description)}|{position}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def known_fingerprints(cursor, fingerprints):
+    """Retorna, em uma única consulta, quais impressões digitais já estão no banco"""
+    if not fingerprints:
+        return set()
+    placeholders = ','.join('?' * len(fingerprints))
+    cursor.execute(
+        f'SELECT fingerprint FROM transactions WHERE fingerprint IN ({placeholders})',
+        list(fingerprints)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def backfill_fingerprints(cursor):
+    """Preenche a impressão digital das transações importadas antes dela existir
+
+    A posição segue a regra da importação (ordem entre as linhas idênticas),
+    contada sobre todo o histórico na ordem de inserção. Se a impressão já
+    estiver em uso, vale a próxima posição livre, então o índice UNIQUE pode
+    ser criado em seguida. Retorna quantas linhas foram preenchidas.
+    """
+    cursor.execute('SELECT 1 FROM transactions WHERE fingerprint IS NULL LIMIT 1')
+    if cursor.fetchone() is None:
+        return 0
+
+    cursor.execute('SELECT fingerprint FROM transactions WHERE fingerprint IS NOT NULL')
+    used = {row[0] for row in cursor.fetchall()}
+    cursor.execute('SELECT id, date, value, description FROM transactions WHERE fingerprint IS NULL ORDER BY id')
+    rows = cursor.fetchall()
+
+    occurrences = {}
+    updates = []
+    for transaction_id, date, value, description in rows:
+        day = str(date)[:10]  # a importação grava AAAA-MM-DD
+        key = (day, int(round(float(value) * 100)), normalize_description(description))
+        position = occurrences.get(key, 0)
+        fingerprint = transaction_fingerprint(day, value, description, position)
+        while fingerprint in used:
+            position += 1
+            fingerprint = transaction_fingerprint(day, value, description, position)
+        occurrences[key] = position + 1
+        used.add(fingerprint)
+        updates.append((fingerprint, transaction_id))
+
+    cursor.executemany('UPDATE transactions SET fingerprint = ? WHERE id = ?', updates)
+    return len(updates)
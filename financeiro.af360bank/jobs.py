@@ -0,0 +1,260 @@
+import atexit
+import collections
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+
+# Configuração do executor de importações (pode ser ajustada por variáveis de ambiente)
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 2))
+IMPORT_USE_PROCESSES = os.environ.get('IMPORT_USE_PROCESSES', '0') == '1'
+IMPORT_JOB_TIMEOUT = int(os.environ.get('IMPORT_JOB_TIMEOUT', 600))  # seconds
+IMPORT_MAX_QUEUE = int(os.environ.get('IMPORT_MAX_QUEUE', 50))
+FINISHED_JOBS_KEPT = 100
+CPU_POLL_INTERVAL = 0.5  # seconds
+
+
+class QueueFull(Exception):
+    """A fila de importações atingiu o limite"""
+
+
+class JobCancelled(Exception):
+    """O job foi cancelado pelo usuário"""
+
+
+class JobTimeout(JobCancelled):
+    """O job ultrapassou o tempo máximo de execução"""
+
+
+class Job:
+    """Uma importação enfileirada no executor"""
+
+    def __init__(self, job_id, func, args, timeout, on_discard=None):
+        self.id = job_id
+        self.func = func
+        self.args = args
+        self.timeout = timeout
+        self.on_discard = on_discard
+        self.status = 'queued'
+        self.queue_position = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._deadline = None
+
+    def check(self):
+        """Ponto de cancelamento cooperativo: o job deve chamá-lo periodicamente"""
+        if self._cancel.is_set():
+            raise JobCancelled('Importação cancelada')
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise JobTimeout(f'Importação excedeu o tempo limite de {self.timeout}s')
+
+    def remaining(self, default):
+        """Segundos até o tempo limite, no máximo `default` (para timeouts de E/S)"""
+        if self._deadline is None:
+            return default
+        return max(0.0, min(default, self._deadline - time.monotonic()))
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'queue_position': self.queue_position,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobExecutor:
+    """Executor de importações com fila FIFO limitada e número fixo de workers
+
+    O trabalho pesado de CPU (leitura da planilha) pode ser enviado para um
+    pool de processos com `run_cpu`, liberando o GIL para as demais requisições.
+    O progresso da fila é publicado em `progress` (um ProgressRegistry).
+    """
+
+    def __init__(self, max_workers=IMPORT_WORKERS, use_processes=IMPORT_USE_PROCESSES,
+                 timeout=IMPORT_JOB_TIMEOUT, max_queue=IMPORT_MAX_QUEUE, progress=None):
+        self.max_workers = max(1, max_workers)
+        self.use_processes = use_processes
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.progress = progress
+        self._queue = collections.deque()
+        self._jobs = collections.OrderedDict()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._process_pool = None
+
+    def submit(self, func, *args, job_id, on_discard=None):
+        """Enfileira `func(*args, job=job)` e retorna o Job criado"""
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise QueueFull('Fila de importações cheia. Tente novamente em instantes.')
+            job = Job(job_id, func, args, self.timeout, on_discard)
+            self._jobs[job_id] = job
+            self._queue.append(job)
+            self._trim_finished()
+            self._ensure_workers()
+            self._publish_positions()
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.max_workers,
+                'use_processes': self.use_processes,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'max_queue': self.max_queue,
+                'jobs': [job.to_dict() for job in self._jobs.values()]
+            }
+
+    def cancel(self, job_id):
+        """Cancela um job; retorna False se ele não existe ou já terminou"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in ('queued', 'running'):
+                return False
+            job._cancel.set()
+            if job.status == 'queued':
+                self._queue.remove(job)
+                self._finish(job, 'cancelled', 'Importação cancelada')
+                self._publish_positions()
+                discard = job.on_discard
+            else:
+                discard = None
+        # O job em execução percebe o cancelamento no próximo check()
+        if discard:
+            discard()
+        return True
+
+    def run_cpu(self, job, func, *args):
+        """Executa `func(*args)` (que deve ser picklable) no pool de processos, respeitando cancelamento e timeout
+
+        Sem processos, `func` roda em uma thread auxiliar: ela não pode ser
+        interrompida, mas o job deixa de esperá-la assim que é cancelado ou
+        estoura o tempo limite, e o resultado é descartado.
+        """
+        job.check()
+        if self.use_processes:
+            future = self._get_process_pool().submit(func, *args)
+        else:
+            future = Future()
+
+            def run():
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            threading.Thread(target=run, name=f'import-cpu-{job.id}', daemon=True).start()
+
+        while True:
+            done, _ = wait([future], timeout=CPU_POLL_INTERVAL)
+            if done:
+                return future.result()
+            try:
+                job.check()
+            except JobCancelled:
+                future.cancel()
+                raise
+
+    def shutdown(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    def _get_process_pool(self):
+        with self._cond:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                atexit.register(self.shutdown)
+            return self._process_pool
+
+    def _ensure_workers(self):
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop,
+                                      name=f'import-worker-{len(self._workers) + 1}',
+                                      daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                job = self._queue.popleft()
+                job.status = 'running'
+                job.queue_position = None
+                job.started_at = time.time()
+                job._deadline = time.monotonic() + job.timeout if job.timeout else None
+                self._running.add(job)
+                self._publish_positions()
+
+            if self.progress is not None:
+                self.progress.update(job.id, stage='starting', queue_position=None,
+                                     message='Iniciando processamento...')
+
+            try:
+                job.func(*job.args, job=job)
+            except JobTimeout as e:
+                with self._cond:
+                    self._finish(job, 'timeout', str(e))
+            except JobCancelled as e:
+                with self._cond:
+                    self._finish(job, 'cancelled', str(e))
+            except Exception as e:
+                with self._cond:
+                    self._finish(job, 'failed', str(e))
+            else:
+                with self._cond:
+                    self._finish(job, 'completed')
+            finally:
+                with self._cond:
+                    self._running.discard(job)
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.queue_position = None
+        job.finished_at = time.time()
+        if self.progress is not None and status in ('cancelled', 'timeout'):
+            self.progress.update(job.id, status='cancelled', stage=status, message=error)
+
+    def _publish_positions(self):
+        for position, job in enumerate(self._queue, start=1):
+            if job.queue_position == position:
+                continue
+            job.queue_position = position
+            if self.progress is not None:
+                self.progress.update(job.id, stage='queued', queue_position=position,
+                                     message=f'Aguardando na fila (posição {position})')
+
+    def _trim_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.status not in ('queued', 'running')]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self._jobs[job_id]
@@ -0,0 +1,99 @@
+import threading
+import time
+
+PROGRESS_TTL = 30      # segundos que um processamento concluído continua consultável
+SWEEP_INTERVAL = 10    # intervalo entre as varreduras do janitor
+FINISHED_STATUSES = ('completed', 'error', 'cancelled')
+
+
+class ProgressRegistry:
+    """Registro do progresso dos uploads com expiração por TTL
+
+    Uma única thread (janitor) remove os processamentos concluídos depois de
+    `ttl` segundos. Cada atualização incrementa `version` e acorda quem estiver
+    esperando em `wait()`, o que permite transmitir o progresso por SSE.
+    """
+
+    def __init__(self, ttl=PROGRESS_TTL, sweep_interval=SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._entries = {}
+        self._expires = {}
+        self._cond = threading.Condition()
+        self._janitor = None
+
+    def create(self, process_id, **fields):
+        entry = {
+            'status': 'processing',
+            'stage': 'queued',
+            'current': 0,
+            'total': 0,
+            'percent': 0,
+            'message': 'Iniciando processamento...',
+            'version': 0
+        }
+        entry.update(fields)
+        with self._cond:
+            self._entries[process_id] = entry
+            self._ensure_janitor()
+            self._cond.notify_all()
+
+    def update(self, process_id, **fields):
+        with self._cond:
+            entry = self._entries.get(process_id)
+            if entry is None:
+                return
+            entry.update(fields)
+            if entry['total']:
+                entry['percent'] = int(entry['current'] * 100 / entry['total'])
+            if entry['status'] in FINISHED_STATUSES:
+                if entry['status'] == 'completed':
+                    entry['percent'] = 100
+                self._expires[process_id] = time.monotonic() + self.ttl
+            entry['version'] += 1
+            self._cond.notify_all()
+
+    def get(self, process_id):
+        with self._cond:
+            entry = self._entries.get(process_id)
+            return dict(entry) if entry is not None else None
+
+    def wait(self, process_id, version, timeout):
+        """Espera até o progresso mudar de `version` (ou o timeout) e retorna o estado atual"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._entries.get(process_id, {}).get('version') != version,
+                timeout
+            )
+            entry = self._entries.get(process_id)
+            return dict(entry) if entry is not None else None
+
+    def sweep(self):
+        """Remove os processamentos cujo TTL expirou"""
+        now = time.monotonic()
+        with self._cond:
+            expired = [pid for pid, expires in self._expires.items() if expires <= now]
+            for pid in expired:
+                self._expires.pop(pid, None)
+                self._entries.pop(pid, None)
+            if expired:
+                self._cond.notify_all()
+        return len(expired)
+
+    def __contains__(self, process_id):
+        with self._cond:
+            return process_id in self._entries
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def _ensure_janitor(self):
+        if self._janitor is None or not self._janitor.is_alive():
+            self._janitor = threading.Thread(target=self._janitor_loop, name='progress-janitor', daemon=True)
+            self._janitor.start()
+
+    def _janitor_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify
+
+# Rate limiting configuration
+RATE_LIMIT_WINDOW = 60      # seconds
+REQUEST_LIMIT = 60          # requests per window
+MAX_TRACKED_CLIENTS = 10000  # clientes mantidos em memória (LRU)
+
+
+class SlidingWindowLimiter:
+    """Rate limiter por contador de janela deslizante
+
+    Cada cliente ocupa memória constante: o início da janela atual e os
+    contadores da janela atual e da anterior. A contagem estimada é
+    `anterior * (fração restante da janela anterior) + atual`. Os clientes
+    ficam em ordem de uso e os mais antigos são descartados ao passar de
+    `max_keys`.
+    """
+
+    def __init__(self, limit=REQUEST_LIMIT, window=RATE_LIMIT_WINDOW, max_keys=MAX_TRACKED_CLIENTS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._clients = OrderedDict()  # key -> [window_start, previous_count, current_count]
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """Registra uma requisição; retorna False se o limite foi excedido"""
+        if now is None:
+            now = time.time()
+        window_start = now - (now % self.window)
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = [window_start, 0, 0]
+                self._clients[key] = entry
+                if len(self._clients) > self.max_keys:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(key)
+                if entry[0] != window_start:
+                    # Avança a janela; se passou mais de uma, a anterior está zerada
+                    entry[1] = entry[2] if window_start - entry[0] == self.window else 0
+                    entry[2] = 0
+                    entry[0] = window_start
+
+            elapsed = (now - window_start) / self.window
+            estimated = entry[1] * (1 - elapsed) + entry[2]
+            if estimated >= self.limit:
+                return False
+
+            entry[2] += 1
+            return True
+
+    def __len__(self):
+        return len(self._clients)
+
+
+def rate_limit(limit=REQUEST_LIMIT, window=RATE_LIMIT_WINDOW, max_keys=MAX_TRACKED_CLIENTS):
+    """Decorator de rate limit; cada rota decorada tem seus próprios limites"""
+    limiter = SlidingWindowLimiter(limit, window, max_keys)
+
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            if not limiter.hit(request.remote_addr):
+                return jsonify({'error': 'Rate limit exceeded. Please try again later.'}), 429
+            return f(*args, **kwargs)
+        wrapped.limiter = limiter
+        return wrapped
+    return decorator
+
+
+def benchmark(clients=10000, requests_per_client=20):
+    """Mede tempo por requisição e memória do limiter com muitos clientes distintos"""
+    import tracemalloc
+
+    tracemalloc.start()
+    limiter = SlidingWindowLimiter(max_keys=clients)
+    keys = [f'10.0.{i // 256}.{i % 256}' for i in range(clients)]
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    now = time.time()
+    for i in range(requests_per_client):
+        for key in keys:
+            limiter.hit(key, now + i * 0.01)
+    elapsed = time.perf_counter() - start
+
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    total = clients * requests_per_client
+    return {
+        'requests': total,
+        'clients': len(limiter),
+        'us_per_request': elapsed / total * 1e6,
+        'bytes_per_client': memory / clients
+    }
+
+
+if __name__ == '__main__':
+    result = benchmark()
+    print(f"Requisições: {result['requests']} de {result['clients']} clientes")
+    print(f"Tempo por requisição: {result['us_per_request']:.2f} µs")
+    print(f"Memória por cliente: {result['bytes_per_client']:.0f} bytes")
@@ -1,11 +1,21 @@
 import pandas as pd
 import os
+import sys
 import time
 from functools import wraps
 from datetime import datetime
 
+# Add the project root to Python path (leitor de planilhas compartilhado)
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from spreadsheet import read_spreadsheet
+from classifier import statement_classifier, find_statement_cnpj
+
 MAX_RETRIES = 3
 RETRY_DELAY = 5  # seconds
+HEADER_SCAN_ROWS = 50  # linhas lidas para encontrar o cabeçalho
 
 def retry_on_error(max_retries=MAX_RETRIES, delay=RETRY_DELAY):
     def decorator(func):
@@ -41,31 +51,8 @@ def extract_transaction_info(historico, valor):
         'description': historico  # Mantém a descrição original por padrão
     }
     
-    # Mapeamento de palavras-chave para tipos de transação
-    tipo_mapping = {
-        'PIX RECEBIDO': ['PIX RECEBIDO'],
-        'PIX ENVIADO': ['PIX ENVIADO'],
-        'TED RECEBIDA': ['TED RECEBIDA', 'TED CREDIT'],
-        'TED ENVIADA': ['TED ENVIADA', 'TED DEBIT'],
-        'PAGAMENTO': ['PAGAMENTO', 'PGTO', 'PAG'],
-        'TARIFA': ['TARIFA', 'TAR'],
-        'IOF': ['IOF'],
-        'RESGATE': ['RESGATE'],
-        'APLICACAO': ['APLICACAO', 'APLICAÇÃO'],
-        'COMPRA': ['COMPRA'],
-        'COMPENSACAO': ['COMPENSACAO', 'COMPENSAÇÃO'],
-        'CHEQUE DEVOLVIDO': ['CHEQUE DEVOLVIDO', 'CH DEVOLVIDO'],
-        'JUROS': ['JUROS'],
-        'MULTA': ['MULTA'],
-        'ANTECIPACAO': ['ANTECIPACAO', 'ANTECIPAÇÃO'],
-        'CHEQUE EMITIDO': ['CHEQUE EMITIDO', 'CH EMITIDO']
-    }
-    
-    # Procura por padrões específicos
-    for tipo, keywords in tipo_mapping.items():
-        if any(keyword in historico for keyword in keywords):
-            info['tipo'] = tipo
-            break
+    # Procura por padrões específicos (regras pré-compiladas)
+    info['tipo'] = statement_classifier.classify(historico)
     
     # Se nenhum tipo específico foi encontrado
     if info['tipo'] is None:
@@ -73,35 +60,13 @@ def extract_transaction_info(historico, valor):
     
     # Procura por CNPJ no histórico
     if info['tipo'] in ['PIX RECEBIDO', 'TED RECEBIDA', 'PAGAMENTO']:
-        import re
-        
-        # Procura por CNPJ em formato texto (ex: "CNPJ 12345678901234")
-        cnpj_text_match = re.search(r'CNPJ[:\s]+(\d{12,14})', historico)
-        if cnpj_text_match:
-            cnpj = cnpj_text_match.group(1)
-            # Remove zeros à esquerda e garante que tenha 14 dígitos
-            cnpj = str(int(cnpj)).zfill(14)
+        cnpj, cnpj_text_match = find_statement_cnpj(historico)
+        if cnpj:
             info['document'] = cnpj
             
             # Mantém a descrição original para processamento posterior
-            if info['tipo'] == 'PAGAMENTO':
+            if cnpj_text_match and info['tipo'] == 'PAGAMENTO':
                 info['description'] = historico.replace(cnpj_text_match.group(0), f"CNPJ {str(int(cnpj))}")
-        else:
-            # Procura por sequência de 14 dígitos
-            cnpj_match = re.search(r'\b\d{14}\b', historico)
-            if cnpj_match:
-                cnpj = cnpj_match.group()
-                # Remove zeros à esquerda
-                cnpj = str(int(cnpj)).zfill(14)
-                info['document'] = cnpj
-            else:
-                # Procura por CNPJ formatado
-                cnpj_match = re.search(r'\b\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}\b', historico)
-                if cnpj_match:
-                    cnpj = ''.join(filter(str.isdigit, cnpj_match.group()))
-                    # Remove zeros à esquerda
-                    cnpj = str(int(cnpj)).zfill(14)
-                    info['document'] = cnpj
     
     # Tenta extrair identificador após o tipo de transação
     if info['tipo'] in ['PIX RECEBIDO', 'PIX ENVIADO', 'TED RECEBIDA', 'TED ENVIADA']:
@@ -123,31 +88,38 @@ def get_transaction_type(historico):
         return 'despesa'
     return 'outros'
 
-def find_header_row(df):
-    """Encontra a linha que contém os cabeçalhos das colunas"""
+def find_header_row(df, max_rows=HEADER_SCAN_ROWS):
+    """Encontra a linha que contém os cabeçalhos das colunas (apenas nas primeiras `max_rows` linhas)"""
     header_keywords = ['data', 'histórico', 'valor', 'date', 'historic', 'value']
     
-    for idx, row in df.iterrows():
+    for idx, row in enumerate(df.head(max_rows).itertuples(index=False)):
         # Convert all values to string and check if any contain our keywords
         row_values = [str(val).lower().strip() for val in row if not pd.isna(val)]
         if any(keyword in value for value in row_values for keyword in header_keywords):
             return idx
     return 0
 
+def read_with_detected_header(file):
+    """Lê só o início da planilha para achar o cabeçalho e depois apenas a região de dados"""
+    filename = getattr(file, 'filename', None)
+    head = read_spreadsheet(file, filename, header=None, nrows=HEADER_SCAN_ROWS)
+    header_row = find_header_row(head)
+    header_values = list(head.iloc[header_row]) if len(head) > header_row else []
+    
+    df = read_spreadsheet(file, filename, header=None, skiprows=header_row + 1)
+    
+    # Get the header row values
+    df.columns = [str(header_values[i]).strip() if i < len(header_values) and not pd.isna(header_values[i])
+                  else f'Column_{i}'
+                  for i in range(len(df.columns))]
+    return df
+
 @retry_on_error()
 def process_excel_file(file):
     """Process Excel file and extract transaction data"""
     try:
-        df = pd.read_excel(file)
-        
-        # Find the header row
-        header_row = find_header_row(df)
-        if header_row > 0:
-            # Get the header row values
-            new_columns = [str(val).strip() if not pd.isna(val) else f'Column_{i}' 
-                         for i, val in enumerate(df.iloc[header_row])]
-            df.columns = new_columns
-            df = df.iloc[header_row + 1:].reset_index(drop=True)
+        # Find the header row and read only the data region below it
+        df = read_with_detected_header(file)
         
         # Find relevant columns
         data_col = find_matching_column(df, ['Data', 'DATE', 'DT'])
@@ -1,11 +1,15 @@
 from flask import Flask
 from app import app as financeiro_blueprint, UPLOAD_FOLDER
+from assets import StaticAssets
+from profiler import RequestProfiler
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 app.register_blueprint(financeiro_blueprint)
+StaticAssets(app)
+RequestProfiler(app)
 
 if __name__ == '__main__':
     print("Starting Financeiro app on http://127.0.0.1:5002/")
@@ -0,0 +1,141 @@
+"""Fixa os resultados atuais da classificação e da extração de CNPJ.
+
+As tabelas de palavras-chave vieram de read_excel (STATEMENT_TYPE_RULES) e de
+app.process_file_with_progress (IMPORT_TYPE_RULES); cada caso é conferido
+tanto contra o valor esperado quanto contra a busca aninhada original
+(`_legacy_classify`), que é a definição do comportamento.
+"""
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classifier import (  # noqa: E402
+    IMPORT_TYPE_RULES,
+    STATEMENT_TYPE_RULES,
+    _legacy_classify,
+    fallback_transaction_type,
+    find_enrich_cnpj,
+    find_statement_cnpj,
+    import_classifier,
+    statement_classifier,
+)
+
+# (descrição, tipo no extrato, tipo na importação)
+DESCRIPTIONS = [
+    ('PIX RECEBIDO FULANO DE TAL', 'PIX RECEBIDO', 'PIX RECEBIDO'),
+    ('PIX ENVIADO FORNECEDOR LTDA', 'PIX ENVIADO', 'PIX ENVIADO'),
+    ('TED RECEBIDA CNPJ: 11222333000181', 'TED RECEBIDA', 'TED RECEBIDA'),
+    ('TED CREDIT 0001', 'TED RECEBIDA', 'TED RECEBIDA'),
+    ('TED ENVIADA', 'TED ENVIADA', 'TED ENVIADA'),
+    ('TED DEBIT 123', 'TED ENVIADA', 'TED ENVIADA'),
+    ('PAGAMENTO BOLETO', 'PAGAMENTO', 'PAGAMENTO'),
+    ('PGTO BOLETO', 'PAGAMENTO', 'PAGAMENTO'),
+    ('TARIFA PACOTE SERVICOS', 'TARIFA', 'TARIFA'),
+    ('IOF', 'IOF', 'IOF'),
+    ('RESGATE CDB', 'RESGATE', 'RESGATE'),
+    ('APLICAÇÃO CDB', 'APLICACAO', 'APLICACAO'),
+    ('COMPRA CARTAO', 'COMPRA', 'COMPRA'),
+    ('COMPENSAÇÃO CHEQUE', 'COMPENSACAO', 'COMPENSACAO'),
+    ('CHEQUE DEVOLVIDO', 'CHEQUE DEVOLVIDO', 'CHEQUE'),
+    ('CH DEVOLVIDO JUROS', 'CHEQUE DEVOLVIDO', 'JUROS'),
+    ('CHEQUE EMITIDO 123', 'CHEQUE EMITIDO', 'CHEQUE'),
+    ('TRANSF PIX', None, 'TRANSFERENCIA'),
+    ('JUROS CHEQUE ESPECIAL', 'JUROS', 'CHEQUE'),
+    ('MULTA ATRASO', 'MULTA', 'MULTA'),
+    ('ANTECIPAÇÃO RECEBIVEIS', 'ANTECIPACAO', None),
+    ('DOC 123', None, None),
+    ('', None, None),
+]
+
+# Várias palavras-chave na mesma descrição: vence o tipo que vem antes nas regras
+PRIORITY = [
+    ('TARIFA PIX ENVIADO', 'PIX ENVIADO', 'PIX ENVIADO'),
+    ('TARIFA PAGAMENTO', 'PAGAMENTO', 'PAGAMENTO'),
+    ('TED CREDIT PAG', 'TED RECEBIDA', 'TED RECEBIDA'),
+    ('APLICAÇÃO RESGATE', 'RESGATE', 'RESGATE'),
+    ('COMPRA CARTAO IOF', 'IOF', 'IOF'),
+    ('MULTA JUROS', 'JUROS', 'JUROS'),
+    ('PAGPIX RECEBIDO', 'PIX RECEBIDO', 'PIX RECEBIDO'),
+    # Palavras-chave contidas em outras: 'TAR' dentro de 'STARBUCKS', 'PAG' dentro de 'PAGAMENTO'
+    ('STARBUCKS', 'TARIFA', 'TARIFA'),
+    ('PAGAMENTO TARIFA', 'PAGAMENTO', 'PAGAMENTO'),
+    # Sobreposição parcial: o fim de uma palavra-chave é o começo de outra mais prioritária
+    ('RESGATED ENVIADA', 'TED ENVIADA', 'TED ENVIADA'),
+    ('COMPRAPLICACAO', 'APLICACAO', 'APLICACAO'),
+    ('MULTARIFA', 'TARIFA', 'TARIFA'),
+    ('TED DEBITED RECEBIDA', 'TED RECEBIDA', 'TED RECEBIDA'),
+    ('TRANSFERENCIAPLICACAO', 'APLICACAO', 'APLICACAO'),
+]
+
+
+@pytest.mark.parametrize('description, statement_type, import_type', DESCRIPTIONS + PRIORITY)
+def test_statement_rules(description, statement_type, import_type):
+    assert statement_classifier.classify(description) == statement_type
+    assert _legacy_classify(STATEMENT_TYPE_RULES, description) == statement_type
+
+
+@pytest.mark.parametrize('description, statement_type, import_type', DESCRIPTIONS + PRIORITY)
+def test_import_rules(description, statement_type, import_type):
+    assert import_classifier.classify(description) == import_type
+    assert _legacy_classify(IMPORT_TYPE_RULES, description) == import_type
+
+
+def test_overlapping_keywords_are_detected():
+    assert {'COMPRA', 'MULTA', 'RESGATE', 'TED DEBIT'} <= statement_classifier._overlapping
+    assert 'TRANSFERENCIA' in import_classifier._overlapping
+
+
+def test_classify_many_matches_classify():
+    descriptions = ['pix recebido fulano', 'PIX RECEBIDO FULANO', 'tarifa', None, math.nan, 123, 'doc',
+                    'pix recebido fulano']
+    result = import_classifier.classify_many(descriptions)
+    assert result == [import_classifier.classify(str(d).upper()) for d in descriptions]
+    assert result == ['PIX RECEBIDO', 'PIX RECEBIDO', 'TARIFA', None, None, None, None, 'PIX RECEBIDO']
+
+
+def test_classify_many_accepts_iterables():
+    assert statement_classifier.classify_many(iter(['iof', 'juros'])) == ['IOF', 'JUROS']
+    assert statement_classifier.classify_many([]) == []
+
+
+@pytest.mark.parametrize('description, value, expected', [
+    ('PIX FULANO', 10.0, 'PIX RECEBIDO'),
+    ('PIX FULANO', -10.0, 'PIX ENVIADO'),
+    ('TED FULANO', 10.0, 'TED RECEBIDA'),
+    ('TED FULANO', -10.0, 'TED ENVIADA'),
+    ('DOC FULANO', 10.0, 'CREDITO'),
+    ('DOC FULANO', -10.0, 'DEBITO'),
+])
+def test_fallback_transaction_type(description, value, expected):
+    assert fallback_transaction_type(description, value) == expected
+
+
+@pytest.mark.parametrize('historico, cnpj, from_text', [
+    ('PIX RECEBIDO CNPJ: 11222333000181', '11222333000181', 'CNPJ: 11222333000181'),
+    # Zeros à esquerda perdidos na planilha são recompostos
+    ('PIX RECEBIDO CNPJ: 1222333000181', '01222333000181', 'CNPJ: 1222333000181'),
+    ('TED 11222333000181 FORNECEDOR', '11222333000181', None),
+    ('PAGAMENTO 11.222.333/0001-81', '11222333000181', None),
+    ('PIX 123', None, None),
+])
+def test_find_statement_cnpj(historico, cnpj, from_text):
+    found, match = find_statement_cnpj(historico)
+    assert found == cnpj
+    assert (match.group() if match else None) == from_text
+
+
+@pytest.mark.parametrize('description, whole, cnpj', [
+    ('PIX CNPJ: 011222333000181', 'CNPJ: 011222333000181', '011222333000181'),
+    ('PIX CNPJ 11.222.333/0001-81', 'CNPJ 11.222.333/0001-81', '11.222.333/0001-81'),
+    ('PIX RECEBIDO 11222333000181', '11222333000181', '11222333000181'),
+    ('PIX RECEBIDO 11.222.333/0001-81', '11.222.333/0001-81', '11.222.333/0001-81'),
+    ('PIX RECEBIDO 123', None, None),
+])
+def test_find_enrich_cnpj(description, whole, cnpj):
+    match = find_enrich_cnpj(description)
+    assert (match.group(0) if match else None) == whole
+    assert (match.group(1) if match else None) == cnpj
@@ -0,0 +1,146 @@
+"""init_db em bancos criados por versões anteriores: migra sem perder dados."""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, here)
+sys.path.append(os.path.dirname(here))  # spreadsheet.py, assets.py e profiler.py ficam na raiz
+
+from app import import_chunk, init_db  # noqa: E402
+from fingerprint import transaction_fingerprint  # noqa: E402
+
+# Tabela criada pelo init_db original (sem fingerprint, resumos nem busca)
+BASELINE_SCHEMA = '''
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATE NOT NULL,
+        description TEXT NOT NULL,
+        document TEXT,
+        value REAL NOT NULL,
+        type TEXT NOT NULL,
+        identifier TEXT,
+        transaction_type TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+BASELINE_ROWS = [
+    ('2024-01-05', 'PIX RECEBIDO FULANO', 150.0, 'PIX RECEBIDO', 'receita'),
+    ('2024-01-05', 'TARIFA PACOTE', -12.5, 'TARIFA', 'despesa'),
+    ('2024-01-05', 'TARIFA PACOTE', -12.5, 'TARIFA', 'despesa'),  # lançamento repetido legítimo
+    ('2024-02-10', 'PAGAMENTO BOLETO', -300.0, 'PAGAMENTO', 'despesa'),
+]
+
+
+def statement_rows(rows):
+    """Linhas como a importação monta, com a posição entre as idênticas"""
+    occurrences = {}
+    chunk = []
+    for date, description, value, tipo, _ in rows:
+        key = (date, round(value, 2), description)
+        position = occurrences.get(key, 0)
+        occurrences[key] = position + 1
+        chunk.append({'date': date, 'description': description, 'value': value, 'type': tipo,
+                      'fingerprint': transaction_fingerprint(date, value, description, position)})
+    return chunk
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    path = str(tmp_path / 'financas.db')
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO transactions (date, description, value, type, transaction_type) VALUES (?, ?, ?, ?, ?)',
+                     BASELINE_ROWS)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_init_db_migrates_baseline_schema(baseline_db):
+    init_db(sqlite3.connect(baseline_db))
+    init_db(sqlite3.connect(baseline_db))  # roda de novo em todo boot
+
+    conn = sqlite3.connect(baseline_db)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(transactions)')}
+    indexes = {row[1] for row in conn.execute('PRAGMA index_list(transactions)')}
+    rows = conn.execute('SELECT date, description, value, type, transaction_type FROM transactions ORDER BY id').fetchall()
+    conn.close()
+
+    assert 'fingerprint' in columns
+    assert 'idx_transactions_fingerprint' in indexes
+    assert rows == BASELINE_ROWS
+
+
+def test_init_db_backfills_fingerprints(baseline_db):
+    init_db(sqlite3.connect(baseline_db))
+
+    conn = sqlite3.connect(baseline_db)
+    fingerprints = [row[0] for row in conn.execute('SELECT fingerprint FROM transactions ORDER BY id')]
+    assert fingerprints == [row['fingerprint'] for row in statement_rows(BASELINE_ROWS)]
+
+    # Reimportar o mesmo extrato não duplica nada
+    assert import_chunk(conn, statement_rows(BASELINE_ROWS)) == (0, len(BASELINE_ROWS))
+    assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == len(BASELINE_ROWS)
+    conn.close()
+
+
+def test_backfill_skips_fingerprints_in_use(baseline_db):
+    # Uma linha já migrada e uma cópia dela ainda sem impressão digital
+    conn = sqlite3.connect(baseline_db)
+    conn.execute('ALTER TABLE transactions ADD COLUMN fingerprint TEXT')
+    first = statement_rows(BASELINE_ROWS)[0]['fingerprint']
+    conn.execute('UPDATE transactions SET fingerprint = ? WHERE id = 1', (first,))
+    conn.execute('INSERT INTO transactions (date, description, value, type, transaction_type) VALUES (?, ?, ?, ?, ?)',
+                 BASELINE_ROWS[0])
+    conn.commit()
+    conn.close()
+
+    init_db(sqlite3.connect(baseline_db))
+
+    conn = sqlite3.connect(baseline_db)
+    fingerprints = [row[0] for row in conn.execute('SELECT fingerprint FROM transactions ORDER BY id')]
+    conn.close()
+    date, description, value = BASELINE_ROWS[0][:3]
+    assert fingerprints[0] == first
+    assert fingerprints[-1] == transaction_fingerprint(date, value, description, 1)
+    assert len(set(fingerprints)) == len(fingerprints)
+
+
+def test_init_db_seeds_summary_from_existing_rows(baseline_db):
+    init_db(sqlite3.connect(baseline_db))
+    init_db(sqlite3.connect(baseline_db))
+
+    conn = sqlite3.connect(baseline_db)
+    summary = conn.execute('SELECT type, month, count, total FROM transaction_summary ORDER BY type, month').fetchall()
+    conn.close()
+    assert summary == [('PAGAMENTO', '2024-02', 1, -300.0), ('PIX RECEBIDO', '2024-01', 1, 150.0),
+                       ('TARIFA', '2024-01', 2, -25.0)]
+
+
+def test_init_db_seeds_cashflow_from_existing_rows(baseline_db):
+    init_db(sqlite3.connect(baseline_db))
+    init_db(sqlite3.connect(baseline_db))
+
+    conn = sqlite3.connect(baseline_db)
+    daily = conn.execute('SELECT day, type, count, inflow, outflow FROM cashflow_daily ORDER BY day, type').fetchall()
+    monthly = conn.execute('SELECT month, type, count, inflow, outflow FROM cashflow_monthly ORDER BY month, type').fetchall()
+    conn.close()
+    assert daily == [('2024-01-05', 'PIX RECEBIDO', 1, 150.0, 0.0), ('2024-01-05', 'TARIFA', 2, 0.0, 25.0),
+                     ('2024-02-10', 'PAGAMENTO', 1, 0.0, 300.0)]
+    assert monthly == [('2024-01', 'PIX RECEBIDO', 1, 150.0, 0.0), ('2024-01', 'TARIFA', 2, 0.0, 25.0),
+                       ('2024-02', 'PAGAMENTO', 1, 0.0, 300.0)]
+
+
+def test_init_db_indexes_existing_rows_for_search(baseline_db):
+    init_db(sqlite3.connect(baseline_db))
+    init_db(sqlite3.connect(baseline_db))
+
+    conn = sqlite3.connect(baseline_db)
+    found = conn.execute("SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH 'tarifa' ORDER BY rowid").fetchall()
+    conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('integrity-check')")
+    conn.close()
+    assert found == [(2,), (3,)]
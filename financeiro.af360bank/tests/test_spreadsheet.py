@@ -0,0 +1,36 @@
+"""Todos os engines de spreadsheet.py devolvem as mesmas colunas do pd.read_excel."""
+import os
+import sys
+
+import openpyxl
+import pandas as pd
+import pytest
+
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(here))  # spreadsheet.py fica na raiz
+
+from spreadsheet import available_engines, read_spreadsheet  # noqa: E402
+
+EXCEL_ENGINES = [engine for engine in available_engines() if engine != 'csv']
+
+HEADERS = [
+    ['Data', 'Histórico', 'Valor', 'Valor'],
+    # 'Valor.1' já existe: a repetição vira 'Valor.2'; células vazias e números também
+    ['Data', 'Valor', 'Valor', 'Valor.1', None, 'Valor', 1, 1],
+]
+
+
+@pytest.mark.parametrize('engine', EXCEL_ENGINES)
+@pytest.mark.parametrize('header', HEADERS)
+def test_repeated_headers_match_read_excel(tmp_path, engine, header):
+    path = str(tmp_path / 'extrato.xlsx')
+    workbook = openpyxl.Workbook()
+    workbook.active.append(header)
+    workbook.active.append(['05/01/2024'] + list(range(1, len(header))))
+    workbook.save(path)
+
+    expected = list(pd.read_excel(path).columns)
+    columns = list(read_spreadsheet(path, engine=engine).columns)
+
+    assert columns == expected
+    assert len(set(columns)) == len(columns)
@@ -0,0 +1,13 @@
+import os
+
+# Um único processo: o progresso dos uploads, a fila de importações e o pool
+# de conexões vivem em memória e precisam ser vistos por todas as requisições.
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Workers com threads: o stream de progresso (SSE) fica aberto durante a
+# importação e, com o worker sync padrão, bloquearia todas as outras requisições.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+timeout = 120
@@ -0,0 +1,547 @@
+"""Profiler por requisição, sob demanda, com flame graphs guardados.
+
+Uma requisição é amostrada quando:
+- traz o header `X-Profile` com um token assinado (`python profiler.py token`), ou
+- casa com uma rota armada na página /_profiler/ (prefixo do caminho, duração
+  mínima e prazo), o que permite pegar as requisições lentas de usuários reais.
+
+A amostragem não instrumenta as chamadas: um único thread por processo lê a
+pilha dos threads em captura a cada SAMPLE_INTERVAL (sys._current_frames) e só
+existe trabalho enquanto há captura em andamento. Cada captura é gravada em
+PROFILER_DIR no formato do speedscope (https://www.speedscope.app) e listada
+em /_profiler/ com rota, duração e os frames com mais tempo próprio; a página
+de cada captura desenha o flame graph.
+
+`RequestProfiler(app)` deve envolver a camada WSGI mais externa (no portal,
+depois de montar os sub-apps, ver wsgi.py) para cobrir todas as rotas.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import Blueprint, abort, redirect, render_template, request, send_file, url_for
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+
+PROFILER_DIR = os.environ.get('PROFILER_DIR', os.path.join(project_root, 'profiles'))
+URL_PREFIX = '/_profiler'
+SAMPLE_INTERVAL = 0.005    # segundos entre amostras (5 ms)
+MAX_DEPTH = 256            # frames guardados por amostra
+MAX_CAPTURES = 100         # capturas mantidas em disco; as mais antigas são apagadas
+TOP_FRAMES = 5             # frames listados no índice
+TOKEN_HEADER = 'X-Profile'
+TOKEN_COOKIE = 'profiler_token'
+TOKEN_SALT = 'request-profiler'
+TOKEN_MAX_AGE = 7 * 24 * 3600
+ARMED_FILE = 'armed.json'
+ARMED_CHECK_INTERVAL = 2   # segundos entre releituras do armed.json em cada processo
+MIN_FLAME_WIDTH = 0.002    # blocos com menos desta fração do tempo não são desenhados
+OUTSIDE_APP = '(fora da aplicação)'  # thread no servidor, entre os pedaços da resposta
+CAPTURE_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+logger = logging.getLogger(__name__)
+
+
+# --- Tokens ---------------------------------------------------------------
+
+def _serializer() -> URLSafeTimedSerializer:
+    # Mesma chave no portal e nos sub-apps, para o token valer em todos
+    secret = os.environ.get('PROFILER_SECRET') or os.environ.get('FLASK_SECRET_KEY', 'development_key')
+    return URLSafeTimedSerializer(secret, salt=TOKEN_SALT)
+
+
+def make_token(label: str = 'admin') -> str:
+    """Token para o header X-Profile e para o acesso a /_profiler/"""
+    return _serializer().dumps({'by': label})
+
+
+def check_token(token: Optional[str]) -> Optional[str]:
+    """Quem emitiu o token, ou None se ele for inválido ou tiver expirado"""
+    if not token:
+        return None
+    try:
+        return _serializer().loads(token, max_age=TOKEN_MAX_AGE).get('by') or 'admin'
+    except (BadSignature, AttributeError):
+        return None
+
+
+# --- Amostragem -----------------------------------------------------------
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(project_root + os.sep):
+        return os.path.relpath(filename, project_root)
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
+
+
+class _Capture:
+    """Pilhas amostradas de uma requisição, já no formato do speedscope"""
+
+    def __init__(self, method: str, path: str, trigger: str, min_ms: float = 0):
+        self.thread_id = threading.get_ident()
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.min_ms = min_ms
+        self.status = None
+        self.started_at = datetime.now()
+        self.frames = {}     # (nome, arquivo, linha) -> índice
+        self.samples = []    # índices dos frames, da raiz para a folha
+        self.weights = []    # ms representados por cada amostra
+        self.started = self.last = time.perf_counter()
+        self.duration_ms = 0.0
+
+    def _frame_index(self, key) -> int:
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def add(self, frame, now: float) -> None:
+        stack = []
+        while frame is not None and frame.f_code not in _ROOT_CODES:
+            if len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                stack.append(self._frame_index((getattr(code, 'co_qualname', code.co_name),
+                                                code.co_filename, code.co_firstlineno)))
+            frame = frame.f_back
+        if frame is None:
+            # Nenhum frame do profiler na pilha: o servidor está com o controle
+            stack = [self._frame_index((OUTSIDE_APP, '', 0))]
+        stack.reverse()
+        self.samples.append(stack)
+        self.weights.append((now - self.last) * 1000)
+        self.last = now
+
+    def finish(self) -> None:
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+    def speedscope(self) -> Dict:
+        name = f'{self.method} {self.path}'
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'af360bank profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': [{'name': frame_name, 'file': _short_path(filename), 'line': line}
+                                  for frame_name, filename, line in self.frames]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(self.duration_ms, 3),
+                'samples': self.samples,
+                'weights': [round(weight, 3) for weight in self.weights],
+            }],
+        }
+
+    def top_frames(self, limit: int = TOP_FRAMES) -> List[Dict]:
+        """Frames com mais tempo próprio (na folha da pilha)"""
+        self_ms = Counter()
+        for stack, weight in zip(self.samples, self.weights):
+            if stack:
+                self_ms[stack[-1]] += weight
+        frames = list(self.frames)
+        return [{'name': frames[index][0], 'file': _short_path(frames[index][1]), 'line': frames[index][2],
+                 'self_ms': round(ms, 1)} for index, ms in self_ms.most_common(limit)]
+
+
+class _Sampler:
+    """Thread único do processo que amostra as pilhas das capturas em andamento"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.active = {}  # thread id -> _Capture
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self, capture: _Capture) -> None:
+        with self.lock:
+            self.active[capture.thread_id] = capture
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def stop(self, capture: _Capture) -> None:
+        # Sob o lock: depois daqui o thread de amostragem não toca mais na captura
+        with self.lock:
+            self.active.pop(capture.thread_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self.lock:
+                if not self.active:
+                    self.wakeup.clear()
+                    idle = True
+                else:
+                    idle = False
+                    frames = sys._current_frames()
+                    now = time.perf_counter()
+                    for thread_id, capture in self.active.items():
+                        frame = frames.get(thread_id)
+                        if frame is not None:
+                            capture.add(frame, now)
+                    del frames
+            if idle:
+                self.wakeup.wait()
+            else:
+                time.sleep(self.interval)
+
+
+_sampler = _Sampler()
+
+
+# --- Capturas em disco ----------------------------------------------------
+
+def _write_json(path: str, data) -> None:
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def _capture_path(capture_id: str, kind: str) -> str:
+    return os.path.join(PROFILER_DIR, f'{capture_id}.{kind}.json')
+
+
+def save(capture: _Capture) -> str:
+    """Grava o speedscope e o resumo da captura; devolve o id"""
+    os.makedirs(PROFILER_DIR, exist_ok=True)
+    capture_id = f'{capture.started_at:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+    _write_json(_capture_path(capture_id, 'speedscope'), capture.speedscope())
+    # O resumo por último: o índice só lista capturas completas
+    _write_json(_capture_path(capture_id, 'meta'), {
+        'id': capture_id,
+        'method': capture.method,
+        'path': capture.path,
+        'status': capture.status,
+        'trigger': capture.trigger,
+        'started_at': capture.started_at.isoformat(timespec='seconds'),
+        'duration_ms': round(capture.duration_ms, 1),
+        'samples': len(capture.samples),
+        'top_frames': capture.top_frames(),
+    })
+    _prune()
+    return capture_id
+
+
+def _capture_ids() -> List[str]:
+    try:
+        names = os.listdir(PROFILER_DIR)
+    except OSError:
+        return []
+    return sorted((name[:-len('.meta.json')] for name in names if name.endswith('.meta.json')), reverse=True)
+
+
+def _prune() -> None:
+    for capture_id in _capture_ids()[MAX_CAPTURES:]:
+        for kind in ('meta', 'speedscope'):
+            try:
+                os.remove(_capture_path(capture_id, kind))
+            except OSError:
+                pass
+
+
+def recent(limit: int = MAX_CAPTURES) -> List[Dict]:
+    """Resumos das capturas mais recentes primeiro"""
+    captures = []
+    for capture_id in _capture_ids()[:limit]:
+        try:
+            with open(_capture_path(capture_id, 'meta'), encoding='utf-8') as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return captures
+
+
+def load(capture_id: str, kind: str = 'meta') -> Optional[Dict]:
+    if not CAPTURE_ID.match(capture_id or ''):
+        return None
+    try:
+        with open(_capture_path(capture_id, kind), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# --- Rotas armadas --------------------------------------------------------
+
+_armed = {'checked': 0.0, 'mtime': None, 'rules': []}
+
+
+def armed_rules() -> List[Dict]:
+    """Rotas armadas ainda no prazo (o arquivo é relido a cada ARMED_CHECK_INTERVAL)"""
+    now = time.time()
+    if now - _armed['checked'] >= ARMED_CHECK_INTERVAL:
+        _armed['checked'] = now
+        path = os.path.join(PROFILER_DIR, ARMED_FILE)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            _armed.update(mtime=None, rules=[])
+        else:
+            if mtime != _armed['mtime']:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        rules = json.load(f)
+                except (OSError, ValueError):
+                    rules = []
+                _armed.update(mtime=mtime, rules=rules)
+    return [rule for rule in _armed['rules'] if rule['until'] > now]
+
+
+def _save_rules(rules: List[Dict]) -> None:
+    os.makedirs(PROFILER_DIR, exist_ok=True)
+    _write_json(os.path.join(PROFILER_DIR, ARMED_FILE), rules)
+    _armed['checked'] = 0.0
+
+
+def arm(prefix: str, minutes: float, min_ms: float = 0, by: str = 'admin') -> Dict:
+    """Amostra as requisições cujo caminho começa com `prefix` durante `minutes`"""
+    if not prefix.startswith('/'):
+        raise ValueError('O prefixo deve começar com /')
+    if minutes <= 0 or min_ms < 0:
+        raise ValueError('Prazo e duração mínima devem ser positivos')
+    rule = {'prefix': prefix, 'min_ms': min_ms, 'until': time.time() + minutes * 60, 'by': by}
+    _save_rules([r for r in armed_rules() if r['prefix'] != prefix] + [rule])
+    return rule
+
+
+def disarm(prefix: Optional[str] = None) -> None:
+    _save_rules([] if prefix is None else [r for r in armed_rules() if r['prefix'] != prefix])
+
+
+# --- Middleware -----------------------------------------------------------
+
+def _finish(capture: _Capture) -> None:
+    _sampler.stop(capture)
+    capture.finish()
+    if capture.duration_ms < capture.min_ms:
+        return
+    try:
+        save(capture)
+    except OSError as e:
+        logger.warning(f'Não foi possível gravar o profile de {capture.path}: {e}')
+
+
+class _ProfiledBody:
+    """Corpo da resposta: a captura só termina quando o servidor fecha o corpo
+    (as páginas em streaming são geradas enquanto ele é lido)"""
+
+    def __init__(self, body, capture: _Capture):
+        self.body = body
+        self.capture = capture
+
+    def __iter__(self):
+        for chunk in self.body:
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            _finish(self.capture)
+
+
+class RequestProfiler:
+    """Envolve o WSGI do app e registra as páginas em /_profiler/"""
+
+    def __init__(self, app=None):
+        self.wsgi_app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+        app.register_blueprint(blueprint, url_prefix=URL_PREFIX)
+
+    def _trigger(self, environ, path):
+        """(motivo, duração mínima) se a requisição deve ser amostrada"""
+        if path.startswith(URL_PREFIX + '/'):
+            return None
+        by = check_token(environ.get('HTTP_X_PROFILE'))
+        if by:
+            return f'header ({by})', 0
+        for rule in armed_rules():
+            if path.startswith(rule['prefix']):
+                return f"armada ({rule.get('by', 'admin')})", rule['min_ms']
+        return None
+
+    def __call__(self, environ, start_response):
+        path = environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '')
+        trigger = self._trigger(environ, path)
+        if trigger is None:
+            return self.wsgi_app(environ, start_response)
+        return self._profile(environ, start_response, path, *trigger)
+
+    def _profile(self, environ, start_response, path, trigger, min_ms):
+        capture = _Capture(environ.get('REQUEST_METHOD', 'GET'), path, trigger, min_ms)
+
+        def record_status(status, headers, exc_info=None):
+            capture.status = int(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+
+        _sampler.start(capture)
+        try:
+            body = self.wsgi_app(environ, record_status)
+        except BaseException:
+            capture.status = 500
+            _finish(capture)
+            raise
+        return _ProfiledBody(body, capture)
+
+
+# Frames onde a pilha amostrada começa (o que está acima é o servidor)
+_ROOT_CODES = {RequestProfiler._profile.__code__, _ProfiledBody.__iter__.__code__,
+               _ProfiledBody.close.__code__}
+
+
+# --- Páginas --------------------------------------------------------------
+
+blueprint = Blueprint('profiler', __name__, template_folder=os.path.join(project_root, 'templates'))
+
+
+def _cookie_path() -> str:
+    return request.script_root + URL_PREFIX
+
+
+@blueprint.before_request
+def require_token():
+    # ?token=... vira cookie (só para /_profiler) e some da URL
+    token = request.args.get('token')
+    if token and check_token(token):
+        response = redirect(request.base_url)
+        response.set_cookie(TOKEN_COOKIE, token, max_age=TOKEN_MAX_AGE, path=_cookie_path(),
+                            httponly=True, samesite='Strict')
+        return response
+    if not check_token(request.headers.get(TOKEN_HEADER) or request.cookies.get(TOKEN_COOKIE)):
+        abort(404)
+
+
+def flame_rects(document: Dict) -> Dict:
+    """Blocos do flame graph (raiz em cima), em frações do tempo total"""
+    frames = document['shared']['frames']
+    profile = document['profiles'][0]
+    root = {'children': {}, 'ms': 0.0}
+    for stack, weight in zip(profile['samples'], profile['weights']):
+        node = root
+        node['ms'] += weight
+        for index in stack:
+            node = node['children'].setdefault(index, {'children': {}, 'ms': 0.0})
+            node['ms'] += weight
+
+    total = root['ms'] or 1.0
+    in_project = {}  # arquivo -> é código do projeto (os demais são bibliotecas)
+    rects, depth = [], 0
+    pending = [(root, -1, 0.0)]
+    while pending:
+        node, level, x = pending.pop()
+        for index, child in sorted(node['children'].items(), key=lambda item: -item[1]['ms']):
+            width = child['ms'] / total
+            if width >= MIN_FLAME_WIDTH:
+                frame = frames[index]
+                file = frame.get('file') or ''
+                if file not in in_project:
+                    in_project[file] = bool(file) and os.path.isfile(os.path.join(project_root, file))
+                rects.append({'depth': level + 1, 'x': x * 100, 'width': width * 100,
+                              'name': frame['name'], 'file': file, 'line': frame.get('line'),
+                              'ms': round(child['ms'], 1), 'app': in_project[file]})
+                depth = max(depth, level + 1)
+                pending.append((child, level + 1, x))
+            x += width
+    return {'rects': rects, 'depth': depth, 'total_ms': round(total, 1)}
+
+
+@blueprint.route('/')
+def index():
+    return render_template('profiler/index.html', captures=recent(), rules=armed_rules(),
+                           now=time.time(), header=TOKEN_HEADER)
+
+
+@blueprint.route('/armar', methods=['POST'])
+def armar():
+    by = check_token(request.headers.get(TOKEN_HEADER) or request.cookies.get(TOKEN_COOKIE))
+    try:
+        arm(request.form.get('prefix', '').strip(), float(request.form.get('minutes') or 15),
+            float(request.form.get('min_ms') or 0), by=by)
+    except ValueError as e:
+        return render_template('profiler/index.html', captures=recent(), rules=armed_rules(),
+                               now=time.time(), header=TOKEN_HEADER, error=str(e)), 400
+    return redirect(url_for('profiler.index'))
+
+
+@blueprint.route('/desarmar', methods=['POST'])
+def desarmar():
+    disarm(request.form.get('prefix') or None)
+    return redirect(url_for('profiler.index'))
+
+
+@blueprint.route('/<capture_id>')
+def capture(capture_id):
+    meta = load(capture_id)
+    document = load(capture_id, 'speedscope')
+    if meta is None or document is None:
+        abort(404)
+    return render_template('profiler/capture.html', capture=meta, flame=flame_rects(document))
+
+
+@blueprint.route('/<capture_id>/speedscope.json')
+def speedscope(capture_id):
+    if load(capture_id) is None:
+        abort(404)
+    return send_file(_capture_path(capture_id, 'speedscope'), mimetype='application/json',
+                     as_attachment=True, download_name=f'{capture_id}.speedscope.json')
+
+
+def benchmark(iterations: int = 20):
+    """Tempo de uma função com e sem amostragem (custo do profiler)"""
+    def work():
+        total = 0
+        for i in range(200000):
+            total += i % 7
+        return total
+
+    def timed():
+        start = time.perf_counter()
+        work()
+        return time.perf_counter() - start
+
+    plain = min(timed() for _ in range(iterations))
+    sampled, samples = [], 0
+    for _ in range(iterations):
+        capture = _Capture('GET', '/benchmark', 'benchmark')
+        _sampler.start(capture)
+        sampled.append(timed())
+        _sampler.stop(capture)
+        samples += len(capture.samples)
+    return {'plain_ms': plain * 1000, 'sampled_ms': min(sampled) * 1000,
+            'overhead': min(sampled) / plain - 1, 'samples': samples}
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['token']:
+        label = sys.argv[2] if len(sys.argv) > 2 else 'admin'
+        token = make_token(label)
+        print(token)
+        print(f"\n  curl -H '{TOKEN_HEADER}: {token}' https://.../comissoes/comissoes")
+        print(f'  https://...{URL_PREFIX}/?token={token}')
+    else:
+        result = benchmark()
+        print(f"sem profiler {result['plain_ms']:.2f} ms, com profiler {result['sampled_ms']:.2f} ms "
+              f"({result['overhead'] * 100:+.1f}%, {result['samples']} amostras)")
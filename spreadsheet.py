@@ -0,0 +1,285 @@
+"""Leitura de planilhas (CSV/XLS/XLSX) com o engine mais rápido disponível.
+
+Ordem de preferência para Excel:
+- calamine (python-calamine, em Rust), se estiver instalado;
+- openpyxl em modo read-only, lendo linha a linha, para arquivos grandes;
+- pd.read_excel nos demais casos.
+
+CSV é sempre lido com pd.read_csv. Execute `python spreadsheet.py arquivo.xlsx`
+para comparar os engines em um arquivo real, ou `python spreadsheet.py
+--calibrar` para medir a partir de que tamanho o streaming compensa.
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # engine opcional
+    CalamineWorkbook = None
+
+CSV_EXTENSIONS = ('.csv',)
+EXCEL_EXTENSIONS = ('.xls', '.xlsx', '.xlsm')
+# A partir deste tamanho o streaming do openpyxl supera o pd.read_excel. Valor
+# medido com `python spreadsheet.py --calibrar` (extratos sintéticos, pandas
+# 3.0/openpyxl 3.1): o streaming já ganha no menor arquivo medido (12 KB, 250
+# linhas) e fica 1,2-1,4x mais rápido de 64 KB a 1 MB; abaixo disso a diferença
+# some no ruído. Pode ser sobrescrito por SPREADSHEET_STREAMING_MIN_BYTES com o
+# resultado da calibração no servidor.
+STREAMING_MIN_BYTES = int(os.environ.get('SPREADSHEET_STREAMING_MIN_BYTES', 12 * 1024))
+# Linhas das planilhas sintéticas usadas na calibração
+CALIBRATION_ROWS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+ENGINES = ('calamine', 'openpyxl-stream', 'pandas', 'csv')
+
+
+def available_engines():
+    engines = ['openpyxl-stream', 'pandas', 'csv']
+    if CalamineWorkbook is not None:
+        engines.insert(0, 'calamine')
+    return engines
+
+
+def _source_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    try:
+        position = source.tell()
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return 0
+
+
+def select_engine(filename, size=0):
+    """Escolhe o engine para um arquivo, pela extensão e pelo tamanho"""
+    forced = os.environ.get('SPREADSHEET_ENGINE')
+    if forced in ENGINES:
+        return forced
+
+    ext = os.path.splitext(filename.lower())[1]
+    if ext in CSV_EXTENSIONS:
+        return 'csv'
+    if ext not in EXCEL_EXTENSIONS:
+        raise ValueError("Formato de arquivo não suportado")
+    if CalamineWorkbook is not None:
+        return 'calamine'
+    if ext != '.xls' and size >= STREAMING_MIN_BYTES:
+        return 'openpyxl-stream'
+    return 'pandas'
+
+
+def _dedup_columns(columns, unnamed=()):
+    """Renomeia cabeçalhos repetidos como o pd.read_excel ('Valor', 'Valor.1', ...)
+
+    Nomes gerados que já existem na planilha são pulados, e as colunas sem
+    cabeçalho (`unnamed`) são tratadas por último, na mesma ordem do pandas.
+    """
+    columns = list(columns)
+    counts = {}
+    for i in [i for i in range(len(columns)) if i not in unnamed] + list(unnamed):
+        column = columns[i]
+        count = counts.get(column, 0)
+        if count:
+            base = column
+            while count:
+                counts[base] = count + 1
+                column = f'{base}.{count}'
+                count = count + 1 if column in columns else counts.get(column, 0)
+            columns[i] = column
+        counts[column] = count + 1
+    return columns
+
+
+def _frame_from_rows(rows, header=0, nrows=None, skiprows=None):
+    """Monta um DataFrame a partir de um iterador de linhas (tuplas de valores)"""
+    rows = iter(rows)
+    for _ in range(skiprows or 0):
+        next(rows, None)
+
+    columns = None
+    if header is not None:
+        for _ in range(header):
+            next(rows, None)
+        columns = next(rows, None)
+
+    data = []
+    for row in rows:
+        if nrows is not None and len(data) >= nrows:
+            break
+        data.append(row)
+
+    # Remove linhas vazias no fim da planilha
+    while data and all(value is None for value in data[-1]):
+        data.pop()
+
+    width = max([len(row) for row in data] + [len(columns) if columns else 0])
+    data = [tuple(row) + (None,) * (width - len(row)) for row in data]
+
+    if columns is not None:
+        columns = list(columns) + [None] * (width - len(columns))
+        unnamed = [i for i, value in enumerate(columns) if value is None]
+        columns = _dedup_columns([f'Unnamed: {i}' if value is None else value for i, value in enumerate(columns)],
+                                 unnamed)
+    else:
+        columns = list(range(width))
+
+    return pd.DataFrame.from_records(data, columns=columns).infer_objects()
+
+
+def _read_calamine(source, sheet_name, header, nrows, skiprows):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    workbook = CalamineWorkbook.from_object(source)
+    if isinstance(sheet_name, int):
+        sheet = workbook.get_sheet_by_index(sheet_name)
+    else:
+        sheet = workbook.get_sheet_by_name(sheet_name)
+    # calamine devolve '' para células vazias
+    rows = ([None if value == '' else value for value in row]
+            for row in sheet.to_python(skip_empty_area=False))
+    return _frame_from_rows(rows, header, nrows, skiprows)
+
+
+def _read_openpyxl_stream(source, sheet_name, header, nrows, skiprows):
+    import openpyxl
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        if isinstance(sheet_name, int):
+            sheet = workbook.worksheets[sheet_name]
+        else:
+            sheet = workbook[sheet_name]
+        return _frame_from_rows(sheet.iter_rows(values_only=True), header, nrows, skiprows)
+    finally:
+        workbook.close()
+
+
+def sheet_names(source, filename=None, engine=None):
+    """Nomes das abas de uma planilha; CSV tem uma única aba, representada por 0"""
+    filename = filename or str(source)
+    if engine is None:
+        engine = select_engine(filename, _source_size(source))
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+    if engine == 'csv':
+        return [0]
+    if engine == 'calamine':
+        return CalamineWorkbook.from_object(source).sheet_names
+    if engine == 'openpyxl-stream':
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(source, read_only=True, keep_links=False)
+        try:
+            return workbook.sheetnames
+        finally:
+            workbook.close()
+    return pd.ExcelFile(source).sheet_names
+
+
+def read_spreadsheet(source, filename=None, sheet_name=0, header=0, nrows=None, skiprows=None, engine=None):
+    """Lê uma planilha em um DataFrame com colunas tipadas
+
+    `source` pode ser um caminho ou um arquivo aberto; nesse caso informe
+    `filename` para que o formato seja reconhecido.
+    """
+    filename = filename or str(source)
+    if engine is None:
+        engine = select_engine(filename, _source_size(source))
+
+    if engine == 'csv':
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return pd.read_csv(source, encoding='utf-8-sig', header=header, nrows=nrows, skiprows=skiprows)
+    if engine == 'calamine':
+        return _read_calamine(source, sheet_name, header, nrows, skiprows)
+    if engine == 'openpyxl-stream':
+        return _read_openpyxl_stream(source, sheet_name, header, nrows, skiprows)
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return pd.read_excel(source, sheet_name=sheet_name, header=header, nrows=nrows, skiprows=skiprows)
+
+
+def benchmark(path, repeat=3):
+    """Mede o tempo de leitura de `path` com cada engine disponível"""
+    ext = os.path.splitext(path.lower())[1]
+    engines = ['csv'] if ext in CSV_EXTENSIONS else [e for e in available_engines() if e != 'csv']
+    if ext == '.xls' and 'openpyxl-stream' in engines:
+        engines.remove('openpyxl-stream')
+
+    results = {}
+    for engine in engines:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            df = read_spreadsheet(path, engine=engine)
+            timings.append(time.perf_counter() - start)
+        results[engine] = {'seconds': min(timings), 'rows': len(df)}
+    return results
+
+
+def calibrate(rows=CALIBRATION_ROWS, repeat=3):
+    """Mede pandas x openpyxl-stream em extratos sintéticos de tamanhos crescentes
+
+    Retorna (medições, limiar): o limiar é o tamanho do menor arquivo a partir
+    do qual o streaming foi mais rápido em todos os tamanhos maiores (None se
+    isso não aconteceu), o valor a usar em STREAMING_MIN_BYTES.
+    """
+    import tempfile
+
+    import numpy as np
+
+    measurements = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in rows:
+            path = os.path.join(tmp, f'extrato_{count}.xlsx')
+            pd.DataFrame({
+                'Data': pd.date_range('2024-01-01', periods=count, freq='h'),
+                'Histórico': [f'PIX RECEBIDO CLIENTE {i % 97} CNPJ: {11222333000181 + i}' for i in range(count)],
+                'Documento': np.arange(count),
+                'Valor': np.round(np.random.default_rng(count).normal(0, 1000, count), 2),
+            }).to_excel(path, index=False)
+            results = benchmark(path, repeat=repeat)
+            measurements.append({
+                'rows': count,
+                'bytes': os.path.getsize(path),
+                'pandas': results['pandas']['seconds'],
+                'openpyxl-stream': results['openpyxl-stream']['seconds'],
+            })
+
+    threshold = None
+    for measurement in reversed(measurements):
+        if measurement['openpyxl-stream'] >= measurement['pandas']:
+            break
+        threshold = measurement['bytes']
+    return measurements, threshold
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Uso: python spreadsheet.py <arquivo.xlsx|arquivo.csv> [...] | --calibrar")
+        sys.exit(1)
+
+    if sys.argv[1] == '--calibrar':
+        measurements, threshold = calibrate()
+        for m in measurements:
+            print(f"{m['rows']:6d} linhas ({m['bytes'] / 1024:5.0f} KB): pandas {m['pandas']:.3f}s, "
+                  f"openpyxl-stream {m['openpyxl-stream']:.3f}s")
+        if threshold is None:
+            print("O streaming não foi mais rápido de forma consistente; mantenha o pd.read_excel")
+        else:
+            print(f"SPREADSHEET_STREAMING_MIN_BYTES={threshold} (atual: {STREAMING_MIN_BYTES})")
+        sys.exit(0)
+
+    for path in sys.argv[1:]:
+        size = os.path.getsize(path)
+        print(f"{path} ({size / 1024:.0f} KB) - engine padrão: {select_engine(path, size)}")
+        for engine, result in sorted(benchmark(path).items(), key=lambda item: item[1]['seconds']):
+            print(f"  {engine:16s} {result['seconds']:.3f}s ({result['rows']} linhas)")
@@ -0,0 +1,158 @@
+import atexit
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+READY_TIMEOUT = 20     # seconds para o sub-app começar a aceitar conexões
+PROBE_INTERVAL = 0.1   # intervalo entre as verificações da porta
+WATCH_INTERVAL = 5     # intervalo do watchdog que reinicia processos que caíram
+MAX_RESTARTS = 5       # reinícios automáticos antes de desistir
+
+
+class SupervisorError(Exception):
+    """O sub-app não pôde ser iniciado"""
+
+
+def port_is_open(host, port, timeout=0.5):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class ProcessSupervisor:
+    """Mantém um sub-app Flask rodando em segundo plano
+
+    O processo é iniciado uma única vez e reaproveitado nas próximas chamadas;
+    a prontidão é detectada testando a porta em vez de esperar um tempo fixo.
+    Um watchdog reinicia o processo se ele cair e, ao encerrar o portal, o
+    processo (e o grupo dele, por causa do reloader do Flask) é finalizado.
+    """
+
+    def __init__(self, name, script, port, host='127.0.0.1', log_dir='logs'):
+        self.name = name
+        self.script = script
+        self.port = port
+        self.host = host
+        self.log_path = os.path.join(log_dir, f'{name}.log')
+        self.process = None
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._watchdog = None
+        self._stopping = False
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/'
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def ensure_running(self, timeout=READY_TIMEOUT):
+        """Garante que o sub-app está aceitando conexões, iniciando-o se necessário"""
+        with self._lock:
+            if port_is_open(self.host, self.port):
+                # Já está no ar (iniciado por nós ou manualmente)
+                return
+            if not self.is_running():
+                self._start()
+            self._wait_ready(timeout)
+            self._ensure_watchdog()
+
+    def _start(self):
+        os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+        log = open(self.log_path, 'ab')
+        kwargs = {}
+        if os.name == 'nt':  # Windows
+            kwargs['creationflags'] = subprocess.CREATE_NEW_CONSOLE | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:  # Linux/Unix
+            kwargs['start_new_session'] = True
+        # A saída vai para um arquivo de log: um PIPE nunca lido travaria o sub-app quando enchesse
+        self.process = subprocess.Popen(
+            [sys.executable, self.script],
+            cwd=os.path.dirname(self.script),
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            **kwargs
+        )
+        log.close()
+        print(f"{self.name}: iniciado (pid {self.process.pid}), log em {self.log_path}")
+
+    def _wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if port_is_open(self.host, self.port, timeout=PROBE_INTERVAL):
+                return
+            if self.process.poll() is not None:
+                raise SupervisorError(
+                    f"{self.name} terminou com código {self.process.returncode}. Veja {self.log_path}."
+                )
+            time.sleep(PROBE_INTERVAL)
+        raise SupervisorError(f"{self.name} não respondeu na porta {self.port} em {timeout}s")
+
+    def _ensure_watchdog(self):
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = threading.Thread(target=self._watch, name=f'{self.name}-watchdog', daemon=True)
+            self._watchdog.start()
+
+    def _watch(self):
+        while not self._stopping:
+            time.sleep(WATCH_INTERVAL)
+            with self._lock:
+                if self._stopping or self.process is None or self.process.poll() is None:
+                    continue
+                if self.restarts >= MAX_RESTARTS:
+                    print(f"{self.name}: caiu {self.restarts} vezes, não será reiniciado automaticamente")
+                    return
+                self.restarts += 1
+                print(f"{self.name}: processo caiu (código {self.process.returncode}), reiniciando")
+                try:
+                    self._start()
+                except OSError as e:
+                    print(f"{self.name}: erro ao reiniciar: {e}")
+
+    def stop(self, timeout=5):
+        """Encerra o sub-app (e os processos filhos dele)"""
+        with self._lock:
+            self._stopping = True
+            process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        try:
+            if os.name == 'nt':
+                process.send_signal(signal.CTRL_BREAK_EVENT)
+            else:
+                os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            if os.name == 'nt':
+                process.kill()
+            else:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+
+class Supervisor:
+    """Registro dos sub-apps do portal; encerra todos ao sair"""
+
+    def __init__(self):
+        self.apps = {}
+        atexit.register(self.stop_all)
+
+    def register(self, name, script, port, **kwargs):
+        self.apps[name] = ProcessSupervisor(name, script, port, **kwargs)
+        return self.apps[name]
+
+    def get(self, name):
+        return self.apps[name]
+
+    def stop_all(self):
+        for app in self.apps.values():
+            app.stop()
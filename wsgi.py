@@ -1,11 +1,97 @@
+import importlib.util
 import os
 import sys
 
+from flask import Flask
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+
 # Add the project root to Python path
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-from app import app
+from app import app as portal
+from assets import StaticAssets
+from profiler import RequestProfiler
+
+COMISSOES_DIR = os.path.join(project_root, 'Comissoes.af360bank')
+FINANCEIRO_DIR = os.path.join(project_root, 'financeiro.af360bank')
+
+# Os sub-apps são montados neste processo, a menos que PORTAL_COMPOSED=0
+COMPOSED = os.environ.get('PORTAL_COMPOSED', '1') != '0'
+
+# Mesma configuração de sessão para o portal e os dois sub-apps; cada um usa
+# o próprio cookie (ver configure_session)
+SESSION_CONFIG = {
+    'SESSION_TYPE': 'filesystem',
+    'SESSION_FILE_DIR': os.path.join(project_root, 'flask_session'),
+    'SESSION_COOKIE_HTTPONLY': True,
+    'SESSION_COOKIE_SAMESITE': 'Lax',
+    'PERMANENT_SESSION_LIFETIME': 1800,  # 30 minutes
+}
+
+
+def load_module(name, path):
+    """Importa um arquivo com um nome próprio (os dois sub-apps se chamam app.py)"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def configure_session(flask_app, name, path='/'):
+    """Sessão em arquivo com um cookie por app
+
+    Os dados do Comissoes (o dataset do upload) ficam na sessão; com um cookie
+    só, toda requisição do portal e do financeiro também carregaria e
+    regravaria esses dados, e uma aba podia sobrescrever o que outra salvou.
+    """
+    from flask_session import Session
+
+    flask_app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'development_key')
+    flask_app.config.update(SESSION_CONFIG, SESSION_COOKIE_NAME=f'{name}_session', SESSION_COOKIE_PATH=path)
+    Session(flask_app)
+    return flask_app
+
+
+def create_comissoes_app():
+    # batch_upload e os demais módulos do Comissoes são importados pelo nome
+    if COMISSOES_DIR not in sys.path:
+        sys.path.append(COMISSOES_DIR)
+    module = load_module('comissoes_app', os.path.join(COMISSOES_DIR, 'app.py'))
+    return configure_session(module.app, 'comissoes', '/comissoes')
+
+
+def create_financeiro_app():
+    # Os módulos do financeiro se importam pelo nome (database, read_excel...)
+    if FINANCEIRO_DIR not in sys.path:
+        sys.path.append(FINANCEIRO_DIR)
+    module = load_module('financeiro_app', os.path.join(FINANCEIRO_DIR, 'app.py'))
+
+    # Mesmo app que financeiro.af360bank/run.py monta ao redor do blueprint
+    flask_app = Flask('financeiro_app', root_path=FINANCEIRO_DIR)
+    flask_app.config['UPLOAD_FOLDER'] = module.UPLOAD_FOLDER
+    flask_app.register_blueprint(module.app)
+    StaticAssets(flask_app)
+    return configure_session(flask_app, 'financeiro', '/financeiro')
+
+
+def create_app():
+    """Portal com Comissoes e financeiro servidos no mesmo processo"""
+    configure_session(portal, 'portal')
+    mounts = {
+        '/comissoes': create_comissoes_app(),
+        '/financeiro': create_financeiro_app(),
+    }
+    # O portal passa a redirecionar para os prefixos em vez de subir servidores
+    portal.config['MOUNTED_SUBAPPS'] = {prefix.strip('/'): prefix + '/' for prefix in mounts}
+    portal.wsgi_app = DispatcherMiddleware(portal.wsgi_app, mounts)
+    return portal
+
+
+app = create_app() if COMPOSED else portal
+# Por fora do DispatcherMiddleware, para amostrar também as rotas dos sub-apps
+RequestProfiler(app)
 
 if __name__ == "__main__":
     app.run()